@@ -4,7 +4,7 @@ import joblib
 import numpy as np
 from datetime import datetime, timedelta
 
-from predicted_production import compute_predicted_production
+from predicted_production import compute_predicted_production, compute_predicted_production_batch
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -115,6 +115,92 @@ def detect_fault():
             "error": str(e)
         }), 400
 
+FEATURE_KEYS = [
+    "Hour",
+    "Day",
+    "Month",
+    "WindSpeed",
+    "Sunshine",
+    "AirPressure",
+    "Radiation",
+    "AirTemperature",
+    "RelativeAirHumidity",
+]
+
+
+def build_forecast_horizon(data, now, hours_ahead):
+    """
+    Feature matrix for the daytime hours (06:00 - 18:00) of the next
+    hours_ahead hours, built column-wise with NumPy.
+
+    Returns (offsets, weather, features): hour offsets from now, the
+    weather dict of each row (as given in weatherForecast, or estimated)
+    and the (n, 9) matrix in FEATURE_KEYS order.
+    """
+    offsets = np.arange(max(0, hours_ahead))
+    times = np.datetime64(now) + offsets.astype("timedelta64[h]")
+    days = times.astype("datetime64[D]")
+    months = times.astype("datetime64[M]")
+    hour = (times.astype("datetime64[h]") - days).astype(np.int64)
+    day = (days - months).astype(np.int64) + 1
+    month = months.astype(np.int64) % 12 + 1
+
+    # Only forecast daytime (06:00 - 18:00). Skip night hours completely.
+    daytime = (hour >= 6) & (hour < 18)
+    offsets, hour, day, month = offsets[daytime], hour[daytime], day[daytime], month[daytime]
+
+    # Improved weather estimation algorithm for realistic daytime solar production
+    # Get current weather values as baseline
+    wind = max(5, min(20, data.get("currentWindSpeed", 10)))  # Reasonable wind: 5-20 m/s
+    pressure = max(990, min(1030, data.get("currentAirPressure", 1010)))  # Normal range
+    humidity = max(30, min(90, data.get("currentHumidity", 60)))  # Reasonable humidity
+
+    hours_from_6am = hour - 6
+    hours_to_6pm = 18 - hour
+
+    # Sunshine: peaks at noon (12:00) with value ~80-100, minimum at 6am/6pm ~20-30
+    sunshine = np.maximum(20, 20 + np.where(hour <= 12, hours_from_6am, hours_to_6pm) * 10)
+    # Radiation: typically 2-3x sunshine, peaks around 200-300 W/m² at noon
+    radiation = sunshine * 2.5
+    # Temperature: peaks around 2-3 PM, cooler in morning/evening
+    air_temp = 22 + np.where(hour <= 14, hours_from_6am, hours_to_6pm) * 1.2
+
+    # Ensure realistic bounds
+    sunshine = np.clip(sunshine, 20, 100)
+    radiation = np.round(np.clip(radiation, 50, 400), 1)
+    air_temp = np.round(np.clip(air_temp, 20, 35), 1)
+
+    features = np.column_stack([
+        hour, day, month,
+        np.full(len(hour), wind), sunshine, np.full(len(hour), pressure),
+        radiation, air_temp, np.full(len(hour), humidity),
+    ]).astype(np.float64)
+
+    # Use the provided weather forecast where there is one
+    weather_data = data.get("weatherForecast", [])
+    provided = offsets < len(weather_data)
+    for row in np.flatnonzero(provided):
+        given = weather_data[offsets[row]]
+        features[row] = [given[k] for k in FEATURE_KEYS]
+
+    estimated = zip(hour.tolist(), day.tolist(), month.tolist(), sunshine.tolist(), radiation.tolist(), air_temp.tolist())
+    weather = [
+        weather_data[offset] if is_provided else {
+            "Hour": h,
+            "Day": d,
+            "Month": m,
+            "WindSpeed": wind,
+            "Sunshine": sun,
+            "AirPressure": pressure,
+            "Radiation": rad,
+            "AirTemperature": temp,
+            "RelativeAirHumidity": humidity,
+        }
+        for offset, is_provided, (h, d, m, sun, rad, temp) in zip(offsets.tolist(), provided.tolist(), estimated)
+    ]
+    return offsets, weather, features
+
+
 @app.route("/forecast", methods=["POST"])
 def forecast():
     """Forecast production for next N hours"""
@@ -124,93 +210,22 @@ def forecast():
         
         # Get current time
         now = datetime.now()
-        
-        forecasts = []
-        
-        for i in range(hours_ahead):
-            future_time = now + timedelta(hours=i)
 
-            # Only forecast daytime (06:00 - 18:00). Skip night hours completely.
-            if future_time.hour < 6 or future_time.hour >= 18:
-                continue
-            
-            # Use provided weather forecast or estimate
-            weather_data = data.get("weatherForecast", [])
-            
-            if i < len(weather_data):
-                weather = weather_data[i]
-            else:
-                # Improved weather estimation algorithm for realistic daytime solar production
-                hour = future_time.hour
-                day = future_time.day
-                month = future_time.month
-                
-                # Get current weather values as baseline
-                current_wind = data.get("currentWindSpeed", 10)
-                current_pressure = data.get("currentAirPressure", 1010)
-                current_humidity = data.get("currentHumidity", 60)
-                
-                # Estimate weather based on time of day (6AM-6PM only, since we skip night)
-                # Solar radiation peaks around noon (12:00)
-                hours_from_6am = hour - 6
-                hours_to_6pm = 18 - hour
-                
-                # Sunshine: peaks at noon (12:00) with value ~80-100, minimum at 6am/6pm ~20-30
-                if hour <= 12:
-                    # Morning: increasing sunshine
-                    sunshine = max(20, 20 + (hours_from_6am * 10))  # 20 at 6am, 80 at 12pm
-                else:
-                    # Afternoon: decreasing sunshine
-                    sunshine = max(20, 20 + (hours_to_6pm * 10))  # 80 at 12pm, 20 at 6pm
-                
-                # Radiation: typically 2-3x sunshine, peaks around 200-300 W/m² at noon
-                radiation = sunshine * 2.5  # More realistic radiation values
-                
-                # Temperature: peaks around 2-3 PM, cooler in morning/evening
-                if hour <= 14:
-                    air_temp = 22 + (hours_from_6am * 1.2)  # 22°C at 6am, ~32°C at 2pm
-                else:
-                    air_temp = 22 + (hours_to_6pm * 1.2)  # ~32°C at 2pm, 22°C at 6pm
-                
-                # Ensure realistic bounds
-                sunshine = min(100, max(20, sunshine))
-                radiation = min(400, max(50, radiation))
-                air_temp = min(35, max(20, air_temp))
-                
-                weather = {
-                    "Hour": hour,
-                    "Day": day,
-                    "Month": month,
-                    "WindSpeed": max(5, min(20, current_wind)),  # Reasonable wind: 5-20 m/s
-                    "Sunshine": round(sunshine, 1),
-                    "AirPressure": max(990, min(1030, current_pressure)),  # Normal range
-                    "Radiation": round(radiation, 1),
-                    "AirTemperature": round(air_temp, 1),
-                    "RelativeAirHumidity": max(30, min(90, current_humidity))  # Reasonable humidity
-                }
-            
-            # Predict production (from predicted_production.py)
-            predicted = compute_predicted_production(
-                model,
-                weather["Hour"],
-                weather["Day"],
-                weather["Month"],
-                weather["WindSpeed"],
-                weather["Sunshine"],
-                weather["AirPressure"],
-                weather["Radiation"],
-                weather["AirTemperature"],
-                weather["RelativeAirHumidity"],
-            )
+        offsets, weather, features = build_forecast_horizon(data, now, hours_ahead)
+
+        # One model call for the whole horizon (from predicted_production.py)
+        predicted = compute_predicted_production_batch(model, features)
 
+        forecasts = []
+        for offset, row_weather, production in zip(offsets.tolist(), weather, predicted):
+            future_time = now + timedelta(hours=offset)
             forecasts.append({
                 "timestamp": future_time.isoformat(),
                 "hour": future_time.hour,
-                "predictedProduction": predicted,
-                "weather": weather
+                "predictedProduction": production,
+                "weather": row_weather
             })
 
-        
         return jsonify({
             "success": True,
             "forecasts": forecasts
@@ -0,0 +1,91 @@
+"""
+Benchmark for the /forecast endpoint.
+
+For horizons of 24, 168 (week) and 720 (month) hours, times
+- the old per-hour path: compute_predicted_production once per daytime
+  hour (one model.predict on a 1x9 array each)
+- the batched path: build_forecast_horizon + one
+  compute_predicted_production_batch call
+- the whole POST /forecast request through Flask's test client
+and checks that both paths predict the same values.
+
+Run from ml-service/ (needs best_rf_model1.pkl):
+    python bench_forecast.py
+    python bench_forecast.py --horizons 24 168 720 --repeats 20
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# app.py loads the model from the working directory
+os.chdir(Path(__file__).resolve().parent)
+
+from app import app, build_forecast_horizon, model  # noqa: E402
+from predicted_production import (  # noqa: E402
+    compute_predicted_production,
+    compute_predicted_production_batch,
+)
+
+REQUEST = {
+    "currentWindSpeed": 12,
+    "currentAirPressure": 1012,
+    "currentHumidity": 65,
+}
+
+
+def per_hour(features) -> list:
+    return [compute_predicted_production(model, *row) for row in features.tolist()]
+
+
+def batched(data, now, hours) -> list:
+    _, _, features = build_forecast_horizon(data, now, hours)
+    return compute_predicted_production_batch(model, features)
+
+
+def timed(func, repeats: int) -> float:
+    """
+    Median seconds per call
+    """
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /forecast endpoint")
+    parser.add_argument("--horizons", type=int, nargs="+", default=[24, 168, 720])
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    now = datetime.now()
+
+    print(f"{'hours':>6} {'rows':>6} {'per-hour ms':>12} {'batched ms':>11} {'speed-up':>9} {'request ms':>11} {'match':>6}")
+    for hours in args.horizons:
+        _, _, features = build_forecast_horizon(REQUEST, now, hours)
+        expected = per_hour(features)
+        match = expected == batched(REQUEST, now, hours)
+
+        loop_s = timed(lambda: per_hour(features), args.repeats)
+        batch_s = timed(lambda: batched(REQUEST, now, hours), args.repeats)
+        request_s = timed(
+            lambda: client.post("/forecast", json={**REQUEST, "hoursAhead": hours}),
+            args.repeats
+        )
+
+        print(
+            f"{hours:>6} {len(features):>6} {loop_s * 1000:>12.1f} {batch_s * 1000:>11.1f} "
+            f"{loop_s / batch_s if batch_s else 0:>8.1f}x {request_s * 1000:>11.1f} {str(match):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
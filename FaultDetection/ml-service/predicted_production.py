@@ -67,3 +67,45 @@ def compute_predicted_production(
 
     heuristic = base_production * sun_factor * temp_factor
     return round(max(0.0, heuristic), 2)
+
+
+def compute_predicted_production_batch(model, features) -> list:
+    """
+    Vectorized compute_predicted_production for many rows.
+
+    Args:
+        model: Loaded sklearn model (e.g., RandomForest)
+        features: (n, 9) array-like, columns in the order of
+            compute_predicted_production's arguments (hour ... humidity)
+
+    Returns:
+        Predicted production in Watts per row (non-negative, rounded to 2
+        decimals), the same values as calling compute_predicted_production
+        row by row, from a single model.predict call.
+    """
+    X = np.asarray(features, dtype=np.float64).reshape(-1, 9)
+    if len(X) == 0:
+        return []
+
+    try:
+        pred = np.asarray(model.predict(X), dtype=np.float64).reshape(-1)
+    except Exception:
+        pred = np.zeros(len(X))
+
+    # Fallback wherever the model returns <= 0 (or NaN)
+    fallback = ~(pred > 0)
+    if fallback.any():
+        rad = np.fmax(0.0, X[fallback, 6])
+        sun = np.fmax(0.0, X[fallback, 4])
+        temp = X[fallback, 7]
+
+        rad_capped = np.fmin(rad, 400.0)
+        base_production = rad_capped * 10.0
+
+        sun_factor = np.where(sun > 0, np.fmin(sun / 50.0, 2.0), 0.5)
+        temp_factor = np.where(temp > 35, 0.85, np.where(temp > 30, 0.9, 1.0))
+
+        pred[fallback] = np.fmax(0.0, base_production * sun_factor * temp_factor)
+
+    # Python round() per value, as the single-row version does
+    return [round(v, 2) for v in pred.tolist()]
@@ -1,12 +1,43 @@
 # firebase_config.py
 
-import firebase_admin
-from firebase_admin import credentials, db
+import json
+import os
 
-cred = credentials.Certificate("serviceAccountKey.json")
+# Path to a JSON export of the database (e.g. written by the engine's
+# benchmarks/fleet_load_test.py --dump); when set, reads come from it
+# instead of the live Firebase project
+LOCAL_DB_SNAPSHOT = os.getenv("LOCAL_DB_SNAPSHOT")
 
-firebase_admin.initialize_app(cred, {
-    'databaseURL': 'https://project12-f6813-default-rtdb.firebaseio.com/'
-})
 
-ref = db.reference("predicted_units")
\ No newline at end of file
+class SnapshotReference:
+    """
+    Read-only stand-in for db.reference(path) over a JSON snapshot
+    """
+
+    def __init__(self, data, path):
+        self.data = data
+        self.path = path
+
+    def get(self):
+        node = self.data
+        for part in [p for p in self.path.split("/") if p]:
+            if not isinstance(node, dict):
+                return None
+            node = node.get(part)
+        return node
+
+
+if LOCAL_DB_SNAPSHOT:
+    with open(LOCAL_DB_SNAPSHOT, "r", encoding="utf-8") as f:
+        ref = SnapshotReference(json.load(f), "predicted_units")
+else:
+    import firebase_admin
+    from firebase_admin import credentials, db
+
+    cred = credentials.Certificate("serviceAccountKey.json")
+
+    firebase_admin.initialize_app(cred, {
+        'databaseURL': 'https://project12-f6813-default-rtdb.firebaseio.com/'
+    })
+
+    ref = db.reference("predicted_units")
\ No newline at end of file
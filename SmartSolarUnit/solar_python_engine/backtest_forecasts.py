@@ -0,0 +1,120 @@
+"""
+Smart Solar Advisor
+Backtest the daily forecasters and select a model per site
+
+Runs a rolling-origin backtest of Prophet, SARIMA and a seasonal-naive
+baseline over every site's daily rollups (rollups/{customer}/{site_id}),
+fitting the folds in parallel worker processes, and prints MAE, MAPE and
+fit time per model. --save stores each site's selected model in
+config/forecast_models.json, which /api/timeseries/forecast and
+bulk_forecast.py use when no model is requested.
+
+Run:
+    python backtest_forecasts.py
+    python backtest_forecasts.py --horizon 14 --max-folds 12 --workers 8 --save
+    python backtest_forecasts.py --input series.json --models sarima seasonal_naive
+
+--input takes a JSON list (or NDJSON) of {"series_id", "daily_data"}
+objects instead of reading the configured sites.
+"""
+
+import argparse
+import json
+
+from bulk_forecast import _read_jobs
+from services.forecast_backtest import (
+    BACKTEST_HORIZON,
+    BACKTEST_INITIAL,
+    BACKTEST_MAE_TOLERANCE,
+    BACKTEST_MAX_FOLDS,
+    BACKTEST_STEP,
+    BACKTEST_WORKERS,
+    DEFAULT_CANDIDATES,
+    SELECTION_PATH,
+    FoldCache,
+    backtest,
+    save_selections,
+)
+
+
+def _load_series(args) -> dict:
+    if args.input:
+        return {
+            str(job.get("series_id") or i): job.get("daily_data") or []
+            for i, job in enumerate(_read_jobs(args.input))
+        }
+
+    from firebase.firebase_client import get_daily_rollups
+    from utils.site_config import load_sites, load_sites_from_file
+
+    sites = load_sites_from_file(args.sites_file) if args.sites_file else load_sites()
+    return {
+        f"{s['customer']}/{s['site_id']}": get_daily_rollups(s["customer"], s["site_id"])
+        for s in sites
+    }
+
+
+def _fmt(value, width: int, digits: int) -> str:
+    return "-".rjust(width) if value is None else f"{value:{width}.{digits}f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest daily forecasters and select a model per site")
+    parser.add_argument("--models", nargs="+", choices=[c["name"] for c in DEFAULT_CANDIDATES],
+                        help="Candidates to evaluate (default: all)")
+    parser.add_argument("--horizon", type=int, default=BACKTEST_HORIZON, help="Days forecast per fold")
+    parser.add_argument("--initial", type=int, default=BACKTEST_INITIAL, help="Minimum training days")
+    parser.add_argument("--step", type=int, default=BACKTEST_STEP, help="Days between cutoffs")
+    parser.add_argument("--max-folds", type=int, default=BACKTEST_MAX_FOLDS)
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS)
+    parser.add_argument("--tolerance", type=float, default=BACKTEST_MAE_TOLERANCE,
+                        help="Relative MAE margin within which the fastest model wins")
+    parser.add_argument("--cache-dir", help="Fold cache directory (default: backtest_cache/)")
+    parser.add_argument("--sites-file", help="Site config JSON (default: config/sites.json)")
+    parser.add_argument("--input", help="JSON / NDJSON file of series instead of the configured sites")
+    parser.add_argument("--report", help="Write the full report as JSON")
+    parser.add_argument("--save", action="store_true", help=f"Store the selections in {SELECTION_PATH}")
+    args = parser.parse_args()
+
+    candidates = [c for c in DEFAULT_CANDIDATES if not args.models or c["name"] in args.models]
+    series = _load_series(args)
+    print(f"Backtesting {len(series)} series x {len(candidates)} models with {args.workers} worker(s)")
+
+    reports = backtest(
+        series,
+        candidates=candidates,
+        horizon=args.horizon,
+        initial=args.initial,
+        step=args.step,
+        max_folds=args.max_folds,
+        max_workers=args.workers,
+        cache=FoldCache(args.cache_dir) if args.cache_dir else None,
+        tolerance=args.tolerance,
+    )
+
+    for series_id, report in reports.items():
+        if report["error"]:
+            print(f"\n{series_id}: {report['message']}")
+            continue
+        selected = (report["selected"] or {}).get("name")
+        print(f"\n{series_id}: {report['days']} days, {report['folds']} folds → {selected or 'no model'}")
+        print(f"  {'model':<16} {'MAE':>10} {'MAPE %':>8} {'fit s':>8} {'failed':>7}")
+        for name, s in report["scores"].items():
+            marker = " *" if name == selected else ""
+            print(
+                f"  {name:<16} {_fmt(s['mae'], 10, 4)} {_fmt(s['mape'], 8, 2)} "
+                f"{_fmt(s['fit_seconds'], 8, 3)} {s['failed_folds']:>7}{marker}"
+            )
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nReport: {args.report}")
+
+    if args.save:
+        selections = save_selections(reports)
+        print(f"\nSaved {len(selections)} selection(s) → {SELECTION_PATH}")
+
+
+if __name__ == "__main__":
+    main()
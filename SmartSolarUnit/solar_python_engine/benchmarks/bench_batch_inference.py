@@ -0,0 +1,99 @@
+"""
+Benchmark: per-event inference vs micro-batched inference.
+
+Compares rows/sec of the current per-event path
+(map → calculate_5min_system_energy, one DataFrame + predict per row)
+with the batched path (one feature matrix + one predict per batch).
+
+Run from anywhere:
+    python benchmarks/bench_batch_inference.py --rows 2000 --batch-size 256
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ENGINE_DIR))
+
+import numpy as np  # noqa: E402
+
+from predictor.energy_predictor import FEATURES  # noqa: E402
+from services.prediction_service import (  # noqa: E402
+    calculate_5min_system_energy,
+    calculate_5min_system_energy_batch,
+)
+from utils.sensor_mapper import map_firebase_to_model_features  # noqa: E402
+
+PANEL_AREA_M2 = 25
+
+
+def make_payload(rng: random.Random) -> dict:
+    """Synthetic ESP32 record in the same shape the devices upload"""
+    lux = round(rng.uniform(80, 300), 2)
+    temp = round(rng.uniform(28, 33), 1)
+    hum = round(rng.uniform(60, 95), 1)
+    rain = rng.randint(0, 100)
+    return {
+        "bh1750": {"lux1": lux, "lux2": lux, "lux_avg": lux},
+        "dht_avg": {"temp_c": temp, "hum_%": hum},
+        "rain": {"pct1": rain, "pct2": rain},
+        "dust": {"mg_m3": round(rng.uniform(0, 0.1), 2)},
+    }
+
+
+def run_per_event(payloads: list) -> tuple:
+    start = time.perf_counter()
+    results = []
+    for raw in payloads:
+        features = map_firebase_to_model_features(raw)
+        results.append(calculate_5min_system_energy(features, PANEL_AREA_M2))
+    return time.perf_counter() - start, results
+
+
+def run_batched(payloads: list, batch_size: int) -> tuple:
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(payloads), batch_size):
+        chunk = payloads[i:i + batch_size]
+        rows = []
+        for raw in chunk:
+            features = map_firebase_to_model_features(raw)
+            rows.append([features[k] for k in FEATURES])
+        results.extend(calculate_5min_system_energy_batch(
+            np.array(rows, dtype=np.float64),
+            [PANEL_AREA_M2] * len(rows)
+        ))
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = [make_payload(rng) for _ in range(args.rows)]
+
+    # Warm up the model once so neither path pays first-call costs
+    run_per_event(payloads[:10])
+
+    single_s, single_results = run_per_event(payloads)
+    batch_s, batch_results = run_batched(payloads, args.batch_size)
+
+    mismatches = sum(1 for a, b in zip(single_results, batch_results) if a != b)
+
+    print(f"Rows:              {args.rows}")
+    print(f"Batch size:        {args.batch_size}")
+    print(f"Per-event path:    {args.rows / single_s:,.0f} rows/sec ({single_s:.3f}s)")
+    print(f"Batched path:      {args.rows / batch_s:,.0f} rows/sec ({batch_s:.3f}s)")
+    print(f"Speed-up:          {single_s / batch_s:.1f}x")
+    print(f"Result mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
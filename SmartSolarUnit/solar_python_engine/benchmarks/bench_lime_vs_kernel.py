@@ -0,0 +1,142 @@
+"""
+Benchmark: vectorized LIME surrogate vs SHAP KernelExplainer.
+
+For a set of synthetic records, explains each one with
+- xai_service.lime_surrogate (one batched predict + weighted ridge)
+- shap.KernelExplainer (nsamples model evaluations per record)
+and, when the model is a tree ensemble, exact TreeExplainer SHAP values
+as the reference.
+
+Reports latency per explanation and fidelity:
+- LIME: weighted R² of the surrogate, |surrogate(x0) - model(x0)|
+- both: rank agreement (Spearman) of |attributions| with TreeSHAP and
+  sign agreement of the attributions
+
+Run from anywhere:
+    python benchmarks/bench_lime_vs_kernel.py --rows 50 --lime-samples 1000 --kernel-samples 200
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ENGINE_DIR))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.bench_batch_inference import make_payload  # noqa: E402
+from services.xai_service import (  # noqa: E402
+    FEATURES_ORDER,
+    LIME_FEATURE_SCALES,
+    LIME_KERNEL_WIDTH,
+    _load_model,
+    lime_surrogate,
+)
+from utils.sensor_mapper import map_firebase_to_model_features  # noqa: E402
+
+
+def _rank(values: np.ndarray) -> np.ndarray:
+    ranks = np.empty(values.size)
+    ranks[np.argsort(values)] = np.arange(values.size)
+    return ranks
+
+
+def spearman(a, b) -> float:
+    ra, rb = _rank(np.abs(a)), _rank(np.abs(b))
+    if ra.std() == 0 or rb.std() == 0:
+        return 1.0
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def sign_agreement(a, b) -> float:
+    return float(np.mean(np.sign(a) == np.sign(b)))
+
+
+def _ms(samples) -> str:
+    p50, p95 = np.percentile(samples, [50, 95]) * 1000
+    return f"p50 {p50:8.2f} ms, p95 {p95:8.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50, help="Records to explain")
+    parser.add_argument("--lime-samples", type=int, default=1000)
+    parser.add_argument("--kernel-width", type=float, default=None)
+    parser.add_argument("--kernel-samples", type=int, default=200, help="KernelExplainer nsamples")
+    parser.add_argument("--background", type=int, default=50, help="KernelExplainer background rows")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import shap
+
+    model = _load_model()
+    if model is None:
+        print("Model not found (model/solar_power_model.pkl)")
+        return
+
+    rng = random.Random(args.seed)
+    rows = np.array([
+        [map_firebase_to_model_features(make_payload(rng))[k] for k in FEATURES_ORDER]
+        for _ in range(args.rows + args.background)
+    ], dtype=np.float64)
+    background, rows = rows[:args.background], rows[args.background:]
+
+    def predict(Z):
+        return model.predict(pd.DataFrame(Z, columns=FEATURES_ORDER))
+
+    tree_values = None
+    try:
+        tree = shap.TreeExplainer(model)
+        tree_values = np.asarray(tree.shap_values(pd.DataFrame(rows, columns=FEATURES_ORDER)))
+    except Exception as e:
+        print(f"[WARN] No TreeSHAP reference: {e}")
+
+    kernel = shap.KernelExplainer(predict, background)
+
+    lime_times, kernel_times = [], []
+    lime_r2, lime_local_err = [], []
+    lime_rank, kernel_rank, lime_sign, kernel_sign = [], [], [], []
+
+    for i, x0 in enumerate(rows):
+        start = time.perf_counter()
+        surrogate = lime_surrogate(
+            predict, x0,
+            num_samples=args.lime_samples,
+            kernel_width=args.kernel_width or LIME_KERNEL_WIDTH,
+            seed=args.seed + i
+        )
+        lime_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        kernel_values = np.asarray(kernel.shap_values(x0.reshape(1, -1), nsamples=args.kernel_samples)).reshape(-1)
+        kernel_times.append(time.perf_counter() - start)
+
+        lime_r2.append(surrogate["score"])
+        lime_local_err.append(abs(surrogate["local_prediction"] - surrogate["prediction"]))
+
+        if tree_values is not None:
+            reference = tree_values[i]
+            # Attribution of LIME at x0 relative to the background mean
+            lime_attr = surrogate["coefficients"] * (x0 - background.mean(axis=0)) / LIME_FEATURE_SCALES
+            lime_rank.append(spearman(lime_attr, reference))
+            kernel_rank.append(spearman(kernel_values, reference))
+            lime_sign.append(sign_agreement(lime_attr, reference))
+            kernel_sign.append(sign_agreement(kernel_values, reference))
+
+    print(f"Rows explained:   {args.rows}")
+    print(f"LIME ({args.lime_samples} samples):      {_ms(lime_times)}")
+    print(f"Kernel ({args.kernel_samples} nsamples): {_ms(kernel_times)}")
+    print(f"Speed-up (p50):   {np.median(kernel_times) / np.median(lime_times):.1f}x")
+    print(f"LIME weighted R²: mean {np.mean(lime_r2):.3f}, min {np.min(lime_r2):.3f}")
+    print(f"LIME |local - model| at x0: mean {np.mean(lime_local_err):.6f}")
+    if tree_values is not None:
+        print(f"Rank agreement with TreeSHAP:  LIME {np.mean(lime_rank):.3f}, Kernel {np.mean(kernel_rank):.3f}")
+        print(f"Sign agreement with TreeSHAP:  LIME {np.mean(lime_sign):.3f}, Kernel {np.mean(kernel_sign):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Offline end-to-end load test of the realtime engine.
+
+Replays a synthetic fleet (utils/synthetic_fleet.py) into an in-process
+LocalDatabase and runs the same pipeline as main.py against it:
+
+    devices/{id}/{key} write → listener → ingest queue → micro-batcher
+    → model → write buffer → predicted_units + rollups
+
+No Firebase connection is needed. Run from anywhere:
+    python benchmarks/fleet_load_test.py --devices 10000 --hours 12
+    python benchmarks/fleet_load_test.py --devices 500 --mode per_device --dump logs/fleet.json
+
+The whole dataset is held in memory (roughly 1 GB per million records);
+--dump saves it as a JSON snapshot usable with STORAGE_BACKEND=local and
+LOCAL_DB_SNAPSHOT.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ENGINE_DIR))
+
+from firebase.firebase_client import save_predictions_bulk, set_backend  # noqa: E402
+from firebase.local_database import LocalDatabase  # noqa: E402
+from firebase.write_buffer import PredictionWriteBuffer  # noqa: E402
+from predictor.energy_predictor import get_model  # noqa: E402
+from services.batch_inference import MicroBatcher  # noqa: E402
+from services.feature_store import FeatureStore  # noqa: E402
+from services.ingestion_queue import BoundedIngestionQueue  # noqa: E402
+from services.listener_supervisor import ListenerSupervisor  # noqa: E402
+from services.rollups import RollupAggregator  # noqa: E402
+from utils.metrics import StageLatencyMetrics  # noqa: E402
+from utils.sensor_mapper import FEATURE_COLUMNS  # noqa: E402
+from utils.synthetic_fleet import fleet_record_count, fleet_sites, generate_fleet  # noqa: E402
+from utils.time_utils import record_key_to_seconds  # noqa: E402
+
+
+class Pipeline:
+    """
+    The engine's components wired as in main.py, without the per-record
+    log line
+    """
+
+    def __init__(self, database: LocalDatabase, args, writer=save_predictions_bulk):
+        self.stage_metrics = StageLatencyMetrics()
+        self.feature_store = FeatureStore(days=1) if getattr(args, "feature_store", False) else None
+        self.write_buffer = PredictionWriteBuffer(
+            writer,
+            max_batch_size=args.write_batch,
+            flush_interval_s=args.flush_interval_s,
+            stage_metrics=self.stage_metrics
+        )
+        self.rollups = RollupAggregator(self.write_buffer)
+        self.ingest_queue = BoundedIngestionQueue(maxsize=args.queue_size, overflow="block")
+        self.batcher = MicroBatcher(
+            self.persist_prediction,
+            max_batch_size=args.batch_size,
+            max_wait_ms=args.max_wait_ms,
+            ingest_queue=self.ingest_queue,
+            stage_metrics=self.stage_metrics
+        )
+        self.supervisor = ListenerSupervisor(
+            self.batcher,
+            mode=args.mode,
+            reference_factory=database.reference
+        )
+
+        self.processed = 0
+        self._processed_lock = threading.Lock()
+
+    def persist_prediction(self, event, model_features: dict, predicted_energy: float):
+        site_config = event.site_config
+        device_id = site_config["device_id"]
+
+        self.write_buffer.add(
+            site_config["customer"],
+            site_config["site_id"],
+            event.record_key,
+            {
+                "predicted_kwh_5min": predicted_energy,
+                "device_id": device_id,
+                "panel_area_m2": site_config["panel_area_m2"],
+                "features_used": model_features,
+                "interval": "5_min",
+                "unit": "kWh"
+            },
+            received_at=event.received_at
+        )
+
+        feature_row = [model_features[k] for k in FEATURE_COLUMNS]
+        if self.feature_store is not None:
+            self.feature_store.append(
+                device_id, record_key_to_seconds(event.record_key), feature_row, predicted_energy
+            )
+        self.rollups.update(
+            site_config["customer"], site_config["site_id"], event.record_key, feature_row, predicted_energy
+        )
+        self.supervisor.record_processed(device_id, event.received_at)
+
+        with self._processed_lock:
+            self.processed += 1
+
+    def start(self, sites: list):
+        self.write_buffer.start()
+        self.batcher.start()
+        self.supervisor.start(sites)
+
+    def stop(self):
+        self.supervisor.stop()
+        self.write_buffer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--hours", type=float, default=12)
+    parser.add_argument("--interval-minutes", type=int, default=5)
+    parser.add_argument("--start", default="2026-01-01T06:00:00", help="First reading (device local time)")
+    parser.add_argument("--mode", choices=("multiplexed", "per_device"), default="multiplexed")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--write-batch", type=int, default=500)
+    parser.add_argument("--flush-interval-s", type=float, default=1.0)
+    parser.add_argument("--feature-store", action="store_true", help="Also append to the in-memory feature store")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout-s", type=float, default=3600, help="Give up waiting for the pipeline to drain")
+    parser.add_argument("--dump", help="Write the final database to this JSON file")
+    args = parser.parse_args()
+
+    database = LocalDatabase()
+    set_backend(database)
+
+    sites = fleet_sites(args.devices)
+    expected = fleet_record_count(args.devices, args.hours, args.interval_minutes)
+    print(f"Fleet: {args.devices} devices x {args.hours}h every {args.interval_minutes} min = {expected:,} records")
+
+    # Load the model before timing
+    get_model()
+
+    pipeline = Pipeline(database, args)
+    pipeline.start(sites)
+
+    started = time.perf_counter()
+    written = 0
+    for record_key, records in generate_fleet(
+        sites,
+        datetime.fromisoformat(args.start),
+        hours=args.hours,
+        interval_minutes=args.interval_minutes,
+        seed=args.seed
+    ):
+        # Every device PUTs its own record, like the ESP32 firmware
+        for device_id, record in records:
+            database.reference(f"devices/{device_id}/{record_key}").set(record)
+        written += len(records)
+        print(
+            f"[LOAD] {record_key}: {written:,} written, {pipeline.processed:,} predicted, "
+            f"{database.pending_events:,} events pending",
+            flush=True
+        )
+    ingest_s = time.perf_counter() - started
+
+    deadline = time.monotonic() + args.timeout_s
+    while pipeline.processed < written and time.monotonic() < deadline:
+        time.sleep(0.1)
+    predicted_s = time.perf_counter() - started
+
+    pipeline.stop()
+    elapsed = time.perf_counter() - started
+
+    print("\nLoad test summary")
+    print(f"  records written:   {written:,} in {ingest_s:.1f}s ({written / ingest_s:,.0f} rows/s)")
+    print(f"  records predicted: {pipeline.processed:,} in {predicted_s:.1f}s ({pipeline.processed / predicted_s:,.0f} rows/s)")
+    print(f"  persisted after:   {elapsed:.1f}s ({pipeline.processed / elapsed:,.0f} rows/s end to end)")
+    print(f"  stages: {pipeline.stage_metrics.summary()}")
+    print(f"  queue:  {pipeline.ingest_queue.metrics()}")
+    print(f"  writes: {pipeline.write_buffer.metrics()}")
+    print(f"  database: {database.stats()}")
+
+    if args.dump:
+        print(f"  snapshot: {database.dump(args.dump)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Benchmark suite for the realtime prediction pipeline.
+
+Times each stage on its own and the whole event → persist loop against
+the in-process LocalDatabase, reporting p50 / p95 / p99 latency per call
+and rows/sec:
+
+    map_features        map_firebase_to_model_features, one record
+    predict_single      predict_5min_energy, one row
+    predict_batch       predict_5min_energy_batch, --batch-size rows
+    system_energy       calculate_5min_system_energy, one row
+    event_to_persist    devices/ write → listener → batcher → model →
+                        bulk write confirmed, per record
+    intraday_update     IntradayForecaster.update, one 5-minute point
+    intraday_fleet      IntradayForecaster.forecast_all, next 3 h for
+                        --devices sites
+
+Run from anywhere:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --only predict_single predict_batch
+    python benchmarks/run_benchmarks.py --save baseline
+    python benchmarks/run_benchmarks.py --compare benchmarks/baselines/baseline.json
+
+--save writes the results as JSON to benchmarks/baselines/; --compare
+reports the change against a saved run and exits with status 1 when a
+latency or throughput figure regresses by more than --threshold percent.
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ENGINE_DIR))
+
+import numpy as np  # noqa: E402
+
+from benchmarks.bench_batch_inference import make_payload  # noqa: E402
+from benchmarks.fleet_load_test import Pipeline  # noqa: E402
+from firebase.firebase_client import get_backend, save_predictions_bulk, set_backend  # noqa: E402
+from firebase.local_database import LocalDatabase  # noqa: E402
+from predictor.energy_predictor import (  # noqa: E402
+    FEATURES,
+    get_model,
+    predict_5min_energy,
+    predict_5min_energy_batch,
+)
+from services.intraday_forecast import SLOT_SECONDS, IntradayForecaster, clear_sky_shape  # noqa: E402
+from services.prediction_service import calculate_5min_system_energy  # noqa: E402
+from utils.sensor_mapper import map_firebase_to_model_features  # noqa: E402
+from utils.synthetic_fleet import fleet_sites  # noqa: E402
+
+BASELINE_DIR = ENGINE_DIR / "benchmarks" / "baselines"
+PANEL_AREA_M2 = 25
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """
+    Registers case(args) → result dict under name
+    """
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+# --------------------------------------------------
+# TIMING
+# --------------------------------------------------
+
+def summarize(samples_s, rows_per_sample: int, total_s: float = None) -> dict:
+    """
+    Latency percentiles (ms) of per-call samples and rows/sec
+    """
+    samples = np.asarray(samples_s, dtype=np.float64)
+    total_s = float(samples.sum()) if total_s is None else total_s
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+    return {
+        "calls": int(samples.size),
+        "rows_per_call": rows_per_sample,
+        "mean_ms": round(float(samples.mean()) * 1000, 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(samples.max()) * 1000, 4),
+        "rows_per_s": round(samples.size * rows_per_sample / total_s, 1) if total_s else 0.0,
+    }
+
+
+def time_calls(func, inputs: list, warmup: int) -> list:
+    """
+    Calls func(x) for every input and returns the per-call durations
+    """
+    for x in inputs[:warmup]:
+        func(x)
+
+    samples = []
+    clock = time.perf_counter
+    for x in inputs:
+        start = clock()
+        func(x)
+        samples.append(clock() - start)
+    return samples
+
+
+def _payloads(args) -> list:
+    rng = random.Random(args.seed)
+    return [make_payload(rng) for _ in range(args.iterations)]
+
+
+def _feature_dicts(args) -> list:
+    return [map_firebase_to_model_features(raw) for raw in _payloads(args)]
+
+
+# --------------------------------------------------
+# CASES
+# --------------------------------------------------
+
+@benchmark("map_features")
+def bench_map_features(args) -> dict:
+    samples = time_calls(map_firebase_to_model_features, _payloads(args), args.warmup)
+    return summarize(samples, 1)
+
+
+@benchmark("predict_single")
+def bench_predict_single(args) -> dict:
+    samples = time_calls(predict_5min_energy, _feature_dicts(args), args.warmup)
+    return summarize(samples, 1)
+
+
+@benchmark("predict_batch")
+def bench_predict_batch(args) -> dict:
+    rows = np.array(
+        [[f[k] for k in FEATURES] for f in _feature_dicts(args)],
+        dtype=np.float64
+    )
+    batches = [
+        rows[i:i + args.batch_size]
+        for i in range(0, len(rows) - args.batch_size + 1, args.batch_size)
+    ] or [rows]
+    # Enough batches for stable percentiles
+    batches = (batches * (1 + args.min_batches // len(batches)))[:max(args.min_batches, len(batches))]
+
+    samples = time_calls(predict_5min_energy_batch, batches, args.warmup)
+    return summarize(samples, len(batches[0]))
+
+
+@benchmark("system_energy")
+def bench_system_energy(args) -> dict:
+    samples = time_calls(
+        lambda f: calculate_5min_system_energy(f, PANEL_AREA_M2),
+        _feature_dicts(args),
+        args.warmup
+    )
+    return summarize(samples, 1)
+
+
+@benchmark("event_to_persist")
+def bench_event_to_persist(args) -> dict:
+    """
+    Per record: devices/ write until its prediction's bulk write returns
+    """
+    previous_backend = get_backend()
+    database = LocalDatabase()
+    set_backend(database)
+
+    sites = fleet_sites(args.devices)
+    payloads = _payloads(args)
+
+    written_at = {}
+    samples = []
+    lock = threading.Lock()
+
+    def timed_writer(updates: dict):
+        save_predictions_bulk(updates)
+        now = time.perf_counter()
+        with lock:
+            for path in updates:
+                started = written_at.pop(path, None)
+                if started is not None:
+                    samples.append(now - started)
+
+    pipeline = Pipeline(
+        database,
+        SimpleNamespace(
+            mode="multiplexed",
+            batch_size=args.batch_size,
+            max_wait_ms=args.max_wait_ms,
+            queue_size=max(10000, len(payloads)),
+            write_batch=args.write_batch,
+            flush_interval_s=args.flush_interval_s,
+        ),
+        writer=timed_writer
+    )
+    pipeline.start(sites)
+
+    start_dt = datetime(2026, 1, 1, 6, 0, 0)
+    first = time.perf_counter()
+    for i, raw in enumerate(payloads):
+        site = sites[i % len(sites)]
+        record_key = (start_dt + timedelta(minutes=5 * (i // len(sites)))).strftime("%Y%m%d_%H%M%S")
+        prediction_path = f"predicted_units/{site['customer']}/{site['site_id']}/{record_key}"
+        with lock:
+            written_at[prediction_path] = time.perf_counter()
+        database.reference(f"devices/{site['device_id']}/{record_key}").set(raw)
+        if args.rate:
+            time.sleep(1.0 / args.rate)
+
+    deadline = time.monotonic() + args.drain_timeout_s
+    while len(samples) < len(payloads) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    total_s = time.perf_counter() - first
+    # Writes pipeline.stop() flushes late are not part of the measurement
+    with lock:
+        persisted = list(samples)
+
+    pipeline.stop()
+    set_backend(previous_backend)
+
+    if len(persisted) < len(payloads):
+        return {
+            "error": f"only {len(persisted)}/{len(payloads)} predictions persisted "
+                     f"within {args.drain_timeout_s:.0f}s"
+        }
+    result = summarize(persisted, 1, total_s)
+    result["persisted"] = len(persisted)
+    result["records"] = len(payloads)
+    return result
+
+
+def _intraday_fleet(args, days: int = 14) -> tuple:
+    """
+    IntradayForecaster fitted on `days` of synthetic 5-minute history for
+    --devices sites, and the next point of every site
+    """
+    rng = np.random.default_rng(args.seed)
+    shape = clear_sky_shape(180)
+    start = datetime(2026, 1, 1).timestamp()
+    ts = start + np.arange(days * len(shape)) * SLOT_SECONDS
+    forecaster = IntradayForecaster()
+    for site in range(args.devices):
+        kwh = np.tile(shape, days) * 0.375 * rng.uniform(0.3, 1.0, ts.size)
+        forecaster.fit(f"bench/{site}", ts, kwh)
+    return forecaster, ts[-1] + SLOT_SECONDS
+
+
+@benchmark("intraday_update")
+def bench_intraday_update(args) -> dict:
+    forecaster, next_ts = _intraday_fleet(args)
+    rng = np.random.default_rng(args.seed)
+    points = [
+        (f"bench/{i % args.devices}", next_ts + (i // args.devices) * SLOT_SECONDS, float(v))
+        for i, v in enumerate(rng.uniform(0, 0.4, args.iterations))
+    ]
+    samples = time_calls(lambda p: forecaster.update(*p), points, 0)
+    return summarize(samples, 1)
+
+
+@benchmark("intraday_fleet")
+def bench_intraday_fleet(args) -> dict:
+    forecaster, _ = _intraday_fleet(args)
+    samples = time_calls(lambda _: forecaster.forecast_all(36), list(range(args.min_batches)), 1)
+    return summarize(samples, args.devices)
+
+
+# --------------------------------------------------
+# BASELINES
+# --------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ENGINE_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def save_baseline(name: str, results: dict, args) -> Path:
+    path = Path(name)
+    if path.suffix != ".json":
+        path = BASELINE_DIR / f"{name}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("save", "compare", "only")},
+            "results": results,
+        }, f, indent=2)
+    return path
+
+
+# Lower is better for latencies, higher for throughput
+COMPARED_METRICS = (("p50_ms", -1), ("p95_ms", -1), ("p99_ms", -1), ("rows_per_s", 1))
+
+
+def compare_baseline(path, results: dict, threshold_pct: float) -> list:
+    """
+    Prints the change of every metric against a saved run and returns
+    the regressions beyond threshold_pct
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\nCompared with {path} (commit {baseline.get('commit')}, {baseline.get('created_at')})")
+    regressions = []
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if not old or "error" in old or "error" in result:
+            print(f"  {name}: no comparable baseline")
+            continue
+        parts = []
+        for metric, direction in COMPARED_METRICS:
+            before, after = old.get(metric), result.get(metric)
+            if not before:
+                continue
+            change_pct = (after - before) / before * 100
+            worse = -change_pct * direction
+            flag = ""
+            if worse > threshold_pct:
+                flag = " !"
+                regressions.append((name, metric, round(change_pct, 1)))
+            parts.append(f"{metric} {before} → {after} ({change_pct:+.1f}%){flag}")
+        print(f"  {name}: " + ", ".join(parts))
+    return regressions
+
+
+# --------------------------------------------------
+# ENTRY POINT
+# --------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run (default: all)")
+    parser.add_argument("--iterations", type=int, default=2000, help="Records per benchmark")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--min-batches", type=int, default=50)
+    parser.add_argument("--devices", type=int, default=100, help="Devices in the event_to_persist / intraday fleet")
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--write-batch", type=int, default=500)
+    parser.add_argument("--flush-interval-s", type=float, default=0.2)
+    parser.add_argument("--rate", type=float, default=0, help="event_to_persist records/sec (0: as fast as possible)")
+    parser.add_argument("--drain-timeout-s", type=float, default=60,
+                        help="event_to_persist fails if not every record is persisted this long after the last write")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", metavar="NAME", help="Save results to benchmarks/baselines/NAME.json (or a .json path)")
+    parser.add_argument("--compare", metavar="PATH", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    # Nothing in the suite may touch the real database
+    set_backend(LocalDatabase())
+
+    # Load the model once so no case pays for it
+    get_model()
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"[BENCH] {name}...", flush=True)
+        results[name] = BENCHMARKS[name](args)
+
+    print("\nBenchmark results")
+    print(f"  {'name':<18} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'rows/s':>12}")
+    for name, r in results.items():
+        if "error" in r:
+            print(f"  {name:<18} {r['error']}")
+            continue
+        print(f"  {name:<18} {r['p50_ms']:>10} {r['p95_ms']:>10} {r['p99_ms']:>10} {r['rows_per_s']:>12,.0f}")
+
+    failed = [name for name, r in results.items() if "error" in r]
+    if args.save:
+        if failed:
+            print(f"\nNot saving a baseline, failed: {failed}")
+            sys.exit(1)
+        print(f"\nSaved baseline: {save_baseline(args.save, results, args)}")
+
+    if args.compare:
+        regressions = compare_baseline(args.compare, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold}%: {regressions}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Load test: mixed XAI / forecast traffic against the XAI server.
+
+Closed-loop clients send a weighted mix of requests for a fixed time:
+
+    shap                POST /api/xai/shap, random 5-minute record
+    lime                POST /api/xai/lime
+    feature_importance  GET  /api/xai/feature-importance
+    forecast            POST /api/timeseries/forecast, one of --series
+                        synthetic daily series (the first request per
+                        series fits, later ones may be served cached)
+
+and report p50 / p95 / p99 latency, errors and 503s per route. Run it
+against both servers to compare SHAP latency while fits are running:
+
+    python xai_server.py                 # Flask, port 8085
+    PORT=8086 python xai_asgi.py         # ASGI, port 8086
+
+    python benchmarks/xai_load_test.py --url http://localhost:8085 --clients 32 --duration 60
+    python benchmarks/xai_load_test.py --url http://localhost:8086 --mix shap=70,forecast=30
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ENGINE_DIR))
+
+import numpy as np  # noqa: E402
+
+from benchmarks.bench_batch_inference import make_payload  # noqa: E402
+from utils.sensor_mapper import map_firebase_to_model_features  # noqa: E402
+
+DEFAULT_MIX = "shap=60,lime=20,feature_importance=5,forecast=15"
+
+
+def synthetic_daily_series(seed: int, days: int = 120) -> list:
+    """
+    Daily kWh with a yearly swing, a weekly pattern and cloudy days
+    """
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    weekly = [rng.uniform(0.9, 1.1) for _ in range(7)]
+    series = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        seasonal = 1 + 0.25 * math.sin(2 * math.pi * (day.timetuple().tm_yday - 80) / 365)
+        cloud = rng.uniform(0.3, 0.7) if rng.random() < 0.15 else rng.uniform(0.9, 1.05)
+        series.append({"date": day.isoformat(), "totalKwh": round(30 * seasonal * weekly[day.weekday()] * cloud, 3)})
+    return series
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for item in filter(None, text.split(",")):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"shap", "lime", "feature_importance", "forecast"}
+    if unknown:
+        raise SystemExit(f"Unknown routes in --mix: {sorted(unknown)}")
+    return mix
+
+
+class Traffic:
+    """
+    Builds requests and collects per-route latencies
+    """
+
+    def __init__(self, args):
+        self.url = args.url.rstrip("/")
+        self.timeout = args.timeout
+        self.series = [synthetic_daily_series(args.seed + i, args.days) for i in range(args.series)]
+        self.periods = args.periods
+        self.samples = {}
+        self.errors = {}
+        self.rejected = {}
+        self._lock = threading.Lock()
+
+    def _request(self, route: str, rng: random.Random):
+        if route == "feature_importance":
+            return urllib.request.Request(f"{self.url}/api/xai/feature-importance")
+
+        if route == "forecast":
+            i = rng.randrange(len(self.series))
+            body = {"daily_data": self.series[i], "periods": self.periods, "series_id": f"load/{i}"}
+            path = "/api/timeseries/forecast"
+        else:
+            body = {"features": map_firebase_to_model_features(make_payload(rng))}
+            path = "/api/xai/shap" if route == "shap" else "/api/xai/lime"
+        return urllib.request.Request(
+            f"{self.url}{path}",
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+
+    def call(self, route: str, rng: random.Random):
+        request = self._request(route, rng)
+        start = time.perf_counter()
+        status = None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            if status == 200:
+                self.samples.setdefault(route, []).append(elapsed)
+            elif status == 503:
+                self.rejected[route] = self.rejected.get(route, 0) + 1
+            else:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def run(args) -> Traffic:
+    traffic = Traffic(args)
+    mix = parse_mix(args.mix)
+    routes, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + args.duration
+
+    def client(index: int):
+        rng = random.Random(args.seed * 1000 + index)
+        while time.monotonic() < deadline:
+            traffic.call(rng.choices(routes, weights)[0], rng)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return traffic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8085")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="route=weight,... (shap, lime, feature_importance, forecast)")
+    parser.add_argument("--series", type=int, default=50, help="Distinct daily series for forecast requests")
+    parser.add_argument("--days", type=int, default=120, help="Days per series")
+    parser.add_argument("--periods", type=int, default=30)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"[BENCH] {args.clients} clients for {args.duration:.0f}s against {args.url} ({args.mix})", flush=True)
+    traffic = run(args)
+
+    print(f"\n  {'route':<20} {'ok':>7} {'req/s':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'503':>6} {'errors':>7}")
+    for route in parse_mix(args.mix):
+        samples = np.asarray(traffic.samples.get(route, []))
+        if samples.size:
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+        else:
+            p50 = p95 = p99 = float("nan")
+        print(
+            f"  {route:<20} {samples.size:>7} {samples.size / args.duration:>8.1f} "
+            f"{p50:>10.1f} {p95:>10.1f} {p99:>10.1f} "
+            f"{traffic.rejected.get(route, 0):>6} {traffic.errors.get(route, 0):>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
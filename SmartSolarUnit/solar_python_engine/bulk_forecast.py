@@ -0,0 +1,82 @@
+"""
+Smart Solar Advisor
+Nightly bulk forecasts for every site
+
+Fits each site's daily series (rollups/{customer}/{site_id}) in parallel
+worker processes and writes one JSON result per line as soon as each site
+is done. Each site uses the model selected by backtest_forecasts.py, or
+Prophet; sites whose Prophet fit fails fall back to SARIMA.
+
+Run:
+    python bulk_forecast.py --periods 30 --workers 8 > forecasts.ndjson
+    python bulk_forecast.py --input series.json --out forecasts.ndjson
+
+--input takes a JSON list (or NDJSON) of {"series_id", "daily_data"}
+objects instead of reading the configured sites.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from services.bulk_forecast import BULK_FORECAST_WORKERS, iter_bulk_forecasts, iter_ndjson
+
+
+def _read_jobs(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(stripped)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast every site's daily energy in parallel")
+    parser.add_argument("--periods", type=int, default=30)
+    parser.add_argument("--model", choices=("auto", "prophet", "sarima", "seasonal_naive"), default="auto",
+                        help="auto: the model backtest_forecasts.py selected per site, else Prophet")
+    parser.add_argument("--workers", type=int, default=BULK_FORECAST_WORKERS)
+    parser.add_argument("--window", type=int, help="Series in flight at once (default: 2 x workers)")
+    parser.add_argument("--sites-file", help="Site config JSON (default: config/sites.json)")
+    parser.add_argument("--input", help="JSON / NDJSON file of series instead of the configured sites")
+    parser.add_argument("--out", help="Output NDJSON file (default: stdout)")
+    args = parser.parse_args()
+
+    if args.input:
+        jobs = _read_jobs(args.input)
+    else:
+        from utils.site_config import load_sites, load_sites_from_file
+
+        sites = load_sites_from_file(args.sites_file) if args.sites_file else load_sites()
+        jobs = [{"customer": s["customer"], "site_id": s["site_id"]} for s in sites]
+
+    jobs = [{"periods": args.periods, "model": args.model, **job} for job in jobs]
+    print(f"Forecasting {len(jobs)} series with {args.workers} worker(s)", file=sys.stderr)
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    started = time.perf_counter()
+    done = failed = fallbacks = 0
+    try:
+        results = iter_bulk_forecasts(jobs, max_workers=args.workers, window=args.window)
+        for result in results:
+            out.write(next(iter_ndjson([result])))
+            out.flush()
+            done += 1
+            failed += bool(result.get("error"))
+            fallbacks += "fallback_from" in result
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Done: {done} series, {failed} failed, {fallbacks} SARIMA fallbacks "
+        f"in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.2f} series/s)",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
-from firebase_admin import db
 from utils.sensor_mapper import map_firebase_to_model_features
 from services.prediction_service import calculate_5min_system_energy
-from utils.time_utils import firebase_safe_timestamp
-from firebase.firebase_client import save_prediction
+from utils.time_utils import firebase_safe_timestamp, record_key_from_event_path
+from firebase.firebase_client import get_reference, save_prediction
 
 def start_device_listener(site_config):
     """
@@ -14,7 +13,7 @@ def start_device_listener(site_config):
     site_id = site_config["site_id"]
     panel_area = site_config["panel_area_m2"]
 
-    ref = db.reference(f"devices/{device_id}")
+    ref = get_reference(f"devices/{device_id}")
 
     def on_event(event):
         # Trigger only when new child is added
@@ -35,7 +34,8 @@ def start_device_listener(site_config):
                 panel_area
             )
 
-            timestamp = firebase_safe_timestamp()
+            # Key by the sensor record so replays overwrite, not duplicate
+            timestamp = record_key_from_event_path(event.path) or firebase_safe_timestamp()
 
             save_prediction(
                 customer,
@@ -1,17 +1,88 @@
-import firebase_admin
-from firebase_admin import credentials, db
 import os
+import threading
+from pathlib import Path
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
-cred = credentials.Certificate("firebase_key.json")
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+FIREBASE_KEY_PATH = Path(os.getenv("FIREBASE_KEY_PATH", ENGINE_DIR / "firebase_key.json"))
+
+# "firebase" (default) or "local": an in-process LocalDatabase, optionally
+# seeded from the JSON snapshot at LOCAL_DB_SNAPSHOT
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firebase")
+LOCAL_DB_SNAPSHOT = os.getenv("LOCAL_DB_SNAPSHOT")
+
+_init_lock = threading.Lock()
+_backend = None
+
+
+def set_backend(backend):
+    """
+    Routes every get_reference() call to backend.reference(path),
+    e.g. a LocalDatabase for offline runs. None restores Firebase.
+    """
+    global _backend
+    _backend = backend
+
+
+def get_backend():
+    """
+    The active non-Firebase backend, creating the local one on first use
+    when STORAGE_BACKEND=local; None when Firebase is used
+    """
+    global _backend
+    if _backend is None and STORAGE_BACKEND == "local":
+        with _init_lock:
+            if _backend is None:
+                from firebase.local_database import LocalDatabase
+
+                if LOCAL_DB_SNAPSHOT and Path(LOCAL_DB_SNAPSHOT).exists():
+                    _backend = LocalDatabase.load(LOCAL_DB_SNAPSHOT)
+                else:
+                    _backend = LocalDatabase()
+    return _backend
+
+
+def init_firebase():
+    """
+    Initializes the Firebase app on first use (not at import), so tools
+    that never touch the database do not pay for it
+    """
+    if get_backend() is not None:
+        return
+
+    import firebase_admin
+
+    if firebase_admin._apps:
+        return
+
+    with _init_lock:
+        if firebase_admin._apps:
+            return
+
+        from firebase_admin import credentials
+
+        cred = credentials.Certificate(str(FIREBASE_KEY_PATH))
+        firebase_admin.initialize_app(
+            cred,
+            {"databaseURL": os.getenv("FIREBASE_DB_URL")}
+        )
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(
-        cred,
-        {"databaseURL": os.getenv("FIREBASE_DB_URL")}
-    )
+
+def get_reference(path: str = "/"):
+    """
+    db.reference(path) with the app initialized, or the same path on the
+    backend installed with set_backend() / STORAGE_BACKEND
+    """
+    backend = get_backend()
+    if backend is not None:
+        return backend.reference(path)
+
+    init_firebase()
+    from firebase_admin import db
+    return db.reference(path)
 
 
 def get_latest_device_data(device_id: str):
@@ -19,7 +90,7 @@ def get_latest_device_data(device_id: str):
     Reads the most recent record from:
     devices/{device_id}/latest_timestamp
     """
-    ref = db.reference(f"devices/{device_id}")
+    ref = get_reference(f"devices/{device_id}")
     data = ref.order_by_key().limit_to_last(1).get()
 
     if not data:
@@ -33,7 +104,69 @@ def save_prediction(customer, site_id, timestamp, payload):
     Saves prediction to:
     predicted_units/{customer}/{site_id}/{timestamp}
     """
-    ref = db.reference(
+    ref = get_reference(
         f"predicted_units/{customer}/{site_id}/{timestamp}"
     )
     ref.set(payload)
+
+
+def save_predictions_bulk(updates: dict):
+    """
+    Writes many predictions in one multi-location update:
+    {"predicted_units/{customer}/{site_id}/{timestamp}": payload, ...}
+    """
+    if not updates:
+        return
+    get_reference().update(updates)
+
+
+def iter_device_history_pages(device_id: str, page_size: int = 1000, start_key: str = None, end_key: str = None):
+    """
+    Streams devices/{device_id} in key order, one page at a time.
+    Yields lists of (record_key, record); start_key is exclusive so a
+    checkpointed key is not processed twice.
+    """
+    ref = get_reference(f"devices/{device_id}")
+    cursor = start_key
+
+    while True:
+        query = ref.order_by_key()
+        if cursor is not None:
+            # start_at is inclusive; fetch one extra to skip the cursor itself
+            query = query.start_at(cursor).limit_to_first(page_size + 1)
+        else:
+            query = query.limit_to_first(page_size)
+        if end_key is not None:
+            query = query.end_at(end_key)
+
+        data = query.get() or {}
+        page = [(k, v) for k, v in data.items() if k != cursor]
+
+        if not page:
+            return
+
+        yield page
+
+        if len(data) < (page_size + 1 if cursor is not None else page_size):
+            return
+        cursor = page[-1][0]
+
+
+def get_daily_rollups(customer: str, site_id: str, start_date: str = None, end_date: str = None) -> list:
+    """
+    Reads rollups/{customer}/{site_id} (maintained by the realtime engine)
+    as [{"date": "YYYY-MM-DD", "totalKwh": float}, ...], the daily series
+    format of the time-series service
+    """
+    query = get_reference(f"rollups/{customer}/{site_id}").order_by_key()
+    if start_date is not None:
+        query = query.start_at(start_date)
+    if end_date is not None:
+        query = query.end_at(end_date)
+
+    data = query.get() or {}
+    return [
+        {"date": day, "totalKwh": rollup.get("total_kwh", 0.0)}
+        for day, rollup in data.items()
+        if isinstance(rollup, dict)
+    ]
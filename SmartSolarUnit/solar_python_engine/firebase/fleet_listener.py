@@ -0,0 +1,110 @@
+"""
+Multiplexed ingestion: one Firebase stream on devices/ for the whole fleet.
+
+Instead of one SSE connection per device, a single listener on the
+devices/ root receives every child event and routes it to the handler of
+the device named in event.path:
+
+    put   /SSA_ESP32_01/20260101_060000  → one new sensor record
+    patch /SSA_ESP32_01                  → {record_key: record, ...}
+    put   /                              → initial snapshot (ignored)
+"""
+
+import threading
+
+from firebase.firebase_client import get_reference
+
+
+def split_event_path(path: str) -> list:
+    """
+    "/SSA_ESP32_01/20260101_060000" → ["SSA_ESP32_01", "20260101_060000"]
+    """
+    return [part for part in (path or "").split("/") if part]
+
+
+class FleetEventRouter:
+    """
+    Routes root-level device events to per-device handlers.
+
+    handler(record_key, record) is called once per new sensor record.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._lock = threading.Lock()
+
+        self.records_routed = 0
+        self.events_ignored = 0
+        self.unknown_devices = 0
+
+    def register(self, device_id: str, handler):
+        with self._lock:
+            self._handlers[device_id] = handler
+
+    def unregister(self, device_id: str):
+        with self._lock:
+            self._handlers.pop(device_id, None)
+
+    @property
+    def device_count(self) -> int:
+        return len(self._handlers)
+
+    def _route_record(self, device_id: str, record_key: str, record):
+        # Ignore deletes and partial values
+        if not isinstance(record, dict):
+            self.events_ignored += 1
+            return
+
+        handler = self._handlers.get(device_id)
+        if handler is None:
+            self.unknown_devices += 1
+            return
+
+        self.records_routed += 1
+        handler(record_key, record)
+
+    def route(self, event):
+        """
+        Firebase Realtime Database event handler for the devices/ root
+        """
+        parts = split_event_path(event.path)
+
+        # Initial full snapshot of devices/
+        if not parts:
+            self.events_ignored += 1
+            return
+
+        device_id = parts[0]
+
+        if len(parts) == 1:
+            # Several records written to one device in a single update()
+            if event.event_type == "patch" and isinstance(event.data, dict):
+                for record_key, record in event.data.items():
+                    self._route_record(device_id, record_key, record)
+            else:
+                # Whole device node replaced / first snapshot of a device
+                self.events_ignored += 1
+            return
+
+        if len(parts) == 2:
+            self._route_record(device_id, parts[1], event.data)
+            return
+
+        # Field-level update inside an existing record
+        self.events_ignored += 1
+
+    def stats(self) -> dict:
+        return {
+            "devices": self.device_count,
+            "records_routed": self.records_routed,
+            "events_ignored": self.events_ignored,
+            "unknown_device_events": self.unknown_devices,
+        }
+
+
+def start_fleet_listener(router: FleetEventRouter, root: str = "devices", reference_factory=None):
+    """
+    Opens the single devices/ stream and returns its ListenerRegistration
+    """
+    reference_factory = reference_factory or get_reference
+    return reference_factory(root).listen(router.route)
@@ -0,0 +1,417 @@
+"""
+In-process stand-in for Firebase Realtime Database.
+
+Implements the part of firebase_admin.db the engine uses, so ingestion,
+rollups and replays can run and be benchmarked without a network:
+
+    db = LocalDatabase()
+    ref = db.reference("devices/SSA_ESP32_01")
+    ref.child("20260101_060000").set(record)
+    ref.order_by_key().limit_to_last(1).get()
+    ref.listen(callback)          # put / patch events, like the SSE stream
+    db.reference().update({"predicted_units/dilshan/site_001/...": {...}})
+
+Install it for the whole engine with STORAGE_BACKEND=local or
+firebase_client.set_backend(db). Data lives in a nested dict; dump() /
+load() save and restore it as JSON.
+
+Listener events are delivered on one dispatcher thread in write order,
+like firebase_admin's per-listener SSE thread; pass async_events=False
+to deliver them on the writing thread instead.
+"""
+
+import json
+import queue
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+# Marks a listener whose whole node was replaced by a write above it
+_REPLACED = object()
+
+
+def _split(path: str) -> list:
+    return [part for part in (path or "").split("/") if part]
+
+
+def _join(parts) -> str:
+    return "/".join(parts)
+
+
+def _copy(value):
+    """
+    Copy of a JSON-like value with None children and empty dicts removed,
+    the way Firebase stores them. Returns None for "no value".
+    """
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            v = _copy(v)
+            if v is not None:
+                out[str(k)] = v
+        return out or None
+    if isinstance(value, (list, tuple)):
+        # Firebase stores arrays as index-keyed objects
+        return _copy({str(i): v for i, v in enumerate(value)})
+    return value
+
+
+def _key_sort(key: str):
+    """
+    Firebase key order: 32-bit integer keys numerically, then strings
+    """
+    try:
+        n = int(key)
+        if -2 ** 31 <= n < 2 ** 31 and str(n) == key:
+            return (0, n, "")
+    except ValueError:
+        pass
+    return (1, 0, key)
+
+
+class LocalEvent:
+    __slots__ = ("event_type", "path", "data")
+
+    def __init__(self, event_type: str, path: str, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+    def __repr__(self):
+        return f"LocalEvent({self.event_type!r}, {self.path!r})"
+
+
+class LocalListenerRegistration:
+    def __init__(self, database, listener_id: int):
+        self._database = database
+        self._listener_id = listener_id
+
+    def close(self):
+        self._database._remove_listener(self._listener_id)
+
+
+class LocalQuery:
+    """
+    order_by_key() query; start_at / end_at are inclusive, like Firebase
+    """
+
+    def __init__(self, reference):
+        self._reference = reference
+        self._start = None
+        self._end = None
+        self._first = None
+        self._last = None
+
+    def start_at(self, key: str) -> "LocalQuery":
+        self._start = str(key)
+        return self
+
+    def end_at(self, key: str) -> "LocalQuery":
+        self._end = str(key)
+        return self
+
+    def limit_to_first(self, n: int) -> "LocalQuery":
+        self._first = int(n)
+        return self
+
+    def limit_to_last(self, n: int) -> "LocalQuery":
+        self._last = int(n)
+        return self
+
+    def get(self):
+        data = self._reference._database._get(self._reference._parts)
+        if not isinstance(data, dict):
+            return OrderedDict()
+
+        keys = sorted(data, key=_key_sort)
+        if self._start is not None:
+            start = _key_sort(self._start)
+            keys = [k for k in keys if _key_sort(k) >= start]
+        if self._end is not None:
+            end = _key_sort(self._end)
+            keys = [k for k in keys if _key_sort(k) <= end]
+        if self._first is not None:
+            keys = keys[:self._first]
+        if self._last is not None:
+            keys = keys[-self._last:] if self._last > 0 else []
+
+        return OrderedDict((k, data[k]) for k in keys)
+
+
+class LocalReference:
+    def __init__(self, database, path: str):
+        self._database = database
+        self._parts = _split(path)
+        self.path = "/" + _join(self._parts)
+
+    @property
+    def key(self):
+        return self._parts[-1] if self._parts else None
+
+    def child(self, path: str) -> "LocalReference":
+        return LocalReference(self._database, _join(self._parts + _split(path)))
+
+    def get(self):
+        return self._database._get(self._parts)
+
+    def set(self, value):
+        self._database._set(self._parts, value)
+
+    def update(self, value: dict):
+        if not isinstance(value, dict) or not value:
+            raise ValueError("update() needs a non-empty dict")
+        self._database._update(self._parts, value)
+
+    def delete(self):
+        self._database._set(self._parts, None)
+
+    def push(self, value=None) -> "LocalReference":
+        ref = self.child(self._database._push_id())
+        if value is not None:
+            ref.set(value)
+        return ref
+
+    def order_by_key(self) -> LocalQuery:
+        return LocalQuery(self)
+
+    def listen(self, callback) -> LocalListenerRegistration:
+        return self._database._add_listener(self._parts, callback)
+
+
+class LocalDatabase:
+    def __init__(self, data: dict = None, async_events: bool = True):
+        self._root = _copy(data) or {}
+        self._lock = threading.RLock()
+
+        # listener_id → path key; path key → {listener_id: callback}
+        self._listeners = {}
+        self._listeners_by_path = {}
+        self._max_listener_depth = 0
+        self._next_listener_id = 0
+        self._push_counter = 0
+
+        self.async_events = async_events
+        self._events = queue.Queue()
+        self._dispatcher = None
+
+        self.reads = 0
+        self.writes = 0
+        self.events_emitted = 0
+
+    def reference(self, path: str = "/") -> LocalReference:
+        return LocalReference(self, path)
+
+    # --------------------------------------------------
+    # STORAGE
+    # --------------------------------------------------
+
+    def _node(self, parts: list):
+        node = self._root
+        for part in parts:
+            if not isinstance(node, dict):
+                return None
+            node = node.get(part)
+            if node is None:
+                return None
+        return node
+
+    def _get(self, parts: list):
+        with self._lock:
+            self.reads += 1
+            value = self._node(parts)
+            # Callers may mutate what they read
+            return _copy(value)
+
+    def _write(self, parts: list, value):
+        """
+        Stores an already copied value; prunes parents left empty
+        """
+        if not parts:
+            self._root = value if isinstance(value, dict) else {}
+            return
+
+        node = self._root
+        trail = []
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[part] = {}
+            trail.append((node, part))
+            node = child
+
+        if value is None:
+            node.pop(parts[-1], None)
+            for parent, part in reversed(trail):
+                if parent[part]:
+                    break
+                del parent[part]
+        else:
+            node[parts[-1]] = value
+
+    def _set(self, parts: list, value):
+        value = _copy(value)
+        with self._lock:
+            self.writes += 1
+            self._write(parts, value)
+            self._notify([(parts, value)], parts, "put")
+
+    def _update(self, parts: list, values: dict):
+        """
+        Multi-location update: keys may be nested paths
+        """
+        writes = [(parts + _split(key), _copy(value)) for key, value in values.items()]
+        with self._lock:
+            self.writes += 1
+            for path, value in writes:
+                self._write(path, value)
+            self._notify(writes, parts, "patch")
+
+    def _push_id(self) -> str:
+        with self._lock:
+            self._push_counter += 1
+            return f"-L{self._push_counter:019d}"
+
+    # --------------------------------------------------
+    # LISTENERS
+    # --------------------------------------------------
+
+    def _add_listener(self, parts: list, callback) -> LocalListenerRegistration:
+        key = tuple(parts)
+        with self._lock:
+            listener_id = self._next_listener_id
+            self._next_listener_id += 1
+            self._listeners[listener_id] = key
+            self._listeners_by_path.setdefault(key, {})[listener_id] = callback
+            self._max_listener_depth = max(self._max_listener_depth, len(key))
+            # Firebase always sends the current value first
+            self._deliver(callback, LocalEvent("put", "/", _copy(self._node(parts))))
+        return LocalListenerRegistration(self, listener_id)
+
+    def _remove_listener(self, listener_id: int):
+        with self._lock:
+            key = self._listeners.pop(listener_id, None)
+            if key is None:
+                return
+            callbacks = self._listeners_by_path.get(key, {})
+            callbacks.pop(listener_id, None)
+            if not callbacks:
+                self._listeners_by_path.pop(key, None)
+
+    @property
+    def listener_count(self) -> int:
+        return len(self._listeners)
+
+    def _notify(self, writes: list, base: list, event_type: str):
+        """
+        Emits the events each listener would receive for one write.
+        Called with the lock held, so events keep write order.
+
+        Listeners are indexed by path, so a write only looks up its own
+        ancestors instead of scanning every listener of a large fleet.
+        """
+        # Listeners at or above the write path get the write as is
+        for depth in range(len(base) + 1):
+            callbacks = self._listeners_by_path.get(tuple(base[:depth]))
+            if not callbacks:
+                continue
+            relative = "/" + _join(base[depth:])
+            if event_type == "patch":
+                data = {_join(path[len(base):]): value for path, value in writes}
+            else:
+                data = writes[0][1]
+            for callback in list(callbacks.values()):
+                self._deliver(callback, LocalEvent(event_type, relative, _copy(data)))
+
+        if len(base) >= self._max_listener_depth:
+            return
+
+        # Listeners below the write path only see the parts that reach them
+        touched = {}
+        for path, value in writes:
+            for depth in range(len(base) + 1, min(len(path), self._max_listener_depth) + 1):
+                key = tuple(path[:depth])
+                if key not in self._listeners_by_path:
+                    continue
+                if depth == len(path):
+                    touched[key] = _REPLACED
+                elif touched.get(key) is not _REPLACED:
+                    touched.setdefault(key, {})[_join(path[depth:])] = value
+
+            if len(path) < self._max_listener_depth:
+                prefix = tuple(path)
+                for key in self._listeners_by_path:
+                    if len(key) > len(prefix) and key[:len(prefix)] == prefix:
+                        touched[key] = _REPLACED
+
+        for key, entry in touched.items():
+            if entry is _REPLACED:
+                event = LocalEvent("put", "/", _copy(self._node(list(key))))
+            elif len(entry) == 1:
+                (relative, value), = entry.items()
+                event = LocalEvent("put", "/" + relative, _copy(value))
+            else:
+                event = LocalEvent("patch", "/", _copy(entry))
+            for callback in list(self._listeners_by_path[key].values()):
+                self._deliver(callback, event)
+
+    def _deliver(self, callback, event: LocalEvent):
+        self.events_emitted += 1
+        if not self.async_events:
+            callback(event)
+            return
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(
+                target=self._dispatch, name="local-db-events", daemon=True
+            )
+            self._dispatcher.start()
+        self._events.put((callback, event))
+
+    def _dispatch(self):
+        while True:
+            callback, event = self._events.get()
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"[ERROR] Local listener callback failed: {e}")
+            finally:
+                self._events.task_done()
+
+    def wait_for_events(self):
+        """
+        Blocks until every emitted event has been delivered
+        """
+        if self._dispatcher is not None:
+            self._events.join()
+
+    @property
+    def pending_events(self) -> int:
+        return self._events.qsize()
+
+    # --------------------------------------------------
+    # SNAPSHOTS
+    # --------------------------------------------------
+
+    def dump(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self._root, f)
+        return path
+
+    @classmethod
+    def load(cls, path, **kwargs) -> "LocalDatabase":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "reads": self.reads,
+            "writes": self.writes,
+            "events_emitted": self.events_emitted,
+            "pending_events": self.pending_events,
+            "listeners": self.listener_count,
+        }
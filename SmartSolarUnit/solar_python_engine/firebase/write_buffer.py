@@ -0,0 +1,249 @@
+"""
+Write-behind buffer for predicted_units.
+
+Coalesces predictions from many sites and writes them with one
+multi-location update:
+
+    db.reference().update({
+        "predicted_units/dilshan/site_001/20260101_060000": {...},
+        "predicted_units/kamal/site_002/20260101_060000": {...},
+    })
+
+A flush happens when max_batch_size writes are pending or flush_interval_s
+has passed since the oldest pending write. Failed flushes are retried with
+exponential backoff; writes that still fail are counted as dropped.
+
+When stage_metrics (a StageLatencyMetrics) is given, every confirmed
+prediction write records predicted → persisted and end-to-end latency.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics import LatencyHistogram
+
+
+class PredictionWriteBuffer:
+    def __init__(
+        self,
+        writer,
+        max_batch_size: int = 500,
+        flush_interval_s: float = 1.0,
+        max_pending: int = 50000,
+        max_retries: int = 4,
+        backoff_base_s: float = 0.5,
+        stage_metrics=None
+    ):
+        """
+        writer(updates: dict) performs one multi-path update,
+        e.g. firebase_client.save_predictions_bulk
+        """
+        self.writer = writer
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.flush_interval_s = max(0.0, float(flush_interval_s))
+        self.max_pending = max(self.max_batch_size, int(max_pending))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base_s = max(0.0, float(backoff_base_s))
+        self.stage_metrics = stage_metrics
+
+        # path → (payload, enqueued_at, received_at); re-writing the same
+        # path keeps only the latest. enqueued_at is None for untimed writes
+        self._pending = OrderedDict()
+        self._oldest_at = None
+        # path → payload of writes taken for a flush that has not returned
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+        self.flush_latency = LatencyHistogram()
+        self.flushes = 0
+        self.writes_flushed = 0
+        self.writes_coalesced = 0
+        self.dropped_writes = 0
+        self.retries = 0
+
+    # --------------------------------------------------
+    # LIFECYCLE
+    # --------------------------------------------------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="prediction-writer", daemon=True
+        )
+        self._thread.start()
+
+    def close(self, timeout: float = 30.0):
+        """
+        Stops accepting writes and flushes everything still pending
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        # Anything left (no worker, or join timed out)
+        while self.flush_now():
+            pass
+
+    # --------------------------------------------------
+    # PRODUCER SIDE
+    # --------------------------------------------------
+
+    def add_path(self, path: str, payload: dict, received_at: float = None, timed: bool = True) -> bool:
+        """
+        received_at: time.monotonic() when the source event arrived,
+        for end-to-end latency. timed=False leaves the write out of the
+        stage latencies (e.g. rollups, which are not predictions).
+        """
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                self.dropped_writes += 1
+                return False
+
+            if path in self._pending:
+                self.writes_coalesced += 1
+                self._pending.pop(path)
+            elif len(self._pending) >= self.max_pending:
+                # Full: drop the oldest pending write rather than block ingestion
+                self._pending.popitem(last=False)
+                self.dropped_writes += 1
+
+            self._pending[path] = (payload, now if timed else None, received_at)
+            if self._oldest_at is None:
+                # Wake the writer so it starts the flush_interval_s timer
+                self._oldest_at = now
+                self._cond.notify()
+            elif len(self._pending) >= self.max_batch_size:
+                self._cond.notify()
+        return True
+
+    def pending_payload(self, path: str):
+        """
+        The newest payload for path that is queued or being written, None
+        if there is none (the database then holds the latest value)
+        """
+        with self._cond:
+            entry = self._pending.get(path)
+            if entry is not None:
+                return entry[0]
+            return self._in_flight.get(path)
+
+    def add(self, customer: str, site_id: str, timestamp: str, payload: dict, received_at: float = None) -> bool:
+        return self.add_path(
+            f"predicted_units/{customer}/{site_id}/{timestamp}", payload, received_at
+        )
+
+    # --------------------------------------------------
+    # FLUSHING
+    # --------------------------------------------------
+
+    def _take_batch(self) -> dict:
+        batch = {}
+        while self._pending and len(batch) < self.max_batch_size:
+            path, entry = self._pending.popitem(last=False)
+            batch[path] = entry
+            self._in_flight[path] = entry[0]
+        self._oldest_at = time.monotonic() if self._pending else None
+        return batch
+
+    def _record_persisted(self, batch: dict, persisted_at: float):
+        if self.stage_metrics is None:
+            return
+        for _, enqueued_at, received_at in batch.values():
+            if enqueued_at is None:
+                continue
+            self.stage_metrics.record("predicted_to_persisted", persisted_at - enqueued_at)
+            if received_at is not None:
+                self.stage_metrics.record("end_to_end", persisted_at - received_at)
+
+    def _write_with_retry(self, batch: dict) -> bool:
+        try:
+            return self._write_batch(batch)
+        finally:
+            with self._cond:
+                for path, entry in batch.items():
+                    if self._in_flight.get(path) is entry[0]:
+                        del self._in_flight[path]
+
+    def _write_batch(self, batch: dict) -> bool:
+        updates = {path: entry[0] for path, entry in batch.items()}
+        start = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.writer(updates)
+                persisted_at = time.monotonic()
+                self.flush_latency.record(persisted_at - start)
+                self._record_persisted(batch, persisted_at)
+                self.flushes += 1
+                self.writes_flushed += len(batch)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"[ERROR] Dropping {len(batch)} predictions after {attempt + 1} attempts: {e}")
+                    break
+                self.retries += 1
+                delay = self.backoff_base_s * (2 ** attempt)
+                print(f"[RETRY] Bulk write failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        self.dropped_writes += len(batch)
+        return False
+
+    def flush_now(self) -> int:
+        """
+        Writes one batch synchronously. Returns the number of paths taken.
+        """
+        with self._cond:
+            batch = self._take_batch()
+        if batch:
+            self._write_with_retry(batch)
+        return len(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._pending) >= self.max_batch_size:
+                        break
+                    if self._oldest_at is not None:
+                        remaining = self._oldest_at + self.flush_interval_s - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+
+                if self._closed and not self._pending:
+                    return
+                batch = self._take_batch()
+
+            if batch:
+                self._write_with_retry(batch)
+
+    # --------------------------------------------------
+    # METRICS
+    # --------------------------------------------------
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "flushes": self.flushes,
+            "writes_flushed": self.writes_flushed,
+            "writes_coalesced": self.writes_coalesced,
+            "dropped_writes": self.dropped_writes,
+            "retries": self.retries,
+            "flush_latency": self.flush_latency.summary(),
+        }
@@ -3,103 +3,203 @@ Smart Solar Advisor
 Realtime ML Prediction Engine (Firebase Listener Safe)
 """
 
-from firebase_admin import db
-from firebase.firebase_client import save_prediction
-from utils.sensor_mapper import map_firebase_to_model_features
-from services.prediction_service import calculate_5min_system_energy
-from utils.time_utils import firebase_safe_timestamp
+import os
+
+from utils.startup_timing import startup_timer
+
+with startup_timer.stage("imports"):
+    from firebase.firebase_client import get_reference, init_firebase, save_predictions_bulk
+    from firebase.write_buffer import PredictionWriteBuffer
+    from predictor.energy_predictor import get_model
+    from services.batch_inference import (
+        MicroBatcher,
+        decode_pending_event,
+        encode_pending_event,
+    )
+    from services.feature_store import FeatureStore
+    from services.ingestion_queue import BoundedIngestionQueue
+    from services.listener_supervisor import ListenerSupervisor
+    from services.rollups import RollupAggregator
+    from utils.metrics import StageLatencyMetrics
+    from utils.sensor_mapper import FEATURE_COLUMNS
+    from utils.site_config import load_sites
+    from utils.time_utils import firebase_safe_timestamp, record_key_to_seconds
 
 # --------------------------------------------------
-# DEVICE / SITE CONFIGURATION
+# ENGINE CONFIGURATION
 # --------------------------------------------------
 
-SITES = [
-    {
-        "device_id": "SSA_ESP32_01",
-        "site_id": "site_001",
-        "customer": "dilshan",
-        "panel_area_m2": 25
-    }
-]
+# Sites are loaded from config/sites.json or a Firebase node
+# (see utils/site_config.py)
 
-# --------------------------------------------------
-# LISTENER LOGIC
-# --------------------------------------------------
+# Micro-batching window shared by all devices
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "50"))
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "256"))
 
-def start_device_listener(site_config: dict):
-    device_id = site_config["device_id"]
-    site_id = site_config["site_id"]
-    customer = site_config["customer"]
-    panel_area = site_config["panel_area_m2"]
+# "per_device" (one stream per device) or "multiplexed" (one devices/ stream)
+LISTENER_MODE = os.getenv("LISTENER_MODE", "per_device")
 
-    ref = db.reference(f"devices/{device_id}")
+# Bounded queue between listener callbacks and inference.
+# Overflow policy: drop_oldest | block | spill (to INGEST_SPILL_PATH)
+INGEST_QUEUE_MAXSIZE = int(os.getenv("INGEST_QUEUE_MAXSIZE", "10000"))
+INGEST_OVERFLOW = os.getenv("INGEST_OVERFLOW", "drop_oldest")
+INGEST_BLOCK_TIMEOUT_S = float(os.getenv("INGEST_BLOCK_TIMEOUT_S", "5"))
+INGEST_SPILL_PATH = os.getenv("INGEST_SPILL_PATH", "logs/ingest_spill.jsonl")
 
-    print(f"Listening to device: {device_id}")
+# Write-behind buffer: flush on size or time
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))
+WRITE_FLUSH_INTERVAL_S = float(os.getenv("WRITE_FLUSH_INTERVAL_S", "1.0"))
 
-    def on_event(event):
-        """
-        Firebase Realtime Database event handler
-        """
+# Listener startup concurrency and lag report interval
+LISTENER_MAX_WORKERS = int(os.getenv("LISTENER_MAX_WORKERS", "32"))
+LAG_REPORT_INTERVAL_S = float(os.getenv("LAG_REPORT_INTERVAL_S", "60"))
 
-        # Ignore initial full snapshot
-        if event.path == "/":
-            return
+# In-memory feature store: off until an in-process consumer reads it.
+# Days of features / predictions kept per device when enabled
+FEATURE_STORE_ENABLED = os.getenv("FEATURE_STORE_ENABLED", "0") == "1"
+FEATURE_STORE_DAYS = float(os.getenv("FEATURE_STORE_DAYS", "7"))
 
-        # Ignore deletes
-        if event.data is None:
-            return
+# Processed record keys remembered per device for duplicate skipping
+DEDUP_KEYS_PER_DEVICE = int(os.getenv("DEDUP_KEYS_PER_DEVICE", "4096"))
 
-        # event.data is now ONE sensor record
-        raw_sensor_data = event.data
+# --------------------------------------------------
+# PREDICTION SINK
+# --------------------------------------------------
 
-        try:
-            # Map raw sensor payload → ML features
-            model_features = map_firebase_to_model_features(raw_sensor_data)
+def persist_prediction(event, model_features: dict, predicted_energy: float):
+    """
+    Called by the micro-batcher for every predicted sensor record
+    """
+    site_config = event.site_config
+    device_id = site_config["device_id"]
 
-            # Predict system energy for 5 minutes
-            predicted_energy = calculate_5min_system_energy(
-                model_features,
-                panel_area
-            )
+    # The sensor record's own key makes the write idempotent: a replayed
+    # record overwrites its earlier prediction instead of adding a new one
+    timestamp_key = event.record_key or firebase_safe_timestamp()
+
+    # Queue prediction; written with other sites in one bulk update
+    write_buffer.add(
+        site_config["customer"],
+        site_config["site_id"],
+        timestamp_key,
+        {
+            "predicted_kwh_5min": predicted_energy,
+            "device_id": device_id,
+            "panel_area_m2": site_config["panel_area_m2"],
+            "features_used": model_features,
+            "interval": "5_min",
+            "unit": "kWh"
+        },
+        received_at=event.received_at
+    )
+
+    feature_row = [model_features[k] for k in FEATURE_COLUMNS]
+
+    # Recent history for in-process consumers
+    if feature_store is not None:
+        record_ts = record_key_to_seconds(timestamp_key)
+        if record_ts is not None:
+            feature_store.append(device_id, record_ts, feature_row, predicted_energy)
+
+    # Daily / monthly rollups, written through the same bulk-write buffer
+    rollups.update(
+        site_config["customer"],
+        site_config["site_id"],
+        timestamp_key,
+        feature_row,
+        predicted_energy
+    )
+
+    supervisor.record_processed(device_id, event.received_at)
+
+    print(
+        f"[AUTO] {device_id} → "
+        f"{predicted_energy} kWh queued"
+    )
+
+
+feature_store = FeatureStore(days=FEATURE_STORE_DAYS) if FEATURE_STORE_ENABLED else None
+
+# receipt → mapped → predicted → persisted latency histograms
+stage_metrics = StageLatencyMetrics()
+
+write_buffer = PredictionWriteBuffer(
+    save_predictions_bulk,
+    max_batch_size=WRITE_BATCH_SIZE,
+    flush_interval_s=WRITE_FLUSH_INTERVAL_S,
+    stage_metrics=stage_metrics
+)
+
+# Resumes today's / this month's rollup from Firebase after a restart
+rollups = RollupAggregator(
+    write_buffer,
+    loader=lambda path: get_reference(path).get(),
+    recent_loader=lambda path, n: get_reference(path).order_by_key().limit_to_last(n).get()
+)
+
+ingest_queue = BoundedIngestionQueue(
+    maxsize=INGEST_QUEUE_MAXSIZE,
+    overflow=INGEST_OVERFLOW,
+    block_timeout_s=INGEST_BLOCK_TIMEOUT_S,
+    spill_path=INGEST_SPILL_PATH if INGEST_OVERFLOW == "spill" else None,
+    encode=encode_pending_event,
+    decode=decode_pending_event
+)
+
+batcher = MicroBatcher(
+    persist_prediction,
+    max_batch_size=BATCH_MAX_ROWS,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    ingest_queue=ingest_queue,
+    stage_metrics=stage_metrics
+)
+
+supervisor = ListenerSupervisor(
+    batcher,
+    max_workers=LISTENER_MAX_WORKERS,
+    mode=LISTENER_MODE,
+    dedup_keys_per_device=DEDUP_KEYS_PER_DEVICE
+)
+supervisor.add_reporter(
+    lambda: print(f"[QUEUE] {ingest_queue.metrics()}")
+)
+supervisor.add_reporter(
+    lambda: print(f"[WRITES] {write_buffer.metrics()}")
+)
+supervisor.add_reporter(
+    lambda: print(f"[STAGES] {stage_metrics.summary()}")
+)
 
-            timestamp_key = firebase_safe_timestamp()
 
-            # Save prediction
-            save_prediction(
-                customer,
-                site_id,
-                timestamp_key,
-                {
-                    "predicted_kwh_5min": predicted_energy,
-                    "device_id": device_id,
-                    "panel_area_m2": panel_area,
-                    "features_used": model_features,
-                    "interval": "5_min",
-                    "unit": "kWh"
-                }
-            )
+# --------------------------------------------------
+# ENTRY POINT
+# --------------------------------------------------
 
-            print(
-                f"[AUTO] {device_id} → "
-                f"{predicted_energy} kWh saved"
-            )
+if __name__ == "__main__":
+    print("Smart Solar Advisor – Realtime Prediction Engine Started")
 
-        except KeyError as e:
-            print(f"[SKIP] Missing sensor field: {e}")
+    with startup_timer.stage("firebase init"):
+        init_firebase()
 
-        except Exception as e:
-            print(f"[ERROR] Prediction failed: {e}")
+    with startup_timer.stage("load sites"):
+        sites = load_sites()
 
-    # Start realtime listener (blocking)
-    ref.listen(on_event)
+    # Load the model now so the first batch does not pay for it
+    with startup_timer.stage("load model"):
+        get_model()
 
+    with startup_timer.stage("preload rollups"):
+        rollups.preload(sites, max_workers=LISTENER_MAX_WORKERS)
 
-# --------------------------------------------------
-# ENTRY POINT
-# --------------------------------------------------
+    with startup_timer.stage("start listeners"):
+        write_buffer.start()
+        batcher.start()
+        supervisor.start(sites)
 
-if __name__ == "__main__":
-    print("Smart Solar Advisor – Realtime Prediction Engine Started")
+    startup_timer.report()
+
+    supervisor.run_forever(report_interval_s=LAG_REPORT_INTERVAL_S)
 
-    for site in SITES:
-        start_device_listener(site)
+    # Listeners and batcher are stopped; persist what is still queued
+    write_buffer.close()
+    print(f"[WRITES] final: {write_buffer.metrics()}")
@@ -0,0 +1,43 @@
+"""
+Smart Solar Advisor
+Precompute global feature importance for the XAI service
+
+Samples recent features_used records from predicted_units, computes mean
+|SHAP| and permutation importance in parallel and writes
+model/solar_power_model.importance.json, which /api/xai/feature-importance
+serves until the model file changes.
+
+Run:
+    python precompute_importance.py
+    python precompute_importance.py --rows 5000 --jobs 4
+"""
+
+import argparse
+
+from services.global_importance import (
+    ARTIFACT_PATH,
+    IMPORTANCE_N_JOBS,
+    IMPORTANCE_SAMPLE_ROWS,
+    build_artifact,
+    save_artifact,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute global feature importance")
+    parser.add_argument("--rows", type=int, default=IMPORTANCE_SAMPLE_ROWS, help="Recent records sampled across all sites")
+    parser.add_argument("--jobs", type=int, default=IMPORTANCE_N_JOBS, help="Worker processes (-1: all cores)")
+    args = parser.parse_args()
+
+    artifact = build_artifact(max_rows=args.rows, n_jobs=args.jobs)
+    save_artifact(artifact)
+
+    print(f"Global importance from {artifact['rows']} rows in {artifact['compute_seconds']}s → {ARTIFACT_PATH}")
+    for item in sorted(artifact["features"], key=lambda f: -f["importance"]):
+        name = item["name"]
+        perm = artifact["permutation_importance"][name]
+        print(f"  {name:<12} share={item['importance']:.4f} mean|SHAP|={artifact['mean_abs_shap'][name]:.6f} perm={perm['mean']:.3e}±{perm['std']:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,37 @@
-import joblib
-import pandas as pd
-from pathlib import Path
+import numpy as np
 
-MODEL_PATH = Path("model/solar_power_model.pkl")
+from predictor.model_registry import registry
+from utils.sensor_mapper import FEATURE_COLUMNS
 
-model = joblib.load(MODEL_PATH)
+MODEL_NAME = "solar_power"
+MODEL_PATH = registry.path(MODEL_NAME)
 
-FEATURES = [
-    "irradiance",
-    "temperature",
-    "humidity",
-    "rainfall",
-    "dust_level"
-]
+
+def get_model():
+    """
+    Returns the prediction model, loading it on first use
+    """
+    return registry.get(MODEL_NAME)
+
+
+def __getattr__(name):
+    # Backwards compatible `energy_predictor.model` without loading at import
+    if name == "model":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# irradiance, temperature, humidity, rainfall, dust_level
+FEATURES = list(FEATURE_COLUMNS)
+
+# Constants from dataset generation code
+PANEL_EFF = 0.18                        # 18% efficiency
+INTERVAL_SECONDS = 300                  # 5 minutes
+CONV_FACTOR = INTERVAL_SECONDS / 3.6e6  # 0.0000833 (converts W to kWh for 5 min)
+DAYLIGHT_CORRECTION = 3.5
+
+# Calibrate when the model is more than ~3x away from the physics estimate
+CALIBRATION_RATIO_LOW = 0.33
+CALIBRATION_RATIO_HIGH = 3.0
 
 
 def _estimate_expected_energy_per_m2(features: dict) -> float:
@@ -25,12 +44,6 @@ def _estimate_expected_energy_per_m2(features: dict) -> float:
     if irradiance is None:
         return None
     
-    # Constants from dataset generation code
-    panel_eff = 0.18                  # 18% efficiency
-    interval_seconds = 300            # 5 minutes
-    conv_factor = interval_seconds / 3.6e6   # 0.0000833 (converts W to kWh for 5 min)
-    daylight_correction = 3.5
-    
     # Calculate loss factors (same as dataset generation)
     # Dust loss: 1 - (dust_level / 5)
     dust_loss = 1.0 - (dust_level / 5.0) if dust_level is not None else 1.0
@@ -43,21 +56,79 @@ def _estimate_expected_energy_per_m2(features: dict) -> float:
     # Calculate energy using the exact same formula as dataset generation
     energy_per_m2 = (
         irradiance *
-        panel_eff *
+        PANEL_EFF *
         dust_loss *
         rain_loss *
-        conv_factor *
-        daylight_correction
+        CONV_FACTOR *
+        DAYLIGHT_CORRECTION
     )
     
     return max(0.0, energy_per_m2)
 
 
-def predict_5min_energy(features: dict) -> float:
-    
-    df = pd.DataFrame([{k: features[k] for k in FEATURES}])
-    raw_prediction = model.predict(df)[0]
-    
+def _clamp_unit(values: np.ndarray) -> np.ndarray:
+    """
+    Elementwise max(0.0, min(1.0, x)) with the same NaN handling as the
+    builtins (NaN → 1.0)
+    """
+    values = np.where(values < 1.0, values, 1.0)
+    return np.where(values > 0.0, values, 0.0)
+
+
+def estimate_expected_energy_per_m2_batch(irradiance, rainfall, dust_level) -> np.ndarray:
+    """
+    Array version of _estimate_expected_energy_per_m2.
+    NaN marks a missing value: missing rainfall / dust_level count as no
+    loss, missing irradiance yields 0.0 (no calibration), exactly as the
+    scalar path does for None.
+    """
+    irradiance = np.asarray(irradiance, dtype=np.float64)
+    rainfall = np.asarray(rainfall, dtype=np.float64)
+    dust_level = np.asarray(dust_level, dtype=np.float64)
+
+    dust_loss = _clamp_unit(1.0 - (dust_level / 5.0))
+    rain_loss = _clamp_unit(1.0 - (rainfall / 200.0))
+
+    # Same multiplication order as the scalar path, so results are bit-identical
+    energy_per_m2 = (
+        irradiance *
+        PANEL_EFF *
+        dust_loss *
+        rain_loss *
+        CONV_FACTOR *
+        DAYLIGHT_CORRECTION
+    )
+
+    return np.where(energy_per_m2 > 0.0, energy_per_m2, 0.0)
+
+
+def calibrate_predictions_batch(raw_predictions, irradiance, rainfall, dust_level) -> np.ndarray:
+    """
+    Array version of _calibrate_prediction: applies the ratio calibration
+    to a whole batch of raw model outputs in one pass
+    """
+    raw = np.asarray(raw_predictions, dtype=np.float64)
+    expected = estimate_expected_energy_per_m2_batch(irradiance, rainfall, dust_level)
+
+    comparable = (expected > 0) & (raw > 0)
+    ratio = np.divide(expected, raw, out=np.ones_like(raw), where=comparable)
+    needs_calibration = comparable & (
+        (ratio < CALIBRATION_RATIO_LOW) | (ratio > CALIBRATION_RATIO_HIGH)
+    )
+
+    calibrated = raw.copy()
+    calibrated[needs_calibration] = raw[needs_calibration] * ratio[needs_calibration]
+    return calibrated
+
+
+def _calibrate_prediction(raw_prediction, features: dict) -> float:
+    """
+    Applies the physics ratio calibration to one raw model output
+    """
+    # Work in float64 regardless of the model's output dtype (XGBoost returns
+    # float32), so the result does not depend on NumPy scalar promotion rules
+    raw_prediction = float(raw_prediction)
+
     # Calculate expected energy using the same formula as dataset generation
     # This gives us the expected value that the model should predict
     expected_energy = _estimate_expected_energy_per_m2(features)
@@ -73,7 +144,7 @@ def predict_5min_energy(features: dict) -> float:
         
         # If prediction is significantly different (outside reasonable range), apply calibration
         # Thresholds: if ratio < 0.33 (prediction 3x too high) or > 3.0 (prediction 3x too low)
-        if ratio < 0.33 or ratio > 3.0:
+        if ratio < CALIBRATION_RATIO_LOW or ratio > CALIBRATION_RATIO_HIGH:
             # Calibrate based on expected vs actual ratio
             calibrated_prediction = raw_prediction * ratio
             return float(calibrated_prediction)
@@ -81,3 +152,53 @@ def predict_5min_energy(features: dict) -> float:
     # Prediction seems reasonable (within 3x of expected)
     return float(raw_prediction)
 
+
+def predict_5min_energy(features: dict) -> float:
+    import pandas as pd
+    
+    df = pd.DataFrame([{k: features[k] for k in FEATURES}])
+    raw_prediction = get_model().predict(df)[0]
+    
+    return _calibrate_prediction(raw_prediction, features)
+
+
+def predict_5min_energy_batch(feature_matrix) -> np.ndarray:
+    """
+    Batched counterpart of predict_5min_energy.
+    feature_matrix: 2-D array, one row per reading, columns in FEATURES order
+    Returns calibrated energy per m2 for every row (same values as the
+    per-row path).
+    """
+    import pandas as pd
+
+    X = np.asarray(feature_matrix, dtype=np.float64)
+
+    if X.ndim != 2 or X.shape[0] == 0:
+        return np.empty(0, dtype=np.float64)
+
+    # One predict call for the whole batch. The model was fitted on a
+    # DataFrame, so the column names are kept to pass feature validation.
+    raw_predictions = get_model().predict(pd.DataFrame(X, columns=FEATURES))
+
+    return calibrate_predictions_batch(
+        raw_predictions,
+        X[:, FEATURES.index("irradiance")],
+        X[:, FEATURES.index("rainfall")],
+        X[:, FEATURES.index("dust_level")]
+    )
+
+
+def predict_5min_energy_columns(irradiance, temperature, humidity, rainfall, dust_level) -> np.ndarray:
+    """
+    Column-array entry point for backfills: one array per feature,
+    returns calibrated energy per m2 for every row
+    """
+    columns = {
+        "irradiance": irradiance,
+        "temperature": temperature,
+        "humidity": humidity,
+        "rainfall": rainfall,
+        "dust_level": dust_level,
+    }
+    X = np.column_stack([np.asarray(columns[k], dtype=np.float64) for k in FEATURES])
+    return predict_5min_energy_batch(X)
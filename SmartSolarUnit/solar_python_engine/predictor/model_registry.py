@@ -0,0 +1,82 @@
+"""
+Lazy, load-once model registry.
+
+Models are loaded on first use instead of at import time, and only once
+per process even when several threads ask at the same moment. Loading
+uses joblib's mmap_mode so NumPy arrays inside the pickle (e.g. the node
+arrays of scikit-learn forests) are memory-mapped from the page cache and
+shared between worker processes instead of copied into each one.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODEL_PATH = ENGINE_DIR / "model" / "solar_power_model.pkl"
+
+# "r" = read-only memory map; set MODEL_MMAP_MODE=none to load fully into RAM
+_mmap_env = os.getenv("MODEL_MMAP_MODE", "r")
+DEFAULT_MMAP_MODE = None if _mmap_env.lower() in ("", "none", "off") else _mmap_env
+
+
+class ModelRegistry:
+    def __init__(self, mmap_mode=DEFAULT_MMAP_MODE):
+        self.mmap_mode = mmap_mode
+        self._models = {}
+        self._paths = {}
+        self._load_seconds = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path):
+        """
+        Registers a model file; nothing is loaded until get(name)
+        """
+        path = Path(path)
+        if not path.is_absolute():
+            path = ENGINE_DIR / path
+        with self._lock:
+            self._paths[name] = path
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Another thread may have loaded it while we waited
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            if name not in self._paths:
+                raise KeyError(f"Model '{name}' is not registered")
+
+            import joblib
+
+            start = time.perf_counter()
+            model = joblib.load(self._paths[name], mmap_mode=self.mmap_mode)
+            self._load_seconds[name] = time.perf_counter() - start
+
+            self._models[name] = model
+            print(f"[MODEL] Loaded '{name}' in {self._load_seconds[name] * 1000:.0f} ms")
+            return model
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def path(self, name: str) -> Path:
+        return self._paths[name]
+
+    def unload(self, name: str):
+        with self._lock:
+            self._models.pop(name, None)
+
+    def load_times(self) -> dict:
+        return {name: round(s, 4) for name, s in self._load_seconds.items()}
+
+
+registry = ModelRegistry()
+registry.register("solar_power", DEFAULT_MODEL_PATH)
@@ -0,0 +1,226 @@
+"""
+Smart Solar Advisor
+Historical replay / backfill of predicted_units
+
+Recomputes predicted_units/{customer}/{site_id}/{record_key} from the
+stored sensor history in devices/{device_id}, e.g. after a model update.
+
+Run:
+    python replay_predictions.py                      # every configured site
+    python replay_predictions.py --device SSA_ESP32_01 --processes 4
+    python replay_predictions.py --start-key 20260101_000000 --dry-run
+
+Progress is checkpointed per device, so an interrupted run continues
+where it stopped (use --restart to ignore checkpoints). A device's
+checkpoint is deleted once its replay finishes, and an explicit
+--start-key always takes precedence over a checkpoint.
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from pathlib import Path
+
+DEFAULT_CHECKPOINT_DIR = Path(__file__).resolve().parent / "replay_checkpoints"
+
+
+# --------------------------------------------------
+# CHECKPOINTS
+# --------------------------------------------------
+
+def _checkpoint_path(checkpoint_dir: Path, device_id: str) -> Path:
+    return Path(checkpoint_dir) / f"{device_id}.json"
+
+
+def load_checkpoint(checkpoint_dir: Path, device_id: str):
+    path = _checkpoint_path(checkpoint_dir, device_id)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("last_key")
+
+
+def save_checkpoint(checkpoint_dir: Path, device_id: str, last_key: str, rows_done: int):
+    path = _checkpoint_path(checkpoint_dir, device_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"device_id": device_id, "last_key": last_key, "rows_done": rows_done}, f)
+    tmp.replace(path)
+
+
+def clear_checkpoint(checkpoint_dir: Path, device_id: str):
+    _checkpoint_path(checkpoint_dir, device_id).unlink(missing_ok=True)
+
+
+# --------------------------------------------------
+# REPLAY ONE DEVICE
+# --------------------------------------------------
+
+def replay_site(site_config: dict, options: dict) -> dict:
+    """
+    Replays one device's history. Runs inside a worker process.
+    """
+    import numpy as np
+
+    from firebase.firebase_client import iter_device_history_pages, save_predictions_bulk
+    from services.prediction_service import calculate_5min_system_energy_batch
+    from utils.sensor_mapper import ERR_NONE, FEATURE_COLUMNS, map_firebase_batch_to_matrix
+
+    device_id = site_config["device_id"]
+    customer = site_config["customer"]
+    site_id = site_config["site_id"]
+    panel_area = site_config["panel_area_m2"]
+    checkpoint_dir = options["checkpoint_dir"]
+
+    start_key = options["start_key"]
+    if start_key is None and not options["restart"]:
+        start_key = load_checkpoint(checkpoint_dir, device_id)
+        if start_key is not None:
+            print(f"[REPLAY] {device_id}: resuming after checkpoint {start_key}", flush=True)
+
+    rows_read = rows_written = rows_skipped = 0
+    started = time.perf_counter()
+
+    for page in iter_device_history_pages(
+        device_id,
+        page_size=options["page_size"],
+        start_key=start_key,
+        end_key=options["end_key"]
+    ):
+        rows_read += len(page)
+
+        matrix, error_flags = map_firebase_batch_to_matrix(
+            [record for _, record in page], dtype=np.float64
+        )
+        valid_idx = np.flatnonzero(error_flags == ERR_NONE)
+        rows_skipped += len(page) - valid_idx.size
+
+        keys = [page[i][0] for i in valid_idx]
+        rows = matrix[valid_idx]
+        features_list = [dict(zip(FEATURE_COLUMNS, row)) for row in rows.tolist()]
+
+        if keys:
+            predictions = calculate_5min_system_energy_batch(
+                rows,
+                [panel_area] * len(keys)
+            )
+
+            updates = {
+                f"predicted_units/{customer}/{site_id}/{key}": {
+                    "predicted_kwh_5min": energy,
+                    "device_id": device_id,
+                    "panel_area_m2": panel_area,
+                    "features_used": features,
+                    "interval": "5_min",
+                    "unit": "kWh"
+                }
+                for key, features, energy in zip(keys, features_list, predictions)
+            }
+
+            if not options["dry_run"]:
+                batch_size = options["write_batch"]
+                items = list(updates.items())
+                for i in range(0, len(items), batch_size):
+                    save_predictions_bulk(dict(items[i:i + batch_size]))
+            rows_written += len(updates)
+
+        last_key = page[-1][0]
+        if not options["dry_run"]:
+            save_checkpoint(checkpoint_dir, device_id, last_key, rows_written)
+
+        elapsed = time.perf_counter() - started
+        print(
+            f"[REPLAY] {device_id}: {rows_read} read, {rows_written} written, "
+            f"{rows_skipped} skipped, up to {last_key} "
+            f"({rows_read / elapsed:,.0f} rows/s)",
+            flush=True
+        )
+
+    # Finished: the next run (e.g. after another model update) starts over
+    if not options["dry_run"]:
+        clear_checkpoint(checkpoint_dir, device_id)
+
+    return {
+        "device_id": device_id,
+        "rows_read": rows_read,
+        "rows_written": rows_written,
+        "rows_skipped": rows_skipped,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _replay_site_safe(args):
+    site_config, options = args
+    try:
+        return replay_site(site_config, options)
+    except Exception as e:
+        print(f"[ERROR] Replay failed for {site_config['device_id']}: {e}", flush=True)
+        return {"device_id": site_config["device_id"], "error": str(e)}
+
+
+# --------------------------------------------------
+# ENTRY POINT
+# --------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute predicted_units from stored device history")
+    parser.add_argument("--device", action="append", help="device_id to replay (repeatable); default: all configured sites")
+    parser.add_argument("--sites-file", help="Site config JSON (default: config/sites.json)")
+    parser.add_argument("--start-key", help="Only replay records after this key, e.g. 20260101_000000 (overrides checkpoints)")
+    parser.add_argument("--end-key", help="Only replay records up to this key")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--write-batch", type=int, default=500, help="Paths per multi-location update")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes; devices are sharded across them")
+    parser.add_argument("--checkpoint-dir", default=str(DEFAULT_CHECKPOINT_DIR))
+    parser.add_argument("--restart", action="store_true", help="Ignore existing checkpoints")
+    parser.add_argument("--dry-run", action="store_true", help="Predict but do not write or checkpoint")
+    args = parser.parse_args()
+
+    from utils.site_config import load_sites, load_sites_from_file
+
+    sites = load_sites_from_file(args.sites_file) if args.sites_file else load_sites()
+    if args.device:
+        sites = [s for s in sites if s["device_id"] in set(args.device)]
+    if not sites:
+        print("No matching sites to replay.")
+        return
+
+    options = {
+        "start_key": args.start_key,
+        "end_key": args.end_key,
+        "page_size": args.page_size,
+        "write_batch": args.write_batch,
+        "checkpoint_dir": Path(args.checkpoint_dir),
+        "restart": args.restart,
+        "dry_run": args.dry_run,
+    }
+
+    print(f"Replaying {len(sites)} device(s) with {args.processes} process(es)")
+    started = time.perf_counter()
+    jobs = [(site, options) for site in sites]
+
+    if args.processes > 1:
+        # spawn: each worker initialises its own Firebase app and model
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(processes=min(args.processes, len(sites))) as pool:
+            results = list(pool.imap_unordered(_replay_site_safe, jobs))
+    else:
+        results = [_replay_site_safe(job) for job in jobs]
+
+    elapsed = time.perf_counter() - started
+    total_read = sum(r.get("rows_read", 0) for r in results)
+    total_written = sum(r.get("rows_written", 0) for r in results)
+    failed = [r["device_id"] for r in results if "error" in r]
+
+    print("\nReplay summary")
+    for r in sorted(results, key=lambda r: r["device_id"]):
+        print(f"  {r}")
+    print(f"  devices: {len(results)} ({len(failed)} failed)")
+    print(f"  rows read: {total_read}, rows written: {total_written}")
+    print(f"  elapsed: {elapsed:.1f}s, throughput: {total_read / elapsed if elapsed else 0:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Micro-batched inference stage for the realtime engine.
+
+Listener callbacks submit raw sensor records into a bounded ingestion
+queue; a single worker thread collects them across all devices for a short
+window (or until a row limit is reached), runs one batched model prediction
+and hands each result back to a sink callback (normally the write buffer).
+"""
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from services.ingestion_queue import BoundedIngestionQueue
+from services.prediction_service import calculate_5min_system_energy_batch
+from utils.sensor_mapper import (
+    ERR_NONE,
+    FEATURE_COLUMNS,
+    describe_errors,
+    map_firebase_batch_to_matrix,
+)
+
+# One submitted sensor record waiting for inference
+PendingEvent = namedtuple(
+    "PendingEvent",
+    ["site_config", "raw_sensor_data", "record_key", "received_at"]
+)
+
+_STOP = object()
+
+
+def encode_pending_event(event: PendingEvent) -> list:
+    return list(event)
+
+
+def decode_pending_event(value: list) -> PendingEvent:
+    return PendingEvent(*value)
+
+
+class MicroBatcher:
+    """
+    Collects events for up to `max_wait_ms` or `max_batch_size` rows and
+    predicts them with one model call.
+
+    on_result(event, model_features, predicted_energy) is called once per
+    successfully predicted row, from the worker thread.
+
+    ingest_queue defaults to a 10k-event drop_oldest BoundedIngestionQueue.
+    on_drop(event), if set, is called for each queued event the queue's
+    overflow policy evicts.
+    stage_metrics (a StageLatencyMetrics) receives receipt → mapped and
+    mapped → predicted latencies when given.
+    """
+
+    def __init__(
+        self,
+        on_result,
+        max_batch_size: int = 256,
+        max_wait_ms: float = 50,
+        ingest_queue: BoundedIngestionQueue = None,
+        stage_metrics=None
+    ):
+        self.on_result = on_result
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.stage_metrics = stage_metrics
+
+        self._queue = ingest_queue or BoundedIngestionQueue(
+            encode=encode_pending_event, decode=decode_pending_event
+        )
+        self._queue.on_drop = self._dropped
+        self.on_drop = None
+        self._thread = None
+
+        self.batches_run = 0
+        self.rows_predicted = 0
+
+    # --------------------------------------------------
+    # LIFECYCLE
+    # --------------------------------------------------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="micro-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Flushes whatever is queued and stops the worker
+        """
+        if self._thread is None:
+            return
+        self._queue.put_control(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, site_config: dict, raw_sensor_data: dict, record_key: str = None) -> bool:
+        """
+        Returns False if the queue's overflow policy dropped the event
+        """
+        return self._queue.put(PendingEvent(
+            site_config, raw_sensor_data, record_key, time.monotonic()
+        ))
+
+    def _dropped(self, item):
+        if self.on_drop is not None and isinstance(item, PendingEvent):
+            self.on_drop(item)
+
+    def queue_metrics(self) -> dict:
+        return self._queue.metrics()
+
+    # --------------------------------------------------
+    # WORKER
+    # --------------------------------------------------
+
+    def _run(self):
+        stopping = False
+
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait_s
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = (
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self.process_batch(batch)
+
+        # Drain events queued behind the stop signal (or spilled to disk)
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                continue
+            remaining.append(item)
+            if len(remaining) >= self.max_batch_size:
+                self.process_batch(remaining)
+                remaining = []
+        if remaining:
+            self.process_batch(remaining)
+
+    def process_batch(self, batch: list) -> int:
+        """
+        Maps, predicts and fans out one batch. Returns rows predicted.
+        """
+        # float64 keeps results identical to the single-record path
+        matrix, error_flags = map_firebase_batch_to_matrix(
+            [event.raw_sensor_data for event in batch], dtype=np.float64
+        )
+
+        valid = error_flags == ERR_NONE
+        for i in np.flatnonzero(~valid):
+            event = batch[i]
+            print(
+                f"[SKIP] {event.site_config['device_id']} {event.record_key}: "
+                f"missing/invalid {', '.join(describe_errors(int(error_flags[i])))}"
+            )
+
+        valid_idx = np.flatnonzero(valid)
+        if valid_idx.size == 0:
+            return 0
+
+        events = [batch[i] for i in valid_idx]
+        rows = matrix[valid_idx]
+
+        mapped_at = time.monotonic()
+        if self.stage_metrics is not None:
+            for event in events:
+                self.stage_metrics.record("receipt_to_mapped", mapped_at - event.received_at)
+
+        try:
+            predictions = calculate_5min_system_energy_batch(
+                rows,
+                [e.site_config["panel_area_m2"] for e in events]
+            )
+        except Exception as e:
+            print(f"[ERROR] Batch prediction failed ({len(rows)} rows): {e}")
+            return 0
+
+        self.batches_run += 1
+        self.rows_predicted += len(predictions)
+
+        if self.stage_metrics is not None:
+            predict_s = time.monotonic() - mapped_at
+            for _ in predictions:
+                self.stage_metrics.record("mapped_to_predicted", predict_s)
+
+        for event, row, predicted_energy in zip(events, rows.tolist(), predictions):
+            model_features = dict(zip(FEATURE_COLUMNS, row))
+            try:
+                self.on_result(event, model_features, predicted_energy)
+            except Exception as e:
+                print(f"[ERROR] Saving prediction failed: {e}")
+
+        return len(predictions)
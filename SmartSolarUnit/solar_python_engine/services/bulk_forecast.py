@@ -0,0 +1,146 @@
+"""
+Bulk forecasting: many site series fitted in parallel worker processes.
+
+    for result in iter_bulk_forecasts(jobs, max_workers=8):
+        ...
+
+A job is {"series_id", "daily_data", "periods", "model"}, or
+{"customer", "site_id"} to read the site's daily rollups inside the
+worker. "model" defaults to the one the backtest selected for the series
+(services/forecast_backtest.py), else Prophet. At most `window` jobs are
+in flight at a time, so a large fleet never has all of its series in
+memory at once, and results are yielded as soon as each series finishes
+(not in input order). A series whose Prophet fit fails is retried with
+SARIMA.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+BULK_FORECAST_WORKERS = int(os.getenv("BULK_FORECAST_WORKERS", str(os.cpu_count() or 1)))
+
+
+def job_series_id(job: dict) -> str:
+    if job.get("series_id"):
+        return str(job["series_id"])
+    if job.get("customer") and job.get("site_id"):
+        return f"{job['customer']}/{job['site_id']}"
+    return "unknown"
+
+
+def forecast_job(job: dict) -> dict:
+    """
+    Forecasts one series (runs in a worker process)
+    """
+    from services.forecast_backtest import resolve_model
+    from services.time_series_service import forecast_model, forecast_prophet, forecast_sarima
+
+    series_id = job_series_id(job)
+    periods = int(job.get("periods", 30))
+    output = job.get("output") or "rows"
+    started = time.perf_counter()
+    selection = None
+
+    try:
+        daily_data = job.get("daily_data")
+        if daily_data is None and job.get("customer") and job.get("site_id"):
+            from firebase.firebase_client import get_daily_rollups
+            daily_data = get_daily_rollups(job["customer"], job["site_id"])
+        daily_data = daily_data or []
+
+        model, params, selection = resolve_model(job.get("model"), series_id)
+
+        if model in ("sarima", "seasonal_naive"):
+            result = forecast_model(model, daily_data, periods=periods, output=output, params=params)
+        else:
+            # Worker processes are short-lived; the per-process cache would not help
+            result = forecast_prophet(daily_data, periods=periods, use_cache=False, output=output)
+            if result.get("error"):
+                prophet_error = result.get("message")
+                result = forecast_sarima(daily_data, periods=periods, output=output)
+                result["fallback_from"] = "prophet"
+                result["fallback_reason"] = prophet_error
+    except Exception as e:
+        result = {"error": True, "message": str(e), "forecast": []}
+
+    if selection and not result.get("error"):
+        result["selection"] = selection["name"]
+    result["series_id"] = series_id
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def parse_bulk_workers(workers=None, limit: int = BULK_FORECAST_WORKERS) -> int:
+    """
+    Validates a requested worker count: None keeps the limit, other
+    values are clamped to 1..limit. Raises ValueError with a
+    client-facing message for non-integers.
+    """
+    limit = max(1, int(limit))
+    if workers is None:
+        return limit
+    try:
+        if isinstance(workers, bool) or float(workers) != int(float(workers)):
+            raise ValueError
+        workers = int(float(workers))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("'workers' must be an integer")
+    return min(max(1, workers), limit)
+
+
+def iter_bulk_forecasts(jobs, max_workers: int = BULK_FORECAST_WORKERS, window: int = None):
+    """
+    Yields one result per job, in completion order.
+    jobs may be any iterable (e.g. a generator over the fleet); it is
+    consumed lazily, keeping at most `window` (default 2 x workers) jobs
+    submitted at a time.
+    """
+    max_workers = max(1, int(max_workers))
+    window = max(1, int(window or 2 * max_workers))
+    jobs = iter(jobs)
+
+    if max_workers == 1:
+        for job in jobs:
+            yield forecast_job(job)
+        return
+
+    # spawn: workers do not inherit Flask / Firebase / Stan state
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        pending = {}
+
+        def submit_next() -> bool:
+            job = next(jobs, None)
+            if job is None:
+                return False
+            pending[pool.submit(forecast_job, job)] = job
+            return True
+
+        while len(pending) < window and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # Worker crashed (e.g. out of memory)
+                    yield {"error": True, "message": str(e), "forecast": [], "series_id": job_series_id(job)}
+                submit_next()
+
+
+def ndjson_line(result: dict) -> str:
+    return json.dumps(result, separators=(",", ":"), default=str) + "\n"
+
+
+def iter_ndjson(results):
+    """
+    One JSON document per line
+    """
+    for result in results:
+        yield ndjson_line(result)
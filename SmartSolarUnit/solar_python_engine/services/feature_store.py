@@ -0,0 +1,214 @@
+"""
+Rolling per-device feature store for the realtime engine.
+
+Keeps the last N days of mapped features and predictions for every device
+in preallocated NumPy ring buffers, so recent history can be served from
+memory instead of re-reading devices/ and predicted_units/ from Firebase.
+
+    store = FeatureStore(days=7)
+    store.append("SSA_ESP32_01", ts, [lux, temp, hum, rain, dust], kwh)
+    store.window("SSA_ESP32_01", start_ts=ts - 3600)
+    store.aggregate("SSA_ESP32_01", start_ts=midnight)
+
+Timestamps are device wall-clock seconds from the record key
+(utils.time_utils.record_key_to_seconds), so day boundaries are the
+device's local days.
+"""
+
+import threading
+
+import numpy as np
+
+from utils.sensor_mapper import FEATURE_COLUMNS
+
+SECONDS_PER_DAY = 86400
+
+
+class DeviceRingBuffer:
+    """
+    Fixed-capacity ring buffer; append is O(1) and never allocates
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.features = np.zeros((self.capacity, len(FEATURE_COLUMNS)), dtype=np.float32)
+        self.predictions = np.zeros(self.capacity, dtype=np.float32)
+        self._next = 0
+        self.size = 0
+
+    def append(self, timestamp: float, features, prediction: float):
+        i = self._next
+        self.timestamps[i] = timestamp
+        self.features[i] = features
+        self.predictions[i] = prediction
+        self._next = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def _ordered_index(self) -> np.ndarray:
+        """
+        Slot indices of the stored rows, oldest append first
+        """
+        if self.size < self.capacity:
+            return np.arange(self.size)
+        return (np.arange(self.capacity) + self._next) % self.capacity
+
+    def newest_timestamp(self) -> float:
+        """
+        Latest stored timestamp (not necessarily the last appended); None when empty
+        """
+        if self.size == 0:
+            return None
+        return float(self.timestamps[self._ordered_index()].max())
+
+    def snapshot(self, start_ts: float = None, end_ts: float = None) -> tuple:
+        """
+        Copies of (timestamps, features, predictions) in time order,
+        limited to start_ts <= t < end_ts
+        """
+        idx = self._ordered_index()
+        ts = self.timestamps[idx]
+
+        mask = np.ones(idx.size, dtype=bool)
+        if start_ts is not None:
+            mask &= ts >= start_ts
+        if end_ts is not None:
+            mask &= ts < end_ts
+        idx = idx[mask]
+        ts = ts[mask]
+
+        # Late (out-of-order) records are appended where they arrive
+        if ts.size > 1 and np.any(np.diff(ts) < 0):
+            order = np.argsort(ts, kind="stable")
+            idx = idx[order]
+            ts = ts[order]
+
+        return ts, self.features[idx], self.predictions[idx]
+
+
+class FeatureStore:
+    def __init__(self, days: float = 7, interval_s: float = 300, headroom: float = 1.1):
+        """
+        Capacity per device = days of interval_s records, plus headroom for
+        jitter and late records
+        """
+        self.days = days
+        self.capacity = int(days * SECONDS_PER_DAY / interval_s * headroom)
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def _buffer(self, device_id: str) -> DeviceRingBuffer:
+        buf = self._buffers.get(device_id)
+        if buf is None:
+            with self._lock:
+                buf = self._buffers.get(device_id)
+                if buf is None:
+                    buf = self._buffers[device_id] = DeviceRingBuffer(self.capacity)
+        return buf
+
+    # --------------------------------------------------
+    # WRITE PATH
+    # --------------------------------------------------
+
+    def append(self, device_id: str, timestamp: float, features, prediction: float):
+        """
+        features: sequence in FEATURE_COLUMNS order
+        timestamp: wall-clock seconds of the record
+        """
+        buf = self._buffer(device_id)
+        with self._lock:
+            buf.append(timestamp, features, prediction)
+
+    # --------------------------------------------------
+    # QUERIES
+    # --------------------------------------------------
+
+    def devices(self) -> list:
+        return list(self._buffers)
+
+    def size(self, device_id: str) -> int:
+        buf = self._buffers.get(device_id)
+        return buf.size if buf is not None else 0
+
+    def window(self, device_id: str, start_ts: float = None, end_ts: float = None) -> dict:
+        """
+        Records with start_ts <= timestamp < end_ts, oldest first:
+        {"timestamps": (n,), "features": (n, 5), "predictions": (n,)}
+        """
+        buf = self._buffers.get(device_id)
+        if buf is None:
+            return {
+                "timestamps": np.empty(0, dtype=np.float64),
+                "features": np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float32),
+                "predictions": np.empty(0, dtype=np.float32),
+            }
+        with self._lock:
+            ts, features, predictions = buf.snapshot(start_ts, end_ts)
+        return {"timestamps": ts, "features": features, "predictions": predictions}
+
+    def last_seconds(self, device_id: str, seconds: float) -> dict:
+        """
+        Records within `seconds` of the device's newest record
+        """
+        buf = self._buffers.get(device_id)
+        if buf is None:
+            return self.window(device_id)
+        with self._lock:
+            newest = buf.newest_timestamp()
+        if newest is None:
+            return self.window(device_id)
+        return self.window(device_id, start_ts=newest - seconds)
+
+    def latest(self, device_id: str, n: int = 1) -> dict:
+        """
+        The n newest records; empty arrays when n <= 0
+        """
+        data = self.window(device_id)
+        n = max(0, int(n))
+        # v[-0:] would be the whole buffer
+        return {k: v[-n:] if n else v[:0] for k, v in data.items()}
+
+    def aggregate(self, device_id: str, start_ts: float = None, end_ts: float = None) -> dict:
+        """
+        Total predicted kWh and mean / min / max of every feature in a window
+        """
+        data = self.window(device_id, start_ts, end_ts)
+        n = data["predictions"].size
+        if n == 0:
+            return {"count": 0, "total_kwh": 0.0, "features": {}}
+
+        features = data["features"].astype(np.float64)
+        return {
+            "count": int(n),
+            "total_kwh": round(float(data["predictions"].astype(np.float64).sum()), 6),
+            "first_ts": float(data["timestamps"][0]),
+            "last_ts": float(data["timestamps"][-1]),
+            "features": {
+                name: {
+                    "mean": round(float(np.nanmean(features[:, i])), 4),
+                    "min": round(float(np.nanmin(features[:, i])), 4),
+                    "max": round(float(np.nanmax(features[:, i])), 4),
+                }
+                for i, name in enumerate(FEATURE_COLUMNS)
+            },
+        }
+
+    def daily_totals(self, device_id: str) -> list:
+        """
+        [{"date": "YYYY-MM-DD", "totalKwh": float}, ...] for the buffered days,
+        in the shape the time-series service accepts
+        """
+        data = self.window(device_id)
+        if data["timestamps"].size == 0:
+            return []
+
+        days = (data["timestamps"] // SECONDS_PER_DAY).astype(np.int64)
+        unique_days, inverse = np.unique(days, return_inverse=True)
+        totals = np.bincount(inverse, weights=data["predictions"].astype(np.float64))
+
+        dates = (unique_days * SECONDS_PER_DAY).astype("datetime64[s]").astype("datetime64[D]")
+        return [
+            {"date": str(d), "totalKwh": round(float(t), 6)}
+            for d, t in zip(dates, totals)
+        ]
@@ -0,0 +1,410 @@
+"""
+Rolling-origin backtests of the daily forecasters and per-site model
+selection.
+
+Every site's daily series is cut at several origins; each candidate is
+fitted on the days before the cutoff and scored on the next `horizon`
+days:
+
+    train [........... cutoff)  test [cutoff ... cutoff + horizon)
+    train [................. cutoff)  test [...)
+    ...
+
+Fold fits run in parallel worker processes. Each fold's forecast is
+cached on disk under a hash of (candidate, training data, horizon), so
+a nightly rerun only fits the folds whose data changed.
+
+The report gives MAE, MAPE and mean fit time per candidate. The chosen
+model is the cheapest one whose MAE is within BACKTEST_MAE_TOLERANCE of
+the best, stored per series in config/forecast_models.json and used by
+/api/timeseries/forecast when the request names no model.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+BACKTEST_HORIZON = int(os.getenv("BACKTEST_HORIZON", "7"))
+BACKTEST_INITIAL = int(os.getenv("BACKTEST_INITIAL", "56"))
+BACKTEST_STEP = int(os.getenv("BACKTEST_STEP", "7"))
+BACKTEST_MAX_FOLDS = int(os.getenv("BACKTEST_MAX_FOLDS", "8"))
+BACKTEST_CACHE_DIR = Path(os.getenv("BACKTEST_CACHE_DIR", str(ENGINE_DIR / "backtest_cache")))
+# A cheaper model wins when its MAE is at most this much (relative) worse
+BACKTEST_MAE_TOLERANCE = float(os.getenv("BACKTEST_MAE_TOLERANCE", "0.02"))
+# Days with less energy than this are left out of MAPE (overcast / outage days)
+MAPE_MIN_ACTUAL = float(os.getenv("BACKTEST_MAPE_MIN_ACTUAL", "0.5"))
+
+SELECTION_PATH = Path(os.getenv("FORECAST_SELECTION_FILE", str(ENGINE_DIR / "config" / "forecast_models.json")))
+
+DEFAULT_CANDIDATES = [
+    {"name": "prophet", "model": "prophet"},
+    {"name": "sarima", "model": "sarima"},
+    {"name": "sarima_d1", "model": "sarima", "params": {"order": [0, 1, 1], "seasonal_order": [0, 1, 1, 7]}},
+    {"name": "seasonal_naive", "model": "seasonal_naive"},
+]
+
+
+# --------------------------------------------------
+# FOLDS
+# --------------------------------------------------
+
+def daily_rows(daily_data: list) -> list:
+    """
+    The series as consecutive days [{"date", "value"}, ...], gaps
+    forward-filled, so every fold's test window has one actual per day
+    """
+    from services.time_series_service import _daily_series
+
+    series = _daily_series(daily_data)
+    return [
+        {"date": d, "value": float(v)}
+        for d, v in zip(series.index.strftime("%Y-%m-%d"), series.to_numpy())
+    ]
+
+
+def rolling_origins(n: int, initial: int = BACKTEST_INITIAL, horizon: int = BACKTEST_HORIZON,
+                    step: int = BACKTEST_STEP, max_folds: int = BACKTEST_MAX_FOLDS) -> list:
+    """
+    Cutoff indices, oldest first: the newest fold ends on the last day
+    and earlier ones step back by `step` days, as long as `initial` days
+    remain for training
+    """
+    cutoffs = list(range(n - horizon, initial - 1, -max(1, step)))[:max_folds]
+    return cutoffs[::-1]
+
+
+def _fold_key(candidate: dict, train: list, horizon: int) -> str:
+    payload = json.dumps(
+        [candidate["model"], candidate.get("params") or {}, horizon, train],
+        separators=(",", ":"), sort_keys=True
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def evaluate_fold(task: dict) -> dict:
+    """
+    Fits one candidate on one fold's training days (runs in a worker)
+    """
+    from services.time_series_service import forecast_model
+
+    candidate = task["candidate"]
+    started = time.perf_counter()
+    result = forecast_model(
+        candidate["model"],
+        task["train"],
+        periods=task["horizon"],
+        output="columns",
+        params=candidate.get("params"),
+        use_cache=False,
+    )
+    fit_seconds = time.perf_counter() - started
+
+    if result.get("error"):
+        return {"error": result.get("message") or "forecast failed", "fit_seconds": fit_seconds}
+    return {
+        "dates": result["forecast"]["dates"],
+        "yhat": result["forecast"]["yhat"],
+        "fit_seconds": fit_seconds,
+    }
+
+
+# --------------------------------------------------
+# FOLD CACHE
+# --------------------------------------------------
+
+class FoldCache:
+    """
+    One JSON file per fold forecast, keyed by _fold_key
+    """
+
+    def __init__(self, directory=BACKTEST_CACHE_DIR):
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f, separators=(",", ":"))
+        tmp.replace(path)
+
+
+# --------------------------------------------------
+# SCORING
+# --------------------------------------------------
+
+def _fold_errors(forecast: dict, actuals: dict) -> list:
+    """
+    [(actual, predicted), ...] for the forecast days that have an actual
+    """
+    return [
+        (actuals[d], y)
+        for d, y in zip(forecast.get("dates", []), forecast.get("yhat", []))
+        if d in actuals
+    ]
+
+
+def score_candidate(folds: list) -> dict:
+    """
+    MAE / MAPE over all test days of all folds, mean fit time per fold
+    """
+    pairs = [pair for fold in folds if "error" not in fold for pair in fold["pairs"]]
+    failed = sum("error" in fold for fold in folds)
+    # Cached folds keep the fit time measured when they were computed
+    fit_times = [fold["fit_seconds"] for fold in folds]
+
+    summary = {
+        "folds": len(folds),
+        "failed_folds": failed,
+        "points": len(pairs),
+        "mae": None,
+        "mape": None,
+        "fit_seconds": round(sum(fit_times) / len(fit_times), 4) if fit_times else None,
+        "cached_folds": sum(bool(fold.get("cached")) for fold in folds),
+    }
+    if pairs:
+        summary["mae"] = round(sum(abs(a - p) for a, p in pairs) / len(pairs), 4)
+        scaled = [abs(a - p) / abs(a) for a, p in pairs if abs(a) >= MAPE_MIN_ACTUAL]
+        if scaled:
+            summary["mape"] = round(100 * sum(scaled) / len(scaled), 2)
+    if failed:
+        summary["errors"] = sorted({fold["error"] for fold in folds if "error" in fold})[:3]
+    return summary
+
+
+def select_model(scores: dict, tolerance: float = BACKTEST_MAE_TOLERANCE):
+    """
+    Name of the cheapest candidate whose MAE is within tolerance of the
+    best; candidates with failed folds are not eligible
+    """
+    eligible = {
+        name: s for name, s in scores.items()
+        if s["mae"] is not None and not s["failed_folds"]
+    }
+    if not eligible:
+        return None
+    best_mae = min(s["mae"] for s in eligible.values())
+    close = [name for name, s in eligible.items() if s["mae"] <= best_mae * (1 + tolerance)]
+    return min(close, key=lambda name: (eligible[name]["fit_seconds"] or 0.0, eligible[name]["mae"]))
+
+
+# --------------------------------------------------
+# BACKTEST
+# --------------------------------------------------
+
+def _run_tasks(tasks: list, max_workers: int):
+    """
+    Yields (task, result) in completion order
+    """
+    if max_workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield task, evaluate_fold(task)
+        return
+
+    # spawn: workers do not inherit Flask / Firebase / Stan state
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        pending = {pool.submit(evaluate_fold, task): task for task in tasks}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                try:
+                    yield task, future.result()
+                except Exception as e:
+                    # Worker crashed (e.g. out of memory)
+                    yield task, {"error": str(e), "fit_seconds": 0.0}
+
+
+def _fold_result(task: dict, result: dict, actuals: dict, cached: bool = False) -> dict:
+    fold = {"cutoff": task["cutoff"], "fit_seconds": result.get("fit_seconds", 0.0), "cached": cached}
+    if "error" in result:
+        fold["error"] = result["error"]
+    else:
+        fold["pairs"] = _fold_errors(result, actuals[(task["series_id"], task["cutoff"])])
+    return fold
+
+
+def backtest(series: dict, candidates: list = None, horizon: int = BACKTEST_HORIZON,
+             initial: int = BACKTEST_INITIAL, step: int = BACKTEST_STEP, max_folds: int = BACKTEST_MAX_FOLDS,
+             max_workers: int = BACKTEST_WORKERS, cache: FoldCache = None,
+             tolerance: float = BACKTEST_MAE_TOLERANCE) -> dict:
+    """
+    series: {series_id: daily_data}
+    Returns {series_id: report}; a report has the per-candidate scores
+    and the selected candidate, or an error when the series is too short.
+    """
+    candidates = candidates or DEFAULT_CANDIDATES
+    cache = cache if cache is not None else FoldCache()
+    started = time.perf_counter()
+
+    reports = {}
+    folds = {}
+    actuals = {}
+    tasks = []
+
+    for series_id, daily_data in series.items():
+        try:
+            rows = daily_rows(daily_data) if daily_data else []
+        except Exception as e:
+            reports[series_id] = {"error": True, "message": str(e)}
+            continue
+        cutoffs = rolling_origins(len(rows), initial, horizon, step, max_folds)
+        if not cutoffs:
+            reports[series_id] = {
+                "error": True,
+                "message": f"Need at least {initial + horizon} days for a backtest, got {len(rows)}.",
+            }
+            continue
+
+        reports[series_id] = {"error": False, "days": len(rows), "folds": len(cutoffs)}
+        for cutoff in cutoffs:
+            train = rows[:cutoff]
+            actuals[(series_id, cutoff)] = {r["date"]: r["value"] for r in rows[cutoff:cutoff + horizon]}
+            for candidate in candidates:
+                task = {
+                    "series_id": series_id,
+                    "cutoff": cutoff,
+                    "candidate": candidate,
+                    "train": train,
+                    "horizon": horizon,
+                    "key": _fold_key(candidate, train, horizon),
+                }
+                cached = cache.get(task["key"])
+                if cached is not None:
+                    folds.setdefault((series_id, candidate["name"]), []).append(
+                        _fold_result(task, cached, actuals, cached=True)
+                    )
+                else:
+                    tasks.append(task)
+
+    for task, result in _run_tasks(tasks, max_workers):
+        if "error" not in result:
+            cache.put(task["key"], result)
+        folds.setdefault((task["series_id"], task["candidate"]["name"]), []).append(
+            _fold_result(task, result, actuals)
+        )
+
+    for series_id, report in reports.items():
+        if report["error"]:
+            continue
+        scores = {
+            candidate["name"]: score_candidate(folds.get((series_id, candidate["name"]), []))
+            for candidate in candidates
+        }
+        selected = select_model(scores, tolerance)
+        report["scores"] = scores
+        report["selected"] = next((c for c in candidates if c["name"] == selected), None)
+
+    print(
+        f"[BACKTEST] {len(series)} series, {len(tasks)} fold fits, {cache.hits} cached "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return reports
+
+
+# --------------------------------------------------
+# SELECTIONS
+# --------------------------------------------------
+
+_selection_lock = threading.Lock()
+_selection_cache = {"stat": None, "selections": {}}
+
+
+def load_selections(path=None) -> dict:
+    """
+    {series_id: selection}, re-read only when the file changes
+    """
+    path = Path(path or SELECTION_PATH)
+    try:
+        st = path.stat()
+    except OSError:
+        return {}
+
+    stat_key = (str(path), st.st_mtime_ns, st.st_size)
+    with _selection_lock:
+        if _selection_cache["stat"] != stat_key:
+            with open(path, "r", encoding="utf-8") as f:
+                _selection_cache["selections"] = json.load(f)
+            _selection_cache["stat"] = stat_key
+        return _selection_cache["selections"]
+
+
+def save_selections(reports: dict, path=None) -> dict:
+    """
+    Merges the selected model of every successful report into the
+    selection file and returns the stored selections
+    """
+    path = Path(path or SELECTION_PATH)
+    selections = dict(load_selections(path))
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    for series_id, report in reports.items():
+        selected = report.get("selected")
+        if report.get("error") or not selected:
+            continue
+        score = report["scores"][selected["name"]]
+        selections[series_id] = {
+            "name": selected["name"],
+            "model": selected["model"],
+            "params": selected.get("params") or {},
+            "mae": score["mae"],
+            "mape": score["mape"],
+            "fit_seconds": score["fit_seconds"],
+            "folds": report["folds"],
+            "selected_at": now,
+        }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(selections, f, indent=2, sort_keys=True)
+    tmp.replace(path)
+    return selections
+
+
+def selected_model(series_id: str):
+    """
+    The stored selection for series_id, or None
+    """
+    if not series_id:
+        return None
+    return load_selections().get(series_id)
+
+
+def resolve_model(model, series_id: str):
+    """
+    (model, params, selection) for a forecast request: an explicit model
+    is used as is; None / "auto" takes the series' stored selection,
+    else Prophet
+    """
+    if model and model != "auto":
+        return model, None, None
+    selection = selected_model(series_id)
+    if selection:
+        return selection["model"], selection.get("params"), selection
+    return "prophet", None, None
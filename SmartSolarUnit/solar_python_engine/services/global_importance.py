@@ -0,0 +1,285 @@
+"""
+Precomputed global feature importance for the XAI service.
+
+A background job samples recent features_used records from
+predicted_units, computes
+- mean |SHAP| per feature (TreeExplainer for tree models, else
+  KernelExplainer on a sampled subset; row chunks in parallel)
+- permutation importance per feature (feature x repeat tasks in parallel)
+and stores the result next to the model:
+
+    model/solar_power_model.pkl
+    model/solar_power_model.importance.json
+
+The artifact records the SHA-256 of the model it was computed for, so
+/api/xai/feature-importance serves it from memory only while that model
+is current and schedules a recompute once the model file changes.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from services.xai_service import FEATURES_ORDER, MODEL_PATH, is_tree_model, load_model, model_sha256
+
+ARTIFACT_PATH = MODEL_PATH.with_name(MODEL_PATH.stem + ".importance.json")
+
+# Records sampled across all configured sites, and worker processes
+IMPORTANCE_SAMPLE_ROWS = int(os.getenv("IMPORTANCE_SAMPLE_ROWS", "2000"))
+IMPORTANCE_N_JOBS = int(os.getenv("IMPORTANCE_N_JOBS", "-1"))
+PERMUTATION_REPEATS = int(os.getenv("IMPORTANCE_PERMUTATION_REPEATS", "5"))
+
+# KernelExplainer (non-tree models): rows explained, background rows and
+# model evaluations per row
+KERNEL_SHAP_ROWS = int(os.getenv("IMPORTANCE_KERNEL_ROWS", "200"))
+KERNEL_BACKGROUND_ROWS = int(os.getenv("IMPORTANCE_KERNEL_BACKGROUND", "50"))
+KERNEL_NSAMPLES = int(os.getenv("IMPORTANCE_KERNEL_NSAMPLES", "100"))
+
+# Background refresh retry delay after a failure, doubling up to the max
+REFRESH_RETRY_S = float(os.getenv("IMPORTANCE_RETRY_S", "300"))
+REFRESH_RETRY_MAX_S = float(os.getenv("IMPORTANCE_RETRY_MAX_S", "21600"))
+
+
+# --------------------------------------------------
+# SAMPLE
+# --------------------------------------------------
+
+def load_recent_feature_rows(max_rows: int = IMPORTANCE_SAMPLE_ROWS, sites: list = None) -> np.ndarray:
+    """
+    The newest features_used records of every configured site, as an
+    (n, 5) matrix in FEATURES_ORDER
+    """
+    from firebase.firebase_client import get_reference
+    from utils.site_config import load_sites
+
+    sites = sites if sites is not None else load_sites()
+    if not sites:
+        return np.empty((0, len(FEATURES_ORDER)))
+
+    per_site = max(1, math.ceil(max_rows / len(sites)))
+    rows = []
+    for site in sites:
+        ref = get_reference(f"predicted_units/{site['customer']}/{site['site_id']}")
+        data = ref.order_by_key().limit_to_last(per_site).get() or {}
+        for record in data.values():
+            features = record.get("features_used") if isinstance(record, dict) else None
+            if not isinstance(features, dict):
+                continue
+            try:
+                rows.append([float(features[k]) for k in FEATURES_ORDER])
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    return np.array(rows[-max_rows:], dtype=np.float64).reshape(-1, len(FEATURES_ORDER))
+
+
+# --------------------------------------------------
+# IMPORTANCE
+# --------------------------------------------------
+
+def _frame(X):
+    import pandas as pd
+    return pd.DataFrame(X, columns=FEATURES_ORDER)
+
+
+def _abs_shap_sum(model, X: np.ndarray, background: np.ndarray = None) -> np.ndarray:
+    """
+    Column sums of |SHAP| for one chunk (runs in a worker). TreeExplainer
+    when background is None, else KernelExplainer against background.
+    """
+    import shap
+
+    if background is None:
+        sv = shap.TreeExplainer(model).shap_values(_frame(X))
+    else:
+        explainer = shap.KernelExplainer(lambda Z: model.predict(_frame(Z)), background)
+        sv = explainer.shap_values(X, nsamples=KERNEL_NSAMPLES, silent=True)
+    if isinstance(sv, list):
+        sv = sv[0]
+    return np.abs(np.asarray(sv, dtype=np.float64)).sum(axis=0)
+
+
+def _permutation_score(model, X: np.ndarray, reference: np.ndarray, column: int, seed: int) -> float:
+    """
+    Mean squared change of the predictions when one column is shuffled
+    (runs in a worker)
+    """
+    rng = np.random.default_rng(seed)
+    X_perm = X.copy()
+    X_perm[:, column] = X_perm[rng.permutation(len(X)), column]
+    predictions = np.asarray(model.predict(_frame(X_perm)), dtype=np.float64)
+    return float(np.mean((predictions - reference) ** 2))
+
+
+def _normalized(values: dict) -> dict:
+    total = sum(values.values()) or 1.0
+    return {k: v / total for k, v in values.items()}
+
+
+def compute_global_importance(model, X: np.ndarray, n_jobs: int = IMPORTANCE_N_JOBS,
+                              repeats: int = PERMUTATION_REPEATS, seed: int = 0) -> dict:
+    """
+    Mean |SHAP| and permutation importance of every feature over X.
+
+    Permutation importance uses the model's own predictions as reference
+    (no ground truth is stored), so it measures how much each feature
+    drives the output.
+    """
+    from joblib import Parallel, delayed
+
+    X = np.asarray(X, dtype=np.float64)
+    parallel = Parallel(n_jobs=n_jobs)
+
+    if is_tree_model(model):
+        explainer, X_shap, background = "tree", X, None
+        n_chunks = max(1, min(len(X) // 200, os.cpu_count() or 1))
+    else:
+        # KernelExplainer costs nsamples predictions per row: explain a sample
+        rng = np.random.default_rng(seed)
+        explainer = "kernel"
+        X_shap = X[rng.choice(len(X), min(KERNEL_SHAP_ROWS, len(X)), replace=False)]
+        background = X[rng.choice(len(X), min(KERNEL_BACKGROUND_ROWS, len(X)), replace=False)]
+        n_chunks = max(1, min(len(X_shap), os.cpu_count() or 1))
+
+    shap_sums = parallel(
+        delayed(_abs_shap_sum)(model, chunk, background) for chunk in np.array_split(X_shap, n_chunks)
+    )
+    mean_abs_shap = np.sum(shap_sums, axis=0) / len(X_shap)
+
+    reference = np.asarray(model.predict(_frame(X)), dtype=np.float64)
+    tasks = [(column, seed + column * repeats + r) for column in range(X.shape[1]) for r in range(repeats)]
+    scores = parallel(
+        delayed(_permutation_score)(model, X, reference, column, task_seed) for column, task_seed in tasks
+    )
+    scores = np.array(scores).reshape(X.shape[1], repeats)
+
+    return {
+        "shap_explainer": explainer,
+        "shap_rows": int(len(X_shap)),
+        "mean_abs_shap": {
+            name: round(float(v), 8) for name, v in zip(FEATURES_ORDER, mean_abs_shap)
+        },
+        "permutation_importance": {
+            name: {"mean": round(float(row.mean()), 10), "std": round(float(row.std()), 10)}
+            for name, row in zip(FEATURES_ORDER, scores)
+        },
+    }
+
+
+# --------------------------------------------------
+# ARTIFACT
+# --------------------------------------------------
+
+def build_artifact(max_rows: int = IMPORTANCE_SAMPLE_ROWS, n_jobs: int = IMPORTANCE_N_JOBS, X=None) -> dict:
+    """
+    Computes the artifact for the current model; X defaults to the recent
+    features_used sample
+    """
+    model, _ = load_model()
+    if model is None:
+        raise FileNotFoundError(f"Model not found: {MODEL_PATH}")
+
+    started = time.perf_counter()
+    if X is None:
+        X = load_recent_feature_rows(max_rows)
+    if len(X) == 0:
+        raise ValueError("No features_used records to compute importance from")
+
+    result = compute_global_importance(model, X, n_jobs=n_jobs)
+    shares = _normalized(result["mean_abs_shap"])
+
+    return {
+        "model_sha256": model_sha256(),
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "rows": int(len(X)),
+        "compute_seconds": round(time.perf_counter() - started, 3),
+        "features": [{"name": k, "importance": round(v, 4)} for k, v in shares.items()],
+        "method": "mean_abs_shap",
+        **result,
+    }
+
+
+def save_artifact(artifact: dict, path=ARTIFACT_PATH):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, indent=2)
+    tmp.replace(path)
+
+
+_artifact_cache = {"stat": None, "artifact": None}
+
+
+def cached_artifact():
+    """
+    The stored artifact, re-read only when the file changes; None if absent
+    """
+    try:
+        st = ARTIFACT_PATH.stat()
+    except OSError:
+        return None
+
+    stat_key = (st.st_mtime_ns, st.st_size)
+    if _artifact_cache["stat"] != stat_key:
+        with open(ARTIFACT_PATH, "r", encoding="utf-8") as f:
+            _artifact_cache["artifact"] = json.load(f)
+        _artifact_cache["stat"] = stat_key
+    return _artifact_cache["artifact"]
+
+
+class ImportanceRefresher:
+    """
+    Recomputes the artifact on a background thread; at most one run at a
+    time. After a failure, further runs wait REFRESH_RETRY_S, doubling with
+    each consecutive failure up to REFRESH_RETRY_MAX_S.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_failure_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def retry_in(self) -> float:
+        """
+        Seconds until a refresh may run again (0 when it may run now)
+        """
+        if not self.failures:
+            return 0.0
+        delay = min(REFRESH_RETRY_S * 2 ** (self.failures - 1), REFRESH_RETRY_MAX_S)
+        return max(0.0, self.last_failure_at + delay - time.monotonic())
+
+    def refresh_async(self, force: bool = False) -> bool:
+        with self._lock:
+            if self.running or (not force and self.retry_in() > 0):
+                return False
+            self._thread = threading.Thread(target=self._run, name="importance-refresh", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self):
+        try:
+            artifact = build_artifact()
+            save_artifact(artifact)
+            self.runs += 1
+            self.failures = 0
+            self.last_error = None
+            print(f"[XAI] Global importance recomputed from {artifact['rows']} rows in {artifact['compute_seconds']}s")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self.last_failure_at = time.monotonic()
+            print(f"[ERROR] Global importance refresh failed, retrying in {self.retry_in():.0f}s: {e}")
+
+
+refresher = ImportanceRefresher()
@@ -0,0 +1,193 @@
+"""
+Bounded, backpressure-aware queue between Firebase callbacks and the
+inference worker.
+
+Overflow policies when the queue is full:
+    drop_oldest  discard the oldest queued event (ingestion never waits)
+    block        make the producer (the listener callback) wait for room,
+                 up to block_timeout_s, then drop the new event
+    spill        append events to a JSON-lines file on disk and read them
+                 back, in order, once the in-memory queue has room
+"""
+
+import json
+import queue
+import threading
+from collections import deque
+from pathlib import Path
+
+OVERFLOW_POLICIES = ("drop_oldest", "block", "spill")
+
+
+class BoundedIngestionQueue:
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        overflow: str = "drop_oldest",
+        block_timeout_s: float = None,
+        spill_path=None,
+        encode=None,
+        decode=None,
+        on_drop=None
+    ):
+        """
+        encode(item) / decode(value) convert items to and from
+        JSON-serialisable values for the spill file. on_drop(item) is
+        called for each queued item drop_oldest evicts.
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected one of {OVERFLOW_POLICIES}")
+        if overflow == "spill" and spill_path is None:
+            raise ValueError("overflow='spill' needs a spill_path")
+
+        self.maxsize = max(1, int(maxsize))
+        self.overflow = overflow
+        self.block_timeout_s = block_timeout_s
+        self.encode = encode or (lambda item: item)
+        self.decode = decode or (lambda value: value)
+        self.on_drop = on_drop
+
+        self._items = deque()
+        self._cond = threading.Condition()
+
+        self._spill_path = Path(spill_path) if spill_path is not None else None
+        self._spill_read_offset = 0
+        self._spill_pending = 0
+        if self._spill_path is not None:
+            self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+            # Start clean: a previous run's spill belongs to that run
+            self._spill_path.write_text("", encoding="utf-8")
+
+        self.dropped = 0
+        self.spilled = 0
+        self.blocked_puts = 0
+        self.high_watermark = 0
+
+    # --------------------------------------------------
+    # PRODUCER SIDE
+    # --------------------------------------------------
+
+    def _append(self, item):
+        self._items.append(item)
+        if len(self._items) > self.high_watermark:
+            self.high_watermark = len(self._items)
+        self._cond.notify()
+
+    def put(self, item) -> bool:
+        """
+        Returns False if the item was dropped
+        """
+        evicted = None
+        with self._cond:
+            # Once spilling, keep FIFO order by spilling until the file drains
+            if len(self._items) < self.maxsize and not self._spill_pending:
+                self._append(item)
+                return True
+
+            if self.overflow == "drop_oldest":
+                evicted = self._items.popleft()
+                self.dropped += 1
+                self._append(item)
+
+            elif self.overflow == "spill":
+                self._spill(item)
+                return True
+
+            else:
+                # block
+                self.blocked_puts += 1
+                has_room = self._cond.wait_for(
+                    lambda: len(self._items) < self.maxsize,
+                    timeout=self.block_timeout_s
+                )
+                if not has_room:
+                    self.dropped += 1
+                    return False
+                self._append(item)
+                return True
+
+        # Outside the lock: the callback may take locks of its own
+        if self.on_drop is not None:
+            self.on_drop(evicted)
+        return True
+
+    def put_control(self, item):
+        """
+        Enqueues a control item (e.g. a stop sentinel), ignoring the bound
+        """
+        with self._cond:
+            self._append(item)
+
+    # --------------------------------------------------
+    # SPILL FILE
+    # --------------------------------------------------
+
+    def _spill(self, item):
+        with open(self._spill_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.encode(item)) + "\n")
+        self._spill_pending += 1
+        self.spilled += 1
+        self._cond.notify()
+
+    def _refill_from_spill(self):
+        room = self.maxsize - len(self._items)
+        if room <= 0 or not self._spill_pending:
+            return
+
+        with open(self._spill_path, "r", encoding="utf-8") as f:
+            f.seek(self._spill_read_offset)
+            while room > 0 and self._spill_pending:
+                line = f.readline()
+                if not line:
+                    break
+                self._items.append(self.decode(json.loads(line)))
+                self._spill_pending -= 1
+                room -= 1
+            self._spill_read_offset = f.tell()
+
+        if not self._spill_pending:
+            # Drained: truncate so the file does not grow forever
+            self._spill_path.write_text("", encoding="utf-8")
+            self._spill_read_offset = 0
+
+    # --------------------------------------------------
+    # CONSUMER SIDE (queue.Queue compatible)
+    # --------------------------------------------------
+
+    def get(self, block: bool = True, timeout: float = None):
+        with self._cond:
+            if not self._items and self._spill_pending:
+                self._refill_from_spill()
+
+            if not self._items:
+                if not block:
+                    raise queue.Empty
+                if not self._cond.wait_for(
+                    lambda: self._items or self._spill_pending, timeout=timeout
+                ):
+                    raise queue.Empty
+                if not self._items:
+                    self._refill_from_spill()
+
+            item = self._items.popleft()
+            # Wake producers waiting for room
+            self._cond.notify_all()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return len(self._items) + self._spill_pending
+
+    def metrics(self) -> dict:
+        return {
+            "depth": len(self._items),
+            "spill_depth": self._spill_pending,
+            "high_watermark": self.high_watermark,
+            "maxsize": self.maxsize,
+            "overflow": self.overflow,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "blocked_puts": self.blocked_puts,
+        }
@@ -0,0 +1,404 @@
+"""
+Intraday forecasts of the 5-minute predicted_units series.
+
+Per site, a damped multiplicative exponential-smoothing model with a
+daily profile:
+
+    profile[slot]   smoothed kWh of each 5-minute slot of the day (288),
+                    seeded from recent history and, where a slot has no
+                    history yet, from a clear-sky shape
+    level           how far today runs above / below the profile
+                    (clouds), smoothed over the last few points
+
+    ŷ(t + h) = profile[slot(t + h)] · (1 + (level - 1) · decay^h)
+
+so the current weather persists for the next hour or two and fades back
+to the usual day. update() is O(1) per new point and every site's state
+lives in shared NumPy arrays, so forecast_all() produces the next
+horizon for the whole fleet in one vectorized step.
+
+Timestamps are device wall-clock seconds of the record keys
+(utils.time_utils.record_key_to_seconds), so slots follow local time.
+"""
+
+import calendar
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from utils.time_utils import record_key_to_seconds
+
+SLOT_SECONDS = 300
+SLOTS_PER_DAY = 86400 // SLOT_SECONDS
+
+INTRADAY_HORIZON = int(os.getenv("INTRADAY_HORIZON", "36"))
+INTRADAY_HISTORY_DAYS = int(os.getenv("INTRADAY_HISTORY_DAYS", "14"))
+# Smoothing of the level (per point), of the profile (per day) and the
+# per-step decay of the level towards 1 over the horizon
+INTRADAY_LEVEL_ALPHA = float(os.getenv("INTRADAY_LEVEL_ALPHA", "0.3"))
+INTRADAY_PROFILE_GAMMA = float(os.getenv("INTRADAY_PROFILE_GAMMA", "0.15"))
+INTRADAY_LEVEL_DECAY = float(os.getenv("INTRADAY_LEVEL_DECAY", "0.97"))
+# Seconds between Firebase reads for the same site
+INTRADAY_REFRESH_S = float(os.getenv("INTRADAY_REFRESH_S", "60"))
+# Sites near the equator by default (Sri Lanka)
+INTRADAY_LATITUDE = float(os.getenv("INTRADAY_LATITUDE", "7.0"))
+
+# Clear-sky kWh per m² of panel in 5 minutes at the sun's zenith
+# (~1000 W/m², ~18% efficiency)
+CLEAR_SKY_KWH_PER_M2 = 1.0 * 0.18 * SLOT_SECONDS / 3600
+# Profile values below this count as night; the level only follows slots
+# above LEVEL_MIN_SHARE of the day's peak (dawn / dusk ratios are noise)
+MIN_PROFILE_KWH = 1e-4
+LEVEL_MIN_SHARE = 0.05
+LEVEL_BOUNDS = (0.0, 3.0)
+Z_90 = 1.645
+
+
+def clear_sky_shape(day_of_year: int, latitude: float = INTRADAY_LATITUDE) -> np.ndarray:
+    """
+    cos(solar zenith) of every slot of the day, clipped at 0 (night),
+    from local clock time as solar time
+    """
+    hours = (np.arange(SLOTS_PER_DAY) + 0.5) * SLOT_SECONDS / 3600
+    declination = math.radians(23.45) * math.sin(2 * math.pi * (284 + day_of_year) / 365)
+    hour_angle = np.radians(15.0 * (hours - 12.0))
+    lat = math.radians(latitude)
+    cos_zenith = math.sin(lat) * math.sin(declination) + math.cos(lat) * math.cos(declination) * np.cos(hour_angle)
+    return np.clip(cos_zenith, 0.0, None)
+
+
+def _slot_of(ts):
+    return (np.asarray(ts, dtype=np.float64) % 86400 // SLOT_SECONDS).astype(np.int64)
+
+
+def wall_clock_now() -> float:
+    """
+    The server's local time in record-key seconds (no timezone shift),
+    for sites that have no points yet
+    """
+    return float(calendar.timegm(time.localtime()))
+
+
+def _format_ts(seconds) -> list:
+    return [
+        datetime.fromtimestamp(float(s), tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
+        for s in np.asarray(seconds).tolist()
+    ]
+
+
+class IntradayForecaster:
+    """
+    Fleet-wide state: one row per site in profile / variance / level arrays
+    """
+
+    def __init__(self, alpha: float = INTRADAY_LEVEL_ALPHA, gamma: float = INTRADAY_PROFILE_GAMMA,
+                 decay: float = INTRADAY_LEVEL_DECAY, latitude: float = INTRADAY_LATITUDE):
+        self.alpha = alpha
+        self.gamma = gamma
+        self.decay = decay
+        self.latitude = latitude
+
+        self._index = {}
+        self._keys = []
+        self._lock = threading.Lock()
+        self._allocate(16)
+
+        self.updates = 0
+        self.late_points = 0
+
+    # --------------------------------------------------
+    # STATE
+    # --------------------------------------------------
+
+    def _allocate(self, capacity: int):
+        old = len(self._keys)
+        profile = np.zeros((capacity, SLOTS_PER_DAY))
+        variance = np.zeros((capacity, SLOTS_PER_DAY))
+        level = np.ones(capacity)
+        floor = np.full(capacity, MIN_PROFILE_KWH)
+        last_ts = np.full(capacity, -np.inf)
+        if old:
+            profile[:old] = self.profile[:old]
+            variance[:old] = self.variance[:old]
+            level[:old] = self.level[:old]
+            floor[:old] = self.floor[:old]
+            last_ts[:old] = self.last_ts[:old]
+        self.profile, self.variance, self.level, self.floor, self.last_ts = profile, variance, level, floor, last_ts
+
+    def _row(self, site: str) -> int:
+        row = self._index.get(site)
+        if row is None:
+            row = len(self._keys)
+            if row == len(self.level):
+                self._allocate(2 * len(self.level))
+            self._index[site] = row
+            self._keys.append(site)
+        return row
+
+    def __contains__(self, site: str) -> bool:
+        return site in self._index
+
+    def last_timestamp(self, site: str):
+        row = self._index.get(site)
+        if row is None or not np.isfinite(self.last_ts[row]):
+            return None
+        return float(self.last_ts[row])
+
+    # --------------------------------------------------
+    # FIT / UPDATE
+    # --------------------------------------------------
+
+    def fit(self, site: str, timestamps, kwh, peak_kwh: float = None, days: int = INTRADAY_HISTORY_DAYS,
+            now: float = None):
+        """
+        (Re)initializes a site from its history in one vectorized pass:
+        recency-weighted mean and variance per slot, the clear-sky shape
+        for slots without history, and the level of the last hour.
+
+        A site without points but with peak_kwh gets the clear-sky profile
+        alone, anchored at the slot of `now` (default wall_clock_now()),
+        so it can be forecast before its first record arrives.
+        """
+        ts = np.asarray(timestamps, dtype=np.float64)
+        y = np.asarray(kwh, dtype=np.float64)
+        order = np.argsort(ts, kind="stable")
+        ts, y = ts[order], y[order]
+        if ts.size:
+            keep = ts > ts[-1] - days * 86400
+            ts, y = ts[keep], y[keep]
+
+        if now is None:
+            now = ts[-1] if ts.size else wall_clock_now()
+        day_of_year = datetime.fromtimestamp(now, tz=timezone.utc).timetuple().tm_yday
+        shape = clear_sky_shape(day_of_year, self.latitude)
+        if peak_kwh is None:
+            peak_kwh = float(y.max()) if y.size else 0.0
+        prior = shape * peak_kwh / (shape.max() or 1.0)
+
+        profile, variance = prior.copy(), np.zeros(SLOTS_PER_DAY)
+        if ts.size:
+            slots = _slot_of(ts)
+            weights = (1 - self.gamma) ** ((ts[-1] - ts) // 86400)
+            total = np.bincount(slots, weights=weights, minlength=SLOTS_PER_DAY)
+            seen = total > 0
+            mean = np.bincount(slots, weights=weights * y, minlength=SLOTS_PER_DAY)
+            profile[seen] = mean[seen] / total[seen]
+            sq = np.bincount(slots, weights=weights * (y - profile[slots]) ** 2, minlength=SLOTS_PER_DAY)
+            variance[seen] = sq[seen] / total[seen]
+
+        floor = max(MIN_PROFILE_KWH, LEVEL_MIN_SHARE * float(profile.max()))
+        level = 1.0
+        if ts.size:
+            recent = (ts > ts[-1] - 3600) & (profile[_slot_of(ts)] > floor)
+            expected = profile[_slot_of(ts[recent])].sum()
+            if expected > 0:
+                level = float(np.clip(y[recent].sum() / expected, *LEVEL_BOUNDS))
+
+        if ts.size:
+            last_ts = ts[-1]
+        elif peak_kwh > 0:
+            last_ts = now // SLOT_SECONDS * SLOT_SECONDS
+        else:
+            last_ts = -np.inf
+
+        with self._lock:
+            row = self._row(site)
+            self.profile[row] = profile
+            self.variance[row] = variance
+            self.level[row] = level
+            self.floor[row] = floor
+            self.last_ts[row] = last_ts
+
+    def update(self, site: str, timestamp: float, kwh: float) -> bool:
+        """
+        O(1) update with one new point; points not newer than the last
+        one are ignored (False)
+        """
+        slot = int(timestamp % 86400 // SLOT_SECONDS)
+        with self._lock:
+            row = self._row(site)
+            if timestamp <= self.last_ts[row]:
+                self.late_points += 1
+                return False
+
+            expected = self.profile[row, slot]
+            if expected > self.floor[row]:
+                error = kwh - expected * self.level[row]
+                ratio = min(max(kwh / expected, LEVEL_BOUNDS[0]), LEVEL_BOUNDS[1])
+                self.level[row] = self.alpha * ratio + (1 - self.alpha) * self.level[row]
+            else:
+                error = kwh - expected
+            self.profile[row, slot] = self.gamma * kwh + (1 - self.gamma) * expected
+            self.variance[row, slot] = self.gamma * error * error + (1 - self.gamma) * self.variance[row, slot]
+            self.last_ts[row] = timestamp
+            self.updates += 1
+        return True
+
+    # --------------------------------------------------
+    # FORECAST
+    # --------------------------------------------------
+
+    def _predict(self, rows: np.ndarray, horizon: int):
+        steps = np.arange(1, horizon + 1)
+        ts = self.last_ts[rows, None] + steps * SLOT_SECONDS
+        slots = _slot_of(ts)
+        damped = 1 + (self.level[rows, None] - 1) * self.decay ** steps
+        profile = self.profile[rows[:, None], slots]
+        spread = Z_90 * np.sqrt(self.variance[rows[:, None], slots])
+        yhat = profile * damped
+        return ts, yhat, np.clip(yhat - spread, 0.0, None), yhat + spread
+
+    def forecast(self, site: str, horizon: int = INTRADAY_HORIZON) -> dict:
+        """
+        Columnar forecast of the next `horizon` 5-minute slots
+        """
+        with self._lock:
+            row = self._index.get(site)
+            if row is None or not np.isfinite(self.last_ts[row]):
+                return {"error": True, "message": f"No 5-minute history for {site}.", "forecast": []}
+            ts, yhat, lower, upper = self._predict(np.array([row]), horizon)
+            level = float(self.level[row])
+
+        return {
+            "error": False,
+            "forecast": {
+                "dates": _format_ts(ts[0]),
+                "yhat": np.round(yhat[0], 6).tolist(),
+                "yhat_lower": np.round(lower[0], 6).tolist(),
+                "yhat_upper": np.round(upper[0], 6).tolist(),
+            },
+            "model": "intraday_ets",
+            "interval": "5_min",
+            "unit": "kWh",
+            "periods": horizon,
+            "level": round(level, 4),
+            "last_point": _format_ts([ts[0, 0] - SLOT_SECONDS])[0],
+        }
+
+    def forecast_all(self, horizon: int = INTRADAY_HORIZON) -> tuple:
+        """
+        (sites, timestamps, yhat) for every site with history; the arrays
+        are (n_sites, horizon)
+        """
+        with self._lock:
+            rows = np.flatnonzero(np.isfinite(self.last_ts[:len(self._keys)]))
+            ts, yhat, _, _ = self._predict(rows, horizon)
+            return [self._keys[r] for r in rows], ts, yhat
+
+    def stats(self) -> dict:
+        return {
+            "sites": len(self._keys),
+            "updates": self.updates,
+            "late_points": self.late_points,
+        }
+
+
+# --------------------------------------------------
+# SITE HISTORY (predicted_units)
+# --------------------------------------------------
+
+def _points(data: dict) -> tuple:
+    """
+    (timestamps, kwh, last_key) of predicted_units records
+    """
+    ts, kwh, last_key = [], [], None
+    for key, record in (data or {}).items():
+        if not isinstance(record, dict):
+            continue
+        seconds = record_key_to_seconds(key)
+        value = record.get("predicted_kwh_5min")
+        if seconds is None or value is None:
+            continue
+        ts.append(seconds)
+        kwh.append(float(value))
+        last_key = key if last_key is None or key > last_key else last_key
+    return np.array(ts, dtype=np.float64), np.array(kwh, dtype=np.float64), last_key
+
+
+def load_site_points(customer: str, site_id: str, start_key: str = None,
+                     days: int = INTRADAY_HISTORY_DAYS) -> tuple:
+    """
+    predicted_units of one site after start_key, or its last `days` days
+    """
+    from firebase.firebase_client import get_reference
+
+    query = get_reference(f"predicted_units/{customer}/{site_id}").order_by_key()
+    if start_key is not None:
+        query = query.start_at(start_key)
+    else:
+        query = query.limit_to_last(days * SLOTS_PER_DAY)
+    return _points(query.get())
+
+
+intraday = IntradayForecaster()
+_refresh_state = {}
+_refresh_lock = threading.Lock()
+
+
+def refresh_site(customer: str, site_id: str, panel_area_m2: float = None) -> str:
+    """
+    Brings a site's state up to date from predicted_units: the full
+    history on first use, afterwards only the records after the last one
+    seen (at most every INTRADAY_REFRESH_S)
+    """
+    site = f"{customer}/{site_id}"
+    now = time.monotonic()
+    with _refresh_lock:
+        state = _refresh_state.setdefault(site, {"checked": None, "last_key": None, "lock": threading.Lock()})
+
+    with state["lock"]:
+        if state["checked"] is not None and now - state["checked"] < INTRADAY_REFRESH_S:
+            return site
+
+        if state["last_key"] is None or site not in intraday:
+            ts, kwh, last_key = load_site_points(customer, site_id)
+            peak = panel_area_m2 * CLEAR_SKY_KWH_PER_M2 if panel_area_m2 and not kwh.size else None
+            intraday.fit(site, ts, kwh, peak_kwh=peak)
+        else:
+            ts, kwh, last_key = load_site_points(customer, site_id, start_key=state["last_key"])
+            # start_at includes the last record already seen
+            newer = ts > (intraday.last_timestamp(site) or -np.inf)
+            ts, kwh = ts[newer], kwh[newer]
+            for i in np.argsort(ts, kind="stable"):
+                intraday.update(site, ts[i], kwh[i])
+
+        state["last_key"] = last_key or state["last_key"]
+        state["checked"] = now
+    return site
+
+
+def forecast_intraday(customer: str = None, site_id: str = None, points: list = None,
+                      horizon: int = INTRADAY_HORIZON, output: str = "rows",
+                      panel_area_m2: float = None) -> dict:
+    """
+    Next `horizon` 5-minute predictions of a site (customer / site_id,
+    kept up to date incrementally) or of the given points
+    [{"key": "YYYYMMDD_HHMMSS", "kwh": float}, ...]
+    """
+    from services.time_series_service import shape_output
+
+    horizon = max(1, min(int(horizon), SLOTS_PER_DAY))
+    try:
+        if points:
+            data = {
+                p.get("key"): {"predicted_kwh_5min": p.get("kwh", p.get("predicted_kwh_5min"))}
+                for p in points if isinstance(p, dict)
+            }
+            ts, kwh, _ = _points(data)
+            if not ts.size:
+                return {"error": True, "message": "No valid points (need 'key' and 'kwh').", "forecast": []}
+            forecaster = IntradayForecaster()
+            forecaster.fit("request", ts, kwh)
+            result = forecaster.forecast("request", horizon)
+        elif customer and site_id:
+            site = refresh_site(customer, site_id, panel_area_m2)
+            result = intraday.forecast(site, horizon)
+        else:
+            return {"error": True, "message": "Need 'customer' and 'site_id', or 'points'.", "forecast": []}
+        return shape_output(result, output)
+    except Exception as e:
+        return {"error": True, "message": str(e), "forecast": []}
@@ -0,0 +1,288 @@
+"""
+Listener supervisor for the realtime engine.
+
+Opens a Firebase listener for every configured device (or one multiplexed
+listener on devices/ for the whole fleet), all feeding one shared
+MicroBatcher, and keeps per-device lag statistics.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase.firebase_client import get_reference
+from firebase.fleet_listener import FleetEventRouter, start_fleet_listener
+from utils.dedup import ProcessedKeyCache
+from utils.time_utils import record_key_from_event_path
+
+LISTENER_MODES = ("per_device", "multiplexed")
+
+
+class DeviceStats:
+    __slots__ = (
+        "events_received",
+        "duplicates_skipped",
+        "predictions_saved",
+        "events_dropped",
+        "last_event_at",
+        "last_lag_s",
+        "max_lag_s",
+    )
+
+    def __init__(self):
+        self.events_received = 0
+        self.duplicates_skipped = 0
+        self.predictions_saved = 0
+        self.events_dropped = 0
+        self.last_event_at = None
+        self.last_lag_s = 0.0
+        self.max_lag_s = 0.0
+
+
+class ListenerSupervisor:
+    """
+    Runs the listeners of all sites at once.
+
+    Each listener only forwards records to the shared batcher, so a slow
+    prediction or write never stalls event delivery.
+
+    mode="per_device" opens devices/{device_id} streams through a thread
+    pool so startup with many devices does not pay one HTTP handshake after
+    another. mode="multiplexed" opens a single devices/ stream and routes
+    child events by event.path, so connection count stays O(1).
+
+    Records already processed (same device and record key, e.g. replayed
+    after a reconnect) are skipped before inference. A record the ingestion
+    queue drops is forgotten again, so a replay of it is still processed.
+
+    reference_factory defaults to firebase_client.get_reference; pass
+    LocalDatabase().reference (firebase/local_database.py) to drive the
+    supervisor locally.
+    """
+
+    def __init__(
+        self,
+        batcher,
+        max_workers: int = 32,
+        mode: str = "per_device",
+        reference_factory=None,
+        dedup_keys_per_device: int = 4096
+    ):
+        if mode not in LISTENER_MODES:
+            raise ValueError(f"Unknown listener mode '{mode}', expected one of {LISTENER_MODES}")
+
+        self.batcher = batcher
+        self.max_workers = max(1, int(max_workers))
+        self.mode = mode
+        self.reference_factory = reference_factory or get_reference
+        self.router = FleetEventRouter()
+        self.processed_keys = ProcessedKeyCache(dedup_keys_per_device)
+
+        self._registrations = {}
+        self._reporters = []
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        self.batcher.on_drop = self._forget_dropped
+
+    # --------------------------------------------------
+    # LISTENERS
+    # --------------------------------------------------
+
+    def _make_record_handler(self, site_config: dict):
+        device_id = site_config["device_id"]
+
+        def on_record(record_key: str, record: dict):
+            if not self.processed_keys.check_and_mark(device_id, record_key):
+                self.record_duplicate(device_id)
+                return
+
+            self.record_received(device_id)
+            if not self.batcher.submit(site_config, record, record_key):
+                self.processed_keys.discard(device_id, record_key)
+                self.record_dropped(device_id)
+
+        return on_record
+
+    def _forget_dropped(self, event):
+        """
+        Called by the batcher for a queued event evicted by drop_oldest
+        """
+        device_id = event.site_config["device_id"]
+        self.processed_keys.discard(device_id, event.record_key)
+        self.record_dropped(device_id)
+
+    def _make_handler(self, site_config: dict):
+        on_record = self._make_record_handler(site_config)
+
+        def on_event(event):
+            """
+            Firebase Realtime Database event handler
+            """
+
+            # Ignore initial full snapshot
+            if event.path == "/":
+                return
+
+            # Ignore deletes
+            if event.data is None:
+                return
+
+            # Only whole new records; field-level updates have deeper paths
+            record_key = record_key_from_event_path(event.path)
+            if record_key is None or not isinstance(event.data, dict):
+                return
+
+            on_record(record_key, event.data)
+
+        return on_event
+
+    def _open_listener(self, site_config: dict):
+        device_id = site_config["device_id"]
+        ref = self.reference_factory(f"devices/{device_id}")
+        registration = ref.listen(self._make_handler(site_config))
+
+        with self._lock:
+            self._registrations[device_id] = registration
+
+        print(f"Listening to device: {device_id}")
+        return device_id
+
+    def start(self, sites: list):
+        with self._lock:
+            for site in sites:
+                self._stats.setdefault(site["device_id"], DeviceStats())
+
+        if self.mode == "multiplexed":
+            self._start_multiplexed(sites)
+        else:
+            self._start_per_device(sites)
+
+    def _start_multiplexed(self, sites: list):
+        for site in sites:
+            self.router.register(site["device_id"], self._make_record_handler(site))
+
+        registration = start_fleet_listener(
+            self.router, reference_factory=self.reference_factory
+        )
+        with self._lock:
+            self._registrations["devices/"] = registration
+
+        print(f"[SUPERVISOR] 1 multiplexed listener routing {self.router.device_count} devices")
+
+    def _start_per_device(self, sites: list):
+        workers = min(self.max_workers, max(1, len(sites)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="listener") as pool:
+            futures = {pool.submit(self._open_listener, site): site for site in sites}
+
+        for future, site in futures.items():
+            error = future.exception()
+            if error is not None:
+                print(f"[ERROR] Could not listen to {site['device_id']}: {error}")
+
+        print(f"[SUPERVISOR] {len(self._registrations)}/{len(sites)} listeners running")
+
+    def stop(self):
+        self._stop_event.set()
+
+        with self._lock:
+            registrations = list(self._registrations.items())
+            self._registrations.clear()
+
+        for device_id, registration in registrations:
+            try:
+                registration.close()
+            except Exception as e:
+                print(f"[WARN] Closing listener for {device_id} failed: {e}")
+
+        self.batcher.stop()
+
+    def add_reporter(self, reporter):
+        """
+        reporter() is called after every lag report, e.g. to print
+        write-buffer metrics
+        """
+        self._reporters.append(reporter)
+
+    def run_forever(self, report_interval_s: float = 60):
+        """
+        Blocks the main thread, printing a lag report every interval,
+        until Ctrl+C
+        """
+        try:
+            while not self._stop_event.wait(report_interval_s):
+                self.print_lag_report()
+                for reporter in self._reporters:
+                    reporter()
+        except KeyboardInterrupt:
+            print("Stopping listeners...")
+        finally:
+            self.stop()
+
+    # --------------------------------------------------
+    # LAG TRACKING
+    # --------------------------------------------------
+
+    def record_received(self, device_id: str):
+        with self._lock:
+            stats = self._stats.setdefault(device_id, DeviceStats())
+            stats.events_received += 1
+            stats.last_event_at = time.monotonic()
+
+    def record_duplicate(self, device_id: str):
+        with self._lock:
+            stats = self._stats.setdefault(device_id, DeviceStats())
+            stats.duplicates_skipped += 1
+
+    def record_dropped(self, device_id: str):
+        with self._lock:
+            stats = self._stats.setdefault(device_id, DeviceStats())
+            stats.events_dropped += 1
+
+    def record_processed(self, device_id: str, received_at: float):
+        """
+        Records receipt → persisted lag for one prediction
+        """
+        lag = time.monotonic() - received_at
+        with self._lock:
+            stats = self._stats.setdefault(device_id, DeviceStats())
+            stats.predictions_saved += 1
+            stats.last_lag_s = lag
+            stats.max_lag_s = max(stats.max_lag_s, lag)
+
+    def lag_report(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                device_id: {
+                    "events_received": s.events_received,
+                    "duplicates_skipped": s.duplicates_skipped,
+                    "predictions_saved": s.predictions_saved,
+                    "dropped": s.events_dropped,
+                    "pending": s.events_received - s.predictions_saved - s.events_dropped,
+                    "last_lag_s": round(s.last_lag_s, 4),
+                    "max_lag_s": round(s.max_lag_s, 4),
+                    "seconds_since_last_event": (
+                        round(now - s.last_event_at, 1)
+                        if s.last_event_at is not None else None
+                    ),
+                }
+                for device_id, s in self._stats.items()
+            }
+
+    def print_lag_report(self, top: int = 10):
+        report = self.lag_report()
+        if not report:
+            return
+
+        worst = sorted(report.items(), key=lambda kv: -kv[1]["last_lag_s"])[:top]
+        print(f"[LAG] {len(report)} devices, worst {len(worst)}:")
+        if self.mode == "multiplexed":
+            print(f"  router: {self.router.stats()}")
+        for device_id, r in worst:
+            print(
+                f"  {device_id}: last={r['last_lag_s']}s max={r['max_lag_s']}s "
+                f"pending={r['pending']} dropped={r['dropped']} dupes={r['duplicates_skipped']} "
+                f"idle={r['seconds_since_last_event']}s"
+            )
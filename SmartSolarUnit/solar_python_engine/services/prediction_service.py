@@ -1,4 +1,6 @@
-from predictor.energy_predictor import predict_5min_energy
+import numpy as np
+
+from predictor.energy_predictor import predict_5min_energy, predict_5min_energy_batch
 
 
 def calculate_5min_system_energy(
@@ -8,3 +10,20 @@ def calculate_5min_system_energy(
     energy_per_m2 = predict_5min_energy(model_features)
     system_energy = energy_per_m2 * panel_area_m2
     return round(system_energy, 6)
+
+
+def calculate_5min_system_energy_batch(
+    feature_matrix,
+    panel_areas_m2
+) -> list:
+    """
+    Batched counterpart of calculate_5min_system_energy.
+    feature_matrix: one row per reading (FEATURES column order)
+    panel_areas_m2: panel area for each row
+    Returns a list of rounded kWh values, one per row.
+    """
+    energy_per_m2 = predict_5min_energy_batch(feature_matrix)
+    system_energy = energy_per_m2 * np.asarray(panel_areas_m2, dtype=np.float64)
+
+    # Round per value so results are identical to the single-row path
+    return [round(float(e), 6) for e in system_energy]
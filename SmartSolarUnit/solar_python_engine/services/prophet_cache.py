@@ -0,0 +1,245 @@
+"""
+Fitted-model cache for Prophet forecasts.
+
+One entry per series (e.g. "dilshan/site_001"), holding the last fitted
+model, the data it was fitted on and its response:
+
+    same data as the entry         → cached response, no fit
+    entry's data + newer days,     → last response served at once
+    same periods / freq              (marked stale) while a refit runs in
+                                     the background
+    anything else, or no entry     → fitted synchronously
+
+Callers need a real series identity; series sent without one are not
+cached (time_series_service.forecast_prophet fits them directly).
+
+Refits are warm-started from the previous fit's parameters (Prophet's
+`init` / stan_init recipe), so Stan starts next to the old optimum
+instead of from scratch.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import LatencyHistogram
+
+PROPHET_CACHE_SIZE = int(os.getenv("PROPHET_CACHE_SIZE", "256"))
+PROPHET_REFIT_WORKERS = int(os.getenv("PROPHET_REFIT_WORKERS", "1"))
+# Serve the last forecast while refitting (0: always fit in the request)
+PROPHET_ASYNC_REFIT = os.getenv("PROPHET_ASYNC_REFIT", "1") not in ("0", "false", "no")
+
+
+def series_fingerprint(rows: list) -> str:
+    """
+    Hash of a prepared [(date, value), ...] series
+    """
+    return hashlib.sha1(json.dumps(rows, separators=(",", ":")).encode()).hexdigest()
+
+
+def stan_init(model) -> dict:
+    """
+    Fitted parameters of a Prophet model in the form fit(init=...) takes
+    """
+    res = {}
+    for pname in ["k", "m", "sigma_obs"]:
+        res[pname] = float(model.params[pname][0][0])
+    for pname in ["delta", "beta"]:
+        res[pname] = model.params[pname][0]
+    return res
+
+
+class CacheEntry:
+    __slots__ = ("series_id", "data_hash", "n_rows", "last_date", "model", "result", "fitted_at", "fit_seconds")
+
+    def __init__(self, series_id, data_hash, n_rows, last_date, model, result, fit_seconds):
+        self.series_id = series_id
+        self.data_hash = data_hash
+        self.n_rows = n_rows
+        self.last_date = last_date
+        self.model = model
+        self.result = result
+        self.fitted_at = time.time()
+        self.fit_seconds = fit_seconds
+
+
+class ProphetModelCache:
+    def __init__(self, maxsize: int = PROPHET_CACHE_SIZE, refit_workers: int = PROPHET_REFIT_WORKERS,
+                 async_refit: bool = PROPHET_ASYNC_REFIT):
+        self.maxsize = max(1, int(maxsize))
+        self.async_refit = async_refit
+        self._entries = OrderedDict()
+        self._refitting = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, refit_workers), thread_name_prefix="prophet-refit")
+
+        self.fit_latency = LatencyHistogram(max_s=600.0)
+        self.hits = 0
+        self.stale_served = 0
+        self.misses = 0
+        self.cold_fits = 0
+        self.warm_fits = 0
+        self.warm_start_failures = 0
+        self.refit_errors = 0
+
+    # --------------------------------------------------
+    # LOOKUP
+    # --------------------------------------------------
+
+    def get_or_fit(self, series_id: str, rows: list, periods: int, freq: str, fit, respond) -> dict:
+        """
+        rows: prepared [(date, value), ...], oldest first
+        fit(rows, init) → fitted model; init is None for a cold fit
+        respond(model, rows, periods, freq) → response dict
+        """
+        data_hash = series_fingerprint(rows)
+        last_date = rows[-1][0]
+
+        with self._lock:
+            entry = self._entries.get(series_id)
+            if entry is not None:
+                self._entries.move_to_end(series_id)
+
+        if entry is not None and entry.data_hash == data_hash:
+            with self._lock:
+                self.hits += 1
+            result = entry.result
+            if result.get("periods") != periods or result.get("freq", "D") != freq:
+                # Same fit, other horizon: predict only
+                result = respond(entry.model, rows, periods, freq)
+            return self._tag(result, "hit", entry)
+
+        if entry is not None and self.async_refit and self._extends(entry, rows, periods, freq):
+            self._schedule_refit(series_id, rows, periods, freq, fit, respond, entry)
+            with self._lock:
+                self.stale_served += 1
+            tagged = self._tag(entry.result, "stale", entry)
+            tagged["stale_last_date"] = entry.last_date
+            tagged["requested_last_date"] = last_date
+            return tagged
+
+        with self._lock:
+            self.misses += 1
+        entry = self._fit_entry(series_id, rows, data_hash, periods, freq, fit, respond, entry)
+        return self._tag(entry.result, "miss", entry)
+
+    @staticmethod
+    def _extends(entry: CacheEntry, rows: list, periods: int, freq: str) -> bool:
+        """
+        True when rows are the entry's rows plus later days and the request
+        asks for the same horizon, so the cached response is only out of date
+        """
+        result = entry.result
+        return (
+            result.get("periods") == periods
+            and result.get("freq", "D") == freq
+            and len(rows) > entry.n_rows
+            and rows[-1][0] > entry.last_date
+            and series_fingerprint(rows[:entry.n_rows]) == entry.data_hash
+        )
+
+    @staticmethod
+    def _tag(result: dict, status: str, entry: CacheEntry) -> dict:
+        tagged = dict(result)
+        tagged["cache"] = status
+        tagged["fit_seconds"] = round(entry.fit_seconds, 3)
+        return tagged
+
+    # --------------------------------------------------
+    # FITTING
+    # --------------------------------------------------
+
+    def _fit_entry(self, series_id, rows, data_hash, periods, freq, fit, respond, previous) -> CacheEntry:
+        init = None
+        if previous is not None and previous.model is not None:
+            try:
+                init = stan_init(previous.model)
+            except Exception:
+                init = None
+
+        start = time.perf_counter()
+        model = None
+        if init is not None:
+            try:
+                model = fit(rows, init)
+                with self._lock:
+                    self.warm_fits += 1
+            except Exception as e:
+                # e.g. a different number of changepoints after the history grew
+                print(f"[WARN] Prophet warm start failed for {series_id}, fitting cold: {e}")
+                with self._lock:
+                    self.warm_start_failures += 1
+        if model is None:
+            model = fit(rows, None)
+            with self._lock:
+                self.cold_fits += 1
+        fit_seconds = time.perf_counter() - start
+        self.fit_latency.record(fit_seconds)
+
+        result = respond(model, rows, periods, freq)
+        entry = CacheEntry(series_id, data_hash, len(rows), rows[-1][0], model, result, fit_seconds)
+        if not result.get("error"):
+            self._store(entry)
+        return entry
+
+    def _store(self, entry: CacheEntry):
+        with self._lock:
+            self._entries[entry.series_id] = entry
+            self._entries.move_to_end(entry.series_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _schedule_refit(self, series_id, rows, periods, freq, fit, respond, previous):
+        with self._lock:
+            if series_id in self._refitting:
+                return
+            self._refitting.add(series_id)
+
+        def run():
+            try:
+                self._fit_entry(series_id, rows, series_fingerprint(rows), periods, freq, fit, respond, previous)
+            except Exception as e:
+                with self._lock:
+                    self.refit_errors += 1
+                print(f"[ERROR] Prophet refit failed for {series_id}: {e}")
+            finally:
+                with self._lock:
+                    self._refitting.discard(series_id)
+
+        self._pool.submit(run)
+
+    # --------------------------------------------------
+    # METRICS
+    # --------------------------------------------------
+
+    def invalidate(self, series_id: str = None):
+        with self._lock:
+            if series_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(series_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_served + self.misses
+            return {
+                "series": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "stale_served": self.stale_served,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "refits_running": len(self._refitting),
+                "cold_fits": self.cold_fits,
+                "warm_fits": self.warm_fits,
+                "warm_start_failures": self.warm_start_failures,
+                "refit_errors": self.refit_errors,
+                "fit_latency": self.fit_latency.summary(),
+            }
+
+
+prophet_cache = ProphetModelCache()
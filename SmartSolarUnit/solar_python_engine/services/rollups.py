@@ -0,0 +1,305 @@
+"""
+Incremental daily / monthly energy rollups, maintained at ingest time.
+
+Every prediction updates the running rollup of its site's day and month:
+total kWh plus count / mean / std / min / max of each feature, using
+Welford's streaming algorithm. Rollups are written to
+
+    rollups/{customer}/{site_id}/{YYYY-MM-DD}
+    rollups_monthly/{customer}/{site_id}/{YYYY-MM}
+
+through the prediction write buffer, which coalesces repeated updates of
+the same node into one multi-path write per flush. Consumers (Prophet /
+SARIMA daily series, /aggregate-data) read one small node per day instead
+of re-scanning every 5-minute record.
+"""
+
+import bisect
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from utils.sensor_mapper import FEATURE_COLUMNS
+from utils.time_utils import parse_record_key
+
+
+class RunningStats:
+    """
+    Welford running mean / variance with min and max
+    """
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, min=None, max=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    def update(self, value: float):
+        if value is None or value != value:  # skip None / NaN
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.mean, 6),
+            "std": round(self.std, 6),
+            "min": self.min,
+            "max": self.max,
+            # Kept so the rollup can be resumed after a restart
+            "m2": self.m2,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningStats":
+        data = data or {}
+        return cls(
+            count=int(data.get("count", 0)),
+            mean=float(data.get("mean", 0.0)),
+            m2=float(data.get("m2", 0.0)),
+            min=data.get("min"),
+            max=data.get("max"),
+        )
+
+
+class PeriodRollup:
+    __slots__ = ("period", "count", "total_kwh", "energy", "features", "first_key", "last_key")
+
+    def __init__(self, period: str):
+        self.period = period
+        self.count = 0
+        self.total_kwh = 0.0
+        self.energy = RunningStats()
+        self.features = {name: RunningStats() for name in FEATURE_COLUMNS}
+        self.first_key = None
+        self.last_key = None
+
+    def update(self, record_key: str, features, kwh: float):
+        self.count += 1
+        self.total_kwh += kwh
+        self.energy.update(kwh)
+        for name, value in zip(FEATURE_COLUMNS, features):
+            self.features[name].update(value)
+        if self.first_key is None or record_key < self.first_key:
+            self.first_key = record_key
+        if self.last_key is None or record_key > self.last_key:
+            self.last_key = record_key
+
+    def to_dict(self) -> dict:
+        return {
+            "period": self.period,
+            "count": self.count,
+            "total_kwh": round(self.total_kwh, 6),
+            "energy_5min": self.energy.to_dict(),
+            "features": {name: s.to_dict() for name, s in self.features.items()},
+            "first_key": self.first_key,
+            "last_key": self.last_key,
+            "updated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+
+    @classmethod
+    def from_dict(cls, period: str, data: dict) -> "PeriodRollup":
+        rollup = cls(period)
+        rollup.count = int(data.get("count", 0))
+        rollup.total_kwh = float(data.get("total_kwh", 0.0))
+        rollup.energy = RunningStats.from_dict(data.get("energy_5min"))
+        stored = data.get("features") or {}
+        for name in FEATURE_COLUMNS:
+            rollup.features[name] = RunningStats.from_dict(stored.get(name))
+        rollup.first_key = data.get("first_key")
+        rollup.last_key = data.get("last_key")
+        return rollup
+
+
+class RollupAggregator:
+    """
+    sink: write_buffer-like object with add_path(path, payload, timed=False)
+    and pending_payload(path)
+    loader(path) → stored dict or None, to resume a rollup that was started
+    before a restart. A period whose read fails is skipped for that record
+    and read again on the next one, so an empty rollup never overwrites
+    stored data.
+    recent_loader(scope_path, n) → {period: stored dict} for the newest n
+    periods of one site, used by preload().
+
+    Stored rollups are read outside the lock and only for periods that may
+    exist in the database: once a site's newest stored period is known, a
+    later period (e.g. the next day at midnight) starts empty without a
+    read. Call preload() at startup to fetch every site's recent rollups
+    in bulk instead of one read per site on its first prediction.
+
+    A late record for a period that was already evicted resumes from the
+    sink's still-unwritten payload when there is one, so consecutive late
+    updates build on each other instead of on the last flushed value.
+    """
+
+    # Periods kept in memory per site (current + one late-arriving)
+    KEEP_PERIODS = 2
+
+    def __init__(self, sink, loader=None, recent_loader=None):
+        self.sink = sink
+        self.loader = loader
+        self.recent_loader = recent_loader
+        self._rollups = {}
+        # scope → sorted periods held in _rollups
+        self._periods = {}
+        # scope → newest period whose stored state is reflected in memory
+        # ("" once loaded and nothing is stored)
+        self._known = {}
+        self._lock = threading.Lock()
+
+        self.updates = 0
+        self.loads = 0
+        self.load_errors = 0
+
+    @staticmethod
+    def daily_path(customer: str, site_id: str, day: str) -> str:
+        return f"rollups/{customer}/{site_id}/{day}"
+
+    @staticmethod
+    def monthly_path(customer: str, site_id: str, month: str) -> str:
+        return f"rollups_monthly/{customer}/{site_id}/{month}"
+
+    @staticmethod
+    def _scopes(customer: str, site_id: str) -> tuple:
+        return ("rollups", customer, site_id), ("rollups_monthly", customer, site_id)
+
+    # --------------------------------------------------
+    # LOADING
+    # --------------------------------------------------
+
+    def preload(self, sites: list, max_workers: int = 16):
+        """
+        Reads the newest KEEP_PERIODS stored rollups of every site, in
+        parallel, before the listeners start
+        """
+        if self.recent_loader is None:
+            return
+
+        scopes = [
+            scope
+            for site in sites
+            for scope in self._scopes(site["customer"], site["site_id"])
+        ]
+
+        def load(scope):
+            path = "/".join(scope)
+            try:
+                return scope, self.recent_loader(path, self.KEEP_PERIODS) or {}
+            except Exception as e:
+                print(f"[WARN] Could not preload rollups {path}: {e}")
+                return scope, None
+
+        workers = min(max(1, int(max_workers)), max(1, len(scopes)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rollup-load") as pool:
+            results = list(pool.map(load, scopes))
+
+        with self._lock:
+            for scope, stored in results:
+                if stored is None:
+                    continue
+                for period, data in stored.items():
+                    self._get(scope, period, data)
+                self._known.setdefault(scope, "")
+                self.loads += 1
+
+        print(f"[ROLLUPS] Preloaded {len(self._rollups)} rollups for {len(sites)} sites")
+
+    def _needs_load(self, scope: tuple, period: str) -> bool:
+        if self.loader is None or period in self._periods.get(scope, ()):
+            return False
+        known = self._known.get(scope)
+        return known is None or period <= known
+
+    def _load(self, path: str):
+        """
+        (ok, stored dict or None); the buffered payload wins over the
+        database, which may not have it yet
+        """
+        pending = self.sink.pending_payload(path)
+        if pending is not None:
+            return True, pending
+        try:
+            return True, self.loader(path)
+        except Exception as e:
+            print(f"[WARN] Could not load rollup {path}, skipping it for this record: {e}")
+            return False, None
+
+    # --------------------------------------------------
+    # IN-MEMORY ROLLUPS
+    # --------------------------------------------------
+
+    def _get(self, scope: tuple, period: str, stored: dict = None) -> PeriodRollup:
+        path = "/".join(scope) + "/" + period
+        rollup = self._rollups.get(path)
+        if rollup is not None:
+            return rollup
+
+        rollup = PeriodRollup.from_dict(period, stored) if stored else PeriodRollup(period)
+        self._rollups[path] = rollup
+        if period > self._known.get(scope, ""):
+            self._known[scope] = period
+
+        periods = self._periods.setdefault(scope, [])
+        bisect.insort(periods, period)
+        self._evict(scope, periods)
+        return rollup
+
+    def _evict(self, scope: tuple, periods: list):
+        """
+        Keeps only the newest KEEP_PERIODS periods of one site / granularity
+        """
+        prefix = "/".join(scope) + "/"
+        while len(periods) > self.KEEP_PERIODS:
+            del self._rollups[prefix + periods.pop(0)]
+
+    def update(self, customer: str, site_id: str, record_key: str, features, kwh: float):
+        """
+        O(1) per prediction: updates the day and month rollups of the record
+        """
+        dt = parse_record_key(record_key)
+        if dt is None:
+            return
+
+        daily_scope, monthly_scope = self._scopes(customer, site_id)
+        periods = ((daily_scope, dt.strftime("%Y-%m-%d")), (monthly_scope, dt.strftime("%Y-%m")))
+
+        with self._lock:
+            missing = [(scope, period) for scope, period in periods if self._needs_load(scope, period)]
+
+        # Database reads happen outside the lock
+        stored, failed = {}, set()
+        for scope, period in missing:
+            ok, stored[(scope, period)] = self._load("/".join(scope) + "/" + period)
+            if not ok:
+                failed.add((scope, period))
+
+        payloads = []
+        with self._lock:
+            self.loads += len(missing) - len(failed)
+            self.load_errors += len(failed)
+            for scope, period in periods:
+                if (scope, period) in failed:
+                    # Left unloaded, so the next record retries the read
+                    continue
+                rollup = self._get(scope, period, stored.get((scope, period)))
+                rollup.update(record_key, features, kwh)
+                payloads.append(("/".join(scope) + "/" + period, rollup.to_dict()))
+            self.updates += 1
+
+        # The write buffer keeps only the latest payload per path; rollup
+        # writes are not predictions, so they are not stage-timed
+        for path, payload in payloads:
+            self.sink.add_path(path, payload, timed=False)
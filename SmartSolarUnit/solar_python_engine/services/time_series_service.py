@@ -5,16 +5,179 @@ Produces forecast, trend, and seasonality components.
 
 from typing import List, Dict, Any, Optional
 
+# "rows": forecast / history as lists of {"date", ...} dicts (original format)
+# "columns": parallel arrays {"dates": [...], "yhat": [...], ...}
+OUTPUT_FORMATS = ("rows", "columns")
+
+FORECAST_COLUMNS = ("yhat", "yhat_lower", "yhat_upper", "trend")
+
+
+def _round_list(values, digits: int = 4) -> list:
+    """
+    Python-rounded floats of an array (same values as round(float(v), digits))
+    """
+    import numpy as np
+    return [round(v, digits) for v in np.asarray(values, dtype=np.float64).tolist()]
+
+
+def _date_list(dates) -> list:
+    import pandas as pd
+    return pd.DatetimeIndex(dates).strftime("%Y-%m-%d").tolist()
+
+
+def _columns_to_rows(columns: Dict[str, list], value_keys) -> List[Dict[str, Any]]:
+    keys = [k for k in value_keys if k in columns]
+    names = ("date", *keys)
+    return [dict(zip(names, values)) for values in zip(columns["dates"], *(columns[k] for k in keys))]
+
+
+def shape_output(result: Dict[str, Any], output: str = "rows") -> Dict[str, Any]:
+    """
+    Converts a columnar result to the requested output format
+    """
+    if result.get("error") or output == "columns":
+        if not result.get("error"):
+            result = dict(result, format="columns")
+        return result
+    if output != "rows":
+        raise ValueError(f"Unknown output format '{output}', expected one of {OUTPUT_FORMATS}")
+
+    shaped = dict(result)
+    shaped["forecast"] = _columns_to_rows(result["forecast"], FORECAST_COLUMNS)
+    if isinstance(result.get("history"), dict):
+        history = result["history"]
+        shaped["history"] = [{"date": d, "value": v} for d, v in zip(history["dates"], history["values"])]
+    return shaped
+
+
+def encode_result(result: Dict[str, Any], encoding: str) -> Optional[tuple]:
+    """
+    (body bytes, mimetype) for encoding "orjson" or "arrow"; None when the
+    encoder is not installed or the encoding is plain JSON.
+    Arrow IPC holds the forecast columns as a table, the other fields
+    as JSON in the schema metadata; it needs output="columns".
+    """
+    if encoding == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            return None
+        return orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY), "application/json"
+
+    if encoding == "arrow":
+        forecast = result.get("forecast")
+        if result.get("error") or not isinstance(forecast, dict):
+            return None
+        try:
+            import json
+            import pyarrow as pa
+        except ImportError:
+            return None
+        table = pa.table(forecast)
+        meta = {k: v for k, v in result.items() if k != "forecast"}
+        table = table.replace_schema_metadata({"result": json.dumps(meta, default=str)})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.stream"
+
+    return None
+
+
+def _prophet_rows(daily_data: List[Dict[str, Any]]) -> List[list]:
+    """
+    [[YYYY-MM-DD, value], ...] sorted by date, without missing values
+    """
+    import pandas as pd
+
+    rows = []
+    for row in daily_data:
+        ds = row.get("date") or row.get("ds")
+        y = row.get("value") if "value" in row else row.get("totalKwh", 0)
+        if ds is None:
+            continue
+        rows.append({"ds": str(ds), "y": float(y)})
+    df = pd.DataFrame(rows)
+    df = df.dropna(subset=["y"])
+    df["ds"] = pd.to_datetime(df["ds"])
+    df = df.sort_values("ds").reset_index(drop=True)
+    return [[d, float(y)] for d, y in zip(df["ds"].dt.strftime("%Y-%m-%d"), df["y"])]
+
+
+def _prophet_frame(rows: List[list]):
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=["ds", "y"])
+    df["ds"] = pd.to_datetime(df["ds"])
+    return df
+
+
+def _fit_prophet(rows: List[list], init: Optional[dict] = None):
+    """
+    Fits Prophet; init (stan_init of an earlier fit) warm-starts Stan
+    """
+    from prophet import Prophet
+
+    m = Prophet(
+        yearly_seasonality=True,
+        weekly_seasonality=True,
+        daily_seasonality=False,
+        interval_width=0.9,
+    )
+    if init is not None:
+        m.fit(_prophet_frame(rows), init=init)
+    else:
+        m.fit(_prophet_frame(rows))
+    return m
+
+
+def _prophet_response(m, rows: List[list], periods: int, freq: str) -> Dict[str, Any]:
+    """
+    Columnar forecast; shape_output() turns it into the row format
+    """
+    df = _prophet_frame(rows)
+    future = m.make_future_dataframe(periods=periods, freq=freq)
+    future = future[future["ds"] > df["ds"].max()]
+    forecast_df = m.predict(future)
+
+    yhat = forecast_df["yhat"]
+    forecast = {
+        "dates": _date_list(forecast_df["ds"]),
+        "yhat": _round_list(yhat),
+        "yhat_lower": _round_list(forecast_df.get("yhat_lower", yhat)),
+        "yhat_upper": _round_list(forecast_df.get("yhat_upper", yhat)),
+        "trend": _round_list(forecast_df.get("trend", yhat)),
+    }
+    history = {
+        "dates": [d for d, _ in rows],
+        "values": [y for _, y in rows],
+    }
+
+    return {
+        "error": False,
+        "forecast": forecast,
+        "history": history,
+        "model": "prophet",
+        "periods": periods,
+        "freq": freq,
+    }
+
 
 def forecast_prophet(
     daily_data: List[Dict[str, Any]],
     periods: int = 30,
     freq: str = "D",
+    series_id: Optional[str] = None,
+    use_cache: bool = True,
+    output: str = "rows",
 ) -> Dict[str, Any]:
     """
     Run Prophet on daily (date, value) series.
     daily_data: [ {"date": "YYYY-MM-DD", "value": float or "totalKwh": float}, ... ]
     periods: number of days to forecast
+    series_id: identity of the series (e.g. "customer/site_id") for the
+    fitted-model cache; without one the series is fitted uncached
+    output: "rows" (list of dicts) or "columns" (parallel arrays)
     Returns: forecast array, trend, weekly/yearly seasonality if available.
     """
     if not daily_data or len(daily_data) < 7:
@@ -36,49 +199,22 @@ def forecast_prophet(
         }
 
     try:
-        rows = []
-        for row in daily_data:
-            ds = row.get("date") or row.get("ds")
-            y = row.get("value") if "value" in row else row.get("totalKwh", 0)
-            if ds is None:
-                continue
-            rows.append({"ds": str(ds), "y": float(y)})
-        df = pd.DataFrame(rows)
-        df = df.dropna(subset=["y"])
-        df["ds"] = pd.to_datetime(df["ds"])
-        df = df.sort_values("ds").reset_index(drop=True)
-
-        m = Prophet(
-            yearly_seasonality=True,
-            weekly_seasonality=True,
-            daily_seasonality=False,
-            interval_width=0.9,
-        )
-        m.fit(df)
-
-        future = m.make_future_dataframe(periods=periods, freq=freq)
-        future = future[future["ds"] > df["ds"].max()]
-        forecast_df = m.predict(future)
+        rows = _prophet_rows(daily_data)
 
-        forecast_out = []
-        for _, r in forecast_df.iterrows():
-            forecast_out.append({
-                "date": r["ds"].strftime("%Y-%m-%d"),
-                "yhat": round(float(r["yhat"]), 4),
-                "yhat_lower": round(float(r.get("yhat_lower", r["yhat"])), 4),
-                "yhat_upper": round(float(r.get("yhat_upper", r["yhat"])), 4),
-                "trend": round(float(r.get("trend", r["yhat"])), 4),
-            })
+        if not use_cache or not series_id:
+            return shape_output(_prophet_response(_fit_prophet(rows), rows, periods, freq), output)
 
-        history_out = [{"date": r["ds"].strftime("%Y-%m-%d"), "value": float(r["y"])} for _, r in df.iterrows()]
+        from services.prophet_cache import prophet_cache
 
-        return {
-            "error": False,
-            "forecast": forecast_out,
-            "history": history_out,
-            "model": "prophet",
-            "periods": periods,
-        }
+        result = prophet_cache.get_or_fit(
+            series_id,
+            rows,
+            periods,
+            freq,
+            fit=_fit_prophet,
+            respond=_prophet_response,
+        )
+        return shape_output(result, output)
     except Exception as e:
         return {
             "error": True,
@@ -88,13 +224,42 @@ def forecast_prophet(
         }
 
 
+def _daily_series(daily_data: List[Dict[str, Any]]):
+    """
+    Daily pandas Series (gaps forward-filled), as SARIMA and the
+    seasonal-naive baseline use it
+    """
+    import pandas as pd
+
+    rows = []
+    for row in daily_data:
+        ds = row.get("date") or row.get("ds")
+        y = row.get("value") if "value" in row else row.get("totalKwh", 0)
+        if ds is None:
+            continue
+        rows.append({"ds": str(ds), "y": float(y)})
+    df = pd.DataFrame(rows)
+    df["ds"] = pd.to_datetime(df["ds"])
+    df = df.sort_values("ds").set_index("ds")
+    return df.asfreq("D").ffill().fillna(0)["y"]
+
+
+SARIMA_ORDER = (1, 0, 1)
+SARIMA_SEASONAL_ORDER = (1, 0, 1, 7)
+
+
 def forecast_sarima(
     daily_data: List[Dict[str, Any]],
     periods: int = 30,
+    output: str = "rows",
+    order: tuple = SARIMA_ORDER,
+    seasonal_order: tuple = SARIMA_SEASONAL_ORDER,
 ) -> Dict[str, Any]:
     """
     Optional SARIMA fallback if Prophet fails or not installed.
     daily_data: same as Prophet.
+    output: "rows" (list of dicts) or "columns" (parallel arrays)
+    order / seasonal_order: SARIMAX orders (default (1,0,1)(1,0,1,7))
     """
     if not daily_data or len(daily_data) < 14:
         return {
@@ -112,40 +277,110 @@ def forecast_sarima(
             "forecast": [],
         }
     try:
-        rows = []
-        for row in daily_data:
-            ds = row.get("date") or row.get("ds")
-            y = row.get("value") if "value" in row else row.get("totalKwh", 0)
-            if ds is None:
-                continue
-            rows.append({"ds": str(ds), "y": float(y)})
-        df = pd.DataFrame(rows)
-        df["ds"] = pd.to_datetime(df["ds"])
-        df = df.sort_values("ds").set_index("ds")
-        df = df.asfreq("D").ffill().fillna(0)
-
-        model = SARIMAX(df["y"], order=(1, 0, 1), seasonal_order=(1, 0, 1, 7))
+        model = SARIMAX(_daily_series(daily_data), order=tuple(order), seasonal_order=tuple(seasonal_order))
         fit = model.fit(disp=False)
         f = fit.get_forecast(steps=periods)
         forecast_df = f.summary_frame()
 
-        forecast_out = []
-        for i, (ts, r) in enumerate(forecast_df.iterrows()):
-            forecast_out.append({
-                "date": ts.strftime("%Y-%m-%d"),
-                "yhat": round(float(r["mean"]), 4),
-                "yhat_lower": round(float(r.get("mean_ci_lower", r["mean"])), 4),
-                "yhat_upper": round(float(r.get("mean_ci_upper", r["mean"])), 4),
-            })
-        return {
+        mean = forecast_df["mean"]
+        forecast = {
+            "dates": _date_list(forecast_df.index),
+            "yhat": _round_list(mean),
+            "yhat_lower": _round_list(forecast_df.get("mean_ci_lower", mean)),
+            "yhat_upper": _round_list(forecast_df.get("mean_ci_upper", mean)),
+        }
+        return shape_output({
             "error": False,
-            "forecast": forecast_out,
+            "forecast": forecast,
             "model": "sarima",
+            "order": list(order),
+            "seasonal_order": list(seasonal_order),
             "periods": periods,
+        }, output)
+    except Exception as e:
+        return {
+            "error": True,
+            "message": str(e),
+            "forecast": [],
+        }
+
+
+def forecast_seasonal_naive(
+    daily_data: List[Dict[str, Any]],
+    periods: int = 30,
+    output: str = "rows",
+    season: int = 7,
+) -> Dict[str, Any]:
+    """
+    Baseline: each day repeats the same weekday of the last week.
+    Interval: ±1.645 x the std of season-over-season differences,
+    widened with the number of seasons ahead (90%, as Prophet's).
+    """
+    if not daily_data or len(daily_data) < 2 * season:
+        return {
+            "error": True,
+            "message": f"Need at least {2 * season} days for the seasonal naive baseline.",
+            "forecast": [],
+        }
+    try:
+        import numpy as np
+        import pandas as pd
+
+        series = _daily_series(daily_data)
+        values = series.to_numpy(dtype=np.float64)
+
+        steps = np.arange(periods)
+        yhat = values[-season:][steps % season]
+        residuals = values[season:] - values[:-season]
+        sigma = float(residuals.std(ddof=1)) if residuals.size > 1 else 0.0
+        spread = 1.645 * sigma * np.sqrt(steps // season + 1)
+
+        dates = pd.date_range(series.index[-1] + pd.Timedelta(days=1), periods=periods, freq="D")
+        forecast = {
+            "dates": _date_list(dates),
+            "yhat": _round_list(yhat),
+            "yhat_lower": _round_list(yhat - spread),
+            "yhat_upper": _round_list(yhat + spread),
         }
+        return shape_output({
+            "error": False,
+            "forecast": forecast,
+            "model": "seasonal_naive",
+            "periods": periods,
+        }, output)
     except Exception as e:
         return {
             "error": True,
             "message": str(e),
             "forecast": [],
         }
+
+
+FORECAST_MODELS = ("prophet", "sarima", "seasonal_naive")
+
+
+def forecast_model(
+    model: str,
+    daily_data: List[Dict[str, Any]],
+    periods: int = 30,
+    output: str = "rows",
+    params: Optional[Dict[str, Any]] = None,
+    series_id: Optional[str] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Runs one of FORECAST_MODELS; params are its extra keyword arguments
+    (e.g. {"order": [1, 1, 1], "seasonal_order": [0, 1, 1, 7]} for SARIMA)
+    """
+    params = params or {}
+    if model == "sarima":
+        return forecast_sarima(daily_data, periods=periods, output=output, **params)
+    if model == "seasonal_naive":
+        return forecast_seasonal_naive(daily_data, periods=periods, output=output, **params)
+    if model == "prophet":
+        return forecast_prophet(daily_data, periods=periods, series_id=series_id, use_cache=use_cache, output=output)
+    return {
+        "error": True,
+        "message": f"Unknown model '{model}', expected one of {list(FORECAST_MODELS)}",
+        "forecast": [],
+    }
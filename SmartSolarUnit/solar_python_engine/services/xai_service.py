@@ -1,7 +1,17 @@
 """
 XAI Service - SHAP and LIME explanations for solar energy predictions.
+
+The model and its SHAP explainer are loaded once per process and reused
+until the model file changes (mtime + content hash). Explanations are
+kept in an LRU cache keyed on the model fingerprint and the rounded
+feature vector, so reopening the same 5-minute record is a dict lookup.
 """
 
+import copy
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
 import numpy as np
 
@@ -13,27 +23,210 @@ FEATURES_ORDER = [
     "dust_level",
 ]
 
+MODEL_PATH = Path(__file__).resolve().parent.parent / "model" / "solar_power_model.pkl"
+
+# Explanations cached per process, and the decimals feature values are
+# rounded to before lookup
+RESULT_CACHE_SIZE = int(os.getenv("XAI_RESULT_CACHE_SIZE", "4096"))
+RESULT_CACHE_DECIMALS = int(os.getenv("XAI_RESULT_CACHE_DECIMALS", "4"))
+
+# Upper bound on rows explained by one batch request
+BATCH_MAX_ROWS = int(os.getenv("XAI_BATCH_MAX_ROWS", "5000"))
+
+# Recompute the global importance artifact in the background when it is
+# missing or was computed for another model
+IMPORTANCE_AUTO_REFRESH = os.getenv("XAI_IMPORTANCE_AUTO_REFRESH", "1") not in ("0", "false", "no")
+
+
+# --------------------------------------------------
+# MODEL / EXPLAINER CACHE
+# --------------------------------------------------
+
+class ResultCache:
+    """
+    Thread-safe LRU of explanation results with hit / miss counters
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, int(maxsize))
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._items[key])
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._items[key] = copy.deepcopy(value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_model_lock = threading.RLock()
+_model_state = {"stat": None, "model": None, "fingerprint": None, "sha256": None, "loads": 0}
+_explainers = {}
+_explainer_stats = {"hits": 0, "misses": 0}
+_shap_results = ResultCache(RESULT_CACHE_SIZE)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_model_entry():
+    """
+    (model, fingerprint). The file is only re-read when its mtime or
+    size changed; a new model drops the cached explainers and results.
+    """
+    try:
+        st = MODEL_PATH.stat()
+    except OSError:
+        return None, None
+
+    stat_key = (st.st_mtime_ns, st.st_size)
+    with _model_lock:
+        if _model_state["stat"] != stat_key:
+            import joblib
+            model = joblib.load(MODEL_PATH)
+            sha256 = _file_sha256(MODEL_PATH)
+            fingerprint = f"{st.st_mtime_ns}-{sha256[:16]}"
+            if fingerprint != _model_state["fingerprint"]:
+                _explainers.clear()
+                _shap_results.clear()
+            _model_state.update(stat=stat_key, model=model, fingerprint=fingerprint, sha256=sha256)
+            _model_state["loads"] += 1
+        return _model_state["model"], _model_state["fingerprint"]
+
+
+def load_model():
+    """
+    (model, fingerprint) of the current model file; (None, None) without one
+    """
+    return _load_model_entry()
+
+
+def model_sha256():
+    """
+    Content hash of the current model file (None if there is no model)
+    """
+    if _load_model_entry()[0] is None:
+        return None
+    return _model_state["sha256"]
+
 
 def _load_model():
     try:
-        import joblib
-        model_path = Path(__file__).resolve().parent.parent / "model" / "solar_power_model.pkl"
-        if not model_path.exists():
-            return None
-        return joblib.load(model_path)
+        return _load_model_entry()[0]
+    except Exception:
+        return None
+
+
+def _get_explainer(fingerprint: str, kind: str, factory):
+    """
+    One explainer per model fingerprint and kind, built on first use
+    """
+    key = (fingerprint, kind)
+    with _model_lock:
+        explainer = _explainers.get(key)
+        if explainer is None:
+            _explainer_stats["misses"] += 1
+            explainer = _explainers[key] = factory()
+        else:
+            _explainer_stats["hits"] += 1
+        return explainer
+
+
+def is_tree_model(model) -> bool:
+    return hasattr(model, "predict_proba") or "Tree" in type(model).__name__ or "XGB" in type(model).__name__
+
+
+def explainer_kind():
+    """
+    "tree" when SHAP can use TreeExplainer (cheap), "kernel" when it falls
+    back to KernelExplainer (expensive), None without a model
+    """
+    try:
+        model, _ = _load_model_entry()
     except Exception:
         return None
+    if model is None:
+        return None
+    return "tree" if is_tree_model(model) else "kernel"
+
+
+def _quantize(features: dict):
+    """
+    Cache key of a feature dict; None if a value is not numeric
+    """
+    try:
+        return tuple(round(float(features.get(k, 0)), RESULT_CACHE_DECIMALS) for k in FEATURES_ORDER)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_cache_stats() -> dict:
+    with _model_lock:
+        explainer_lookups = _explainer_stats["hits"] + _explainer_stats["misses"]
+        return {
+            "model_fingerprint": _model_state["fingerprint"],
+            "model_loads": _model_state["loads"],
+            "explainers": {
+                "size": len(_explainers),
+                "hits": _explainer_stats["hits"],
+                "misses": _explainer_stats["misses"],
+                "hit_ratio": round(_explainer_stats["hits"] / explainer_lookups, 4) if explainer_lookups else 0.0,
+            },
+            "shap_results": _shap_results.stats(),
+        }
 
 
 def get_shap_explanation(features: dict) -> dict:
     """Compute SHAP values for a single prediction."""
-    model = _load_model()
+    try:
+        model, fingerprint = _load_model_entry()
+    except Exception:
+        model, fingerprint = None, None
     if model is None:
         return {
             "error": True,
             "message": "Model not found. Place solar_power_model.pkl in model/ directory.",
         }
 
+    cache_key = _quantize(features)
+    if cache_key is not None:
+        cached = _shap_results.get((fingerprint, cache_key))
+        if cached is not None:
+            return cached
+
     try:
         import pandas as pd
         X = pd.DataFrame([{k: features.get(k, 0) for k in FEATURES_ORDER}])
@@ -43,9 +236,9 @@ def get_shap_explanation(features: dict) -> dict:
 
         try:
             import shap
-            if hasattr(model, "predict_proba") or "Tree" in type(model).__name__ or "XGB" in type(model).__name__:
+            if is_tree_model(model):
                 try:
-                    explainer = shap.TreeExplainer(model)
+                    explainer = _get_explainer(fingerprint, "tree", lambda: shap.TreeExplainer(model))
                     sv = explainer.shap_values(X)
                     if isinstance(sv, list):
                         sv = sv[0]
@@ -70,12 +263,15 @@ def get_shap_explanation(features: dict) -> dict:
                 shap_dict[name] = round(vals[i], 6) if i < len(vals) else 0.0
 
         text = _build_shap_text(shap_dict, prediction)
-        return {
+        result = {
             "prediction": round(prediction, 6),
             "shap_values": shap_dict,
             "base_value": base_value,
             "explanation_text": text,
         }
+        if cache_key is not None:
+            _shap_results.put((fingerprint, cache_key), result)
+        return result
     except Exception as e:
         return {"error": True, "message": str(e)}
 
@@ -91,20 +287,216 @@ def _build_shap_text(shap_dict: dict, prediction: float) -> str:
     return " ".join(parts)
 
 
-def get_lime_explanation(features: dict) -> dict:
-    """LIME explanation; fallback to simple prediction + feature list if LIME fails."""
+def _feature_row(row) -> list:
+    """
+    One row in FEATURES_ORDER from a feature dict, a predicted_units
+    record ({"features_used": {...}}) or a list of values
+    """
+    if isinstance(row, dict):
+        row = row.get("features_used") or row.get("features") or row
+        return [float(row.get(k, 0)) for k in FEATURES_ORDER]
+    values = [float(v) for v in row]
+    if len(values) != len(FEATURES_ORDER):
+        raise ValueError(f"Expected {len(FEATURES_ORDER)} values per row, got {len(values)}")
+    return values
+
+
+def get_shap_explanation_batch(rows: list) -> dict:
+    """
+    SHAP values for many predictions with one predict and one explainer
+    call. Per-row arrays follow FEATURES_ORDER.
+    """
+    if not rows:
+        return {"error": True, "message": "No rows to explain."}
+    if len(rows) > BATCH_MAX_ROWS:
+        return {"error": True, "message": f"Too many rows ({len(rows)}), the limit is {BATCH_MAX_ROWS}."}
+
+    try:
+        model, fingerprint = _load_model_entry()
+    except Exception:
+        model, fingerprint = None, None
+    if model is None:
+        return {
+            "error": True,
+            "message": "Model not found. Place solar_power_model.pkl in model/ directory.",
+        }
+
+    try:
+        import pandas as pd
+        import shap
+
+        matrix = np.array([_feature_row(r) for r in rows], dtype=np.float64)
+        X = pd.DataFrame(matrix, columns=FEATURES_ORDER)
+        predictions = np.asarray(model.predict(X), dtype=np.float64).reshape(-1)
+
+        if is_tree_model(model):
+            explainer = _get_explainer(fingerprint, "tree", lambda: shap.TreeExplainer(model))
+            sv = explainer.shap_values(X)
+            method = "tree"
+        else:
+            background = shap.sample(X, min(50, len(X)), random_state=0)
+            explainer = shap.KernelExplainer(model.predict, background)
+            sv = explainer.shap_values(X, nsamples=50)
+            method = "kernel"
+        if isinstance(sv, list):
+            sv = sv[0]
+        sv = np.asarray(sv, dtype=np.float64).reshape(len(X), len(FEATURES_ORDER))
+
+        expected = getattr(explainer, "expected_value", None)
+        base_value = float(np.ravel(expected)[0]) if expected is not None else None
+        mean_abs = np.abs(sv).mean(axis=0)
+
+        return {
+            "count": int(len(X)),
+            "features": list(FEATURES_ORDER),
+            "predictions": np.round(predictions, 6).tolist(),
+            "shap_values": np.round(sv, 6).tolist(),
+            "base_value": base_value,
+            "mean_abs_shap": {
+                name: round(float(v), 6) for name, v in zip(FEATURES_ORDER, mean_abs)
+            },
+            "method": method,
+        }
+    except Exception as e:
+        return {"error": True, "message": str(e)}
+
+
+# --------------------------------------------------
+# LIME (local weighted surrogate)
+# --------------------------------------------------
+
+# Perturbation scale (≈ one typical deviation) and valid range per feature,
+# in FEATURES_ORDER; irradiance is the lux reading stored in features_used
+LIME_FEATURE_SCALES = np.array([50.0, 2.0, 10.0, 20.0, 0.03])
+LIME_FEATURE_BOUNDS = (
+    np.array([0.0, -10.0, 0.0, 0.0, 0.0]),
+    np.array([np.inf, 60.0, 100.0, 100.0, np.inf]),
+)
+
+LIME_NUM_SAMPLES = int(os.getenv("LIME_NUM_SAMPLES", "1000"))
+# Upper bound on a requested num_samples (one predict over that many rows)
+LIME_MAX_SAMPLES = int(os.getenv("LIME_MAX_SAMPLES", "5000"))
+# Default kernel width in scaled units, as in the lime package
+LIME_KERNEL_WIDTH = float(os.getenv("LIME_KERNEL_WIDTH", str(0.75 * np.sqrt(len(FEATURES_ORDER)))))
+LIME_RIDGE_ALPHA = 1.0
+
+
+def lime_surrogate(predict, x0, num_samples: int = LIME_NUM_SAMPLES, kernel_width: float = LIME_KERNEL_WIDTH,
+                   scales=LIME_FEATURE_SCALES, bounds=LIME_FEATURE_BOUNDS, alpha: float = LIME_RIDGE_ALPHA,
+                   seed: int = 0) -> dict:
+    """
+    Fits a weighted ridge model around x0.
+
+    predict(matrix) scores the whole neighbourhood (num_samples, n) in one
+    call. Samples are x0 plus Gaussian noise of `scales`, clipped to
+    `bounds`, weighted with the exponential kernel sqrt(exp(-d² / w²)) on
+    the scaled distance to x0. Coefficients are per one scale unit.
+    """
+    x0 = np.asarray(x0, dtype=np.float64)
+    scales = np.asarray(scales, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+
+    num_samples = max(2, int(num_samples))
+    noise = rng.standard_normal((num_samples, x0.size))
+    noise[0] = 0.0  # the explained point itself
+    Z = np.clip(x0 + noise * scales, bounds[0], bounds[1])
+
+    y = np.asarray(predict(Z), dtype=np.float64).reshape(-1)
+
+    A = (Z - x0) / scales
+    distances = np.sqrt((A ** 2).sum(axis=1))
+    weights = np.sqrt(np.exp(-(distances ** 2) / kernel_width ** 2))
+
+    # Weighted ridge with an unpenalized intercept, in closed form
+    design = np.hstack([np.ones((num_samples, 1)), A])
+    dw = design * weights[:, None]
+    penalty = alpha * np.eye(design.shape[1])
+    penalty[0, 0] = 0.0
+    beta = np.linalg.solve(design.T @ dw + penalty, dw.T @ y)
+
+    fitted = design @ beta
+    y_mean = np.average(y, weights=weights)
+    ss_res = np.sum(weights * (y - fitted) ** 2)
+    ss_tot = np.sum(weights * (y - y_mean) ** 2)
+
+    return {
+        "intercept": float(beta[0]),
+        "coefficients": beta[1:],
+        "score": float(1 - ss_res / ss_tot) if ss_tot > 0 else 1.0,
+        "local_prediction": float(beta[0]),
+        "prediction": float(y[0]),
+        "num_samples": num_samples,
+        "kernel_width": float(kernel_width),
+    }
+
+
+def parse_lime_params(num_samples=None, kernel_width=None) -> tuple:
+    """
+    Validates request values for get_lime_explanation. num_samples is
+    clamped to LIME_MAX_SAMPLES; None keeps the default. Raises ValueError
+    with a client-facing message for bad values.
+    """
+    if num_samples is not None:
+        try:
+            if isinstance(num_samples, bool) or float(num_samples) != int(float(num_samples)):
+                raise ValueError
+            num_samples = int(float(num_samples))
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("'num_samples' must be an integer")
+        if num_samples < 2:
+            raise ValueError("'num_samples' must be at least 2")
+        num_samples = min(num_samples, LIME_MAX_SAMPLES)
+
+    if kernel_width is not None:
+        try:
+            if isinstance(kernel_width, bool):
+                raise ValueError
+            kernel_width = float(kernel_width)
+        except (TypeError, ValueError):
+            raise ValueError("'kernel_width' must be a number")
+        if not np.isfinite(kernel_width) or kernel_width <= 0:
+            raise ValueError("'kernel_width' must be a positive number")
+
+    return num_samples, kernel_width
+
+
+def get_lime_explanation(features: dict, num_samples: int = None, kernel_width: float = None) -> dict:
+    """
+    LIME explanation: a weighted ridge surrogate fitted on perturbations
+    around the record, scored with one batched predict
+    """
     model = _load_model()
     if model is None:
         return {"error": True, "message": "Model not found."}
     try:
         import pandas as pd
-        X = pd.DataFrame([{k: features.get(k, 0) for k in FEATURES_ORDER}])
-        prediction = float(model.predict(X)[0])
-        weights = {k: round(float(features.get(k, 0)), 4) for k in FEATURES_ORDER}
-        text = f"Prediction: {prediction:.4f} kWh. Feature values: " + ", ".join(f"{k}={v}" for k, v in weights.items())
+
+        x0 = [float(features.get(k, 0)) for k in FEATURES_ORDER]
+        surrogate = lime_surrogate(
+            lambda Z: model.predict(pd.DataFrame(Z, columns=FEATURES_ORDER)),
+            x0,
+            num_samples=min(num_samples or LIME_NUM_SAMPLES, LIME_MAX_SAMPLES),
+            kernel_width=kernel_width or LIME_KERNEL_WIDTH,
+        )
+        prediction = surrogate["prediction"]
+        weights = {
+            k: round(float(c), 6) for k, c in zip(FEATURES_ORDER, surrogate["coefficients"])
+        }
+
+        ranked = sorted(weights.items(), key=lambda kv: -abs(kv[1]))
+        text = (
+            f"Prediction: {prediction:.4f} kWh. Local effect per typical change: "
+            + ", ".join(f"{k} ({v:+.4f})" for k, v in ranked)
+            + f". Surrogate fit R²={surrogate['score']:.2f}."
+        )
         return {
             "prediction": round(prediction, 6),
             "feature_weights": weights,
+            "feature_scales": {k: float(v) for k, v in zip(FEATURES_ORDER, LIME_FEATURE_SCALES)},
+            "intercept": round(surrogate["intercept"], 6),
+            "score": round(surrogate["score"], 4),
+            "num_samples": surrogate["num_samples"],
+            "kernel_width": round(surrogate["kernel_width"], 4),
             "explanation_text": text,
         }
     except Exception as e:
@@ -112,15 +504,42 @@ def get_lime_explanation(features: dict) -> dict:
 
 
 def get_feature_importance_global() -> dict:
-    model = _load_model()
-    if model is None:
+    """
+    Serves the precomputed artifact (services/global_importance.py) while
+    it matches the current model; otherwise schedules a recompute and
+    answers with the model's built-in importances meanwhile
+    """
+    from services.global_importance import cached_artifact, refresher
+
+    try:
+        sha256 = model_sha256()
+    except Exception:
+        sha256 = None
+    if sha256 is None:
         return {"features": [], "message": "Model not found."}
+
+    try:
+        artifact = cached_artifact()
+    except Exception:
+        artifact = None
+    if artifact and artifact.get("model_sha256") == sha256:
+        return artifact
+
+    if IMPORTANCE_AUTO_REFRESH:
+        refresher.refresh_async()
+
+    model = _load_model()
+    fallback = {"features": [{"name": k, "importance": 0.2} for k in FEATURES_ORDER], "method": "default"}
     try:
         if hasattr(model, "feature_importances_"):
             imp = model.feature_importances_
             total = imp.sum() or 1
             features = [{"name": FEATURES_ORDER[i], "importance": round(float(imp[i]) / total, 4)} for i in range(min(len(FEATURES_ORDER), len(imp)))]
-            return {"features": features, "method": "tree_importance"}
+            fallback = {"features": features, "method": "tree_importance"}
     except Exception:
         pass
-    return {"features": [{"name": k, "importance": 0.2} for k in FEATURES_ORDER], "method": "default"}
+    fallback["precomputed"] = False
+    fallback["refreshing"] = refresher.running
+    if refresher.last_error:
+        fallback["refresh_error"] = refresher.last_error
+    return fallback
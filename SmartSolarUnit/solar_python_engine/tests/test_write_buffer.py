@@ -0,0 +1,33 @@
+"""
+Run from solar_python_engine/:
+    python -m pytest -q tests
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from firebase.write_buffer import PredictionWriteBuffer  # noqa: E402
+
+
+def test_single_write_is_flushed_within_the_interval():
+    written = threading.Event()
+    batches = []
+
+    def writer(updates: dict):
+        batches.append(updates)
+        written.set()
+
+    buffer = PredictionWriteBuffer(writer, max_batch_size=500, flush_interval_s=0.2)
+    buffer.start()
+    try:
+        started = time.monotonic()
+        buffer.add("dilshan", "site_001", "20260101_060000", {"predicted_kwh_5min": 0.1})
+        assert written.wait(2.0), "write was not flushed on the time limit"
+        assert time.monotonic() - started < 1.0
+        assert list(batches[0]) == ["predicted_units/dilshan/site_001/20260101_060000"]
+    finally:
+        buffer.close()
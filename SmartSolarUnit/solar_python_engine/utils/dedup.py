@@ -0,0 +1,62 @@
+"""
+Per-device LRU of processed sensor record keys.
+
+Firebase replays data after a reconnect, and bursts can deliver the same
+record more than once. Checking the record key here lets the listener
+skip those events before any inference or database write.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class ProcessedKeyCache:
+    def __init__(self, max_keys_per_device: int = 4096):
+        # 4096 keys ≈ 14 days of 5-minute records per device
+        self.max_keys_per_device = max(1, int(max_keys_per_device))
+        self._keys = {}
+        self._lock = threading.Lock()
+
+        self.duplicates_skipped = 0
+
+    def check_and_mark(self, device_id: str, record_key: str) -> bool:
+        """
+        Returns True the first time a (device, key) pair is seen and
+        remembers it; False for a duplicate
+        """
+        with self._lock:
+            keys = self._keys.get(device_id)
+            if keys is None:
+                keys = self._keys[device_id] = OrderedDict()
+
+            if record_key in keys:
+                keys.move_to_end(record_key)
+                self.duplicates_skipped += 1
+                return False
+
+            keys[record_key] = None
+            if len(keys) > self.max_keys_per_device:
+                keys.popitem(last=False)
+            return True
+
+    def discard(self, device_id: str, record_key: str):
+        """
+        Forgets a key, e.g. for a record that was dropped before it was
+        processed, so a replay of it is not skipped as a duplicate
+        """
+        with self._lock:
+            keys = self._keys.get(device_id)
+            if keys is not None:
+                keys.pop(record_key, None)
+
+    def seen(self, device_id: str, record_key: str) -> bool:
+        with self._lock:
+            return record_key in self._keys.get(device_id, ())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "devices": len(self._keys),
+                "keys_tracked": sum(len(k) for k in self._keys.values()),
+                "duplicates_skipped": self.duplicates_skipped,
+            }
@@ -0,0 +1,109 @@
+"""
+Lightweight in-process metrics for the realtime engine.
+"""
+
+import math
+import threading
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram (seconds).
+
+    Buckets grow geometrically from 0.1 ms to ~2 min, so recording is O(1)
+    and memory is constant no matter how many samples are seen.
+    Percentiles are reported as the upper bound of the matching bucket.
+    """
+
+    def __init__(self, min_s: float = 1e-4, max_s: float = 120.0, growth: float = 1.25):
+        bounds = []
+        b = min_s
+        while b < max_s:
+            bounds.append(b)
+            b *= growth
+        bounds.append(max_s)
+
+        self._bounds = bounds
+        self._log_min = math.log(min_s)
+        self._log_growth = math.log(growth)
+        self._counts = [0] * (len(bounds) + 1)
+        self._lock = threading.Lock()
+
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def _bucket(self, value: float) -> int:
+        if value <= self._bounds[0]:
+            return 0
+        if value > self._bounds[-1]:
+            return len(self._bounds)
+        i = int(math.ceil((math.log(value) - self._log_min) / self._log_growth))
+        # Guard against float rounding at bucket edges
+        while i > 0 and value <= self._bounds[i - 1]:
+            i -= 1
+        while i < len(self._bounds) and value > self._bounds[i]:
+            i += 1
+        return i
+
+    def record(self, value_s: float):
+        value_s = max(0.0, float(value_s))
+        i = self._bucket(value_s)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.total_s += value_s
+            if value_s > self.max_s:
+                self.max_s = value_s
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            target = q / 100.0 * self.count
+            seen = 0
+            for i, c in enumerate(self._counts):
+                seen += c
+                if c and seen >= target:
+                    return self._bounds[i] if i < len(self._bounds) else self.max_s
+            return self.max_s
+
+    def summary(self) -> dict:
+        """Milliseconds, ready for logging / JSON"""
+        mean = self.total_s / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "mean_ms": round(mean * 1000, 3),
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p95_ms": round(self.percentile(95) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max_s * 1000, 3),
+        }
+
+
+class StageLatencyMetrics:
+    """
+    Named latency histograms for the stages of the ingestion pipeline:
+
+        receipt_to_mapped      listener callback → features mapped
+                               (includes time waiting in the queue)
+        mapped_to_predicted    features → model output
+        predicted_to_persisted model output → bulk write confirmed
+        end_to_end             listener callback → bulk write confirmed
+    """
+
+    STAGES = (
+        "receipt_to_mapped",
+        "mapped_to_predicted",
+        "predicted_to_persisted",
+        "end_to_end",
+    )
+
+    def __init__(self):
+        self._histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+
+    def record(self, stage: str, seconds: float):
+        self._histograms[stage].record(seconds)
+
+    def summary(self) -> dict:
+        return {stage: h.summary() for stage, h in self._histograms.items()}
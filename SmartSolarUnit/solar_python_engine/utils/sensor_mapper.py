@@ -21,3 +21,131 @@ def map_firebase_to_model_features(raw: dict) -> dict:
         "rainfall": rainfall,
         "dust_level": dust_level
     }
+
+
+# --------------------------------------------------
+# COMPACT / BATCH REPRESENTATION
+# --------------------------------------------------
+
+# Column order of the feature matrix and of the model's input (predictor FEATURES)
+FEATURE_COLUMNS = (
+    "irradiance",
+    "temperature",
+    "humidity",
+    "rainfall",
+    "dust_level"
+)
+
+# Per-row error flags (bitmask) produced by the batch mapper
+ERR_NONE = 0
+ERR_BH1750 = 1 << 0     # bh1750.lux_avg missing / not numeric
+ERR_DHT = 1 << 1        # dht_avg.temp_c or dht_avg.hum_% missing / not numeric
+ERR_RAIN = 1 << 2       # rain.pct1 or rain.pct2 missing / not numeric
+ERR_DUST = 1 << 3       # dust.mg_m3 missing / not numeric
+ERR_PAYLOAD = 1 << 4    # record is not a dict
+
+ERROR_NAMES = {
+    ERR_BH1750: "bh1750",
+    ERR_DHT: "dht_avg",
+    ERR_RAIN: "rain",
+    ERR_DUST: "dust",
+    ERR_PAYLOAD: "payload",
+}
+
+
+def describe_errors(flags: int) -> list:
+    """
+    5 → ["bh1750", "rain"]
+    """
+    return [name for bit, name in ERROR_NAMES.items() if flags & bit]
+
+
+class SensorReading:
+    """
+    One mapped sensor reading without a per-instance __dict__
+    """
+    __slots__ = FEATURE_COLUMNS
+
+    def __init__(self, irradiance, temperature, humidity, rainfall, dust_level):
+        self.irradiance = irradiance
+        self.temperature = temperature
+        self.humidity = humidity
+        self.rainfall = rainfall
+        self.dust_level = dust_level
+
+    @classmethod
+    def from_firebase(cls, raw: dict) -> "SensorReading":
+        return cls(**map_firebase_to_model_features(raw))
+
+    @classmethod
+    def from_row(cls, row) -> "SensorReading":
+        return cls(*(float(v) for v in row))
+
+    def as_row(self) -> tuple:
+        return tuple(getattr(self, k) for k in FEATURE_COLUMNS)
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in FEATURE_COLUMNS}
+
+    def __repr__(self):
+        return "SensorReading(" + ", ".join(f"{k}={getattr(self, k)}" for k in FEATURE_COLUMNS) + ")"
+
+
+def _number(value) -> float:
+    if value is None or isinstance(value, bool):
+        raise TypeError("not a number")
+    return float(value)
+
+
+def map_firebase_batch_to_matrix(raws: list, dtype=None):
+    """
+    Maps a list of raw Firebase payloads straight into a contiguous
+    (n, 5) feature matrix in FEATURE_COLUMNS order.
+
+    Never raises for bad records: returns (matrix, error_flags) where
+    error_flags[i] is a bitmask of ERR_* values and failed fields are NaN.
+    dtype defaults to float32; pass np.float64 when results must match the
+    single-record path bit for bit.
+    """
+    import numpy as np
+
+    dtype = np.float32 if dtype is None else dtype
+    n = len(raws)
+    matrix = np.full((n, len(FEATURE_COLUMNS)), np.nan, dtype=dtype)
+    error_flags = np.zeros(n, dtype=np.uint8)
+
+    for i, raw in enumerate(raws):
+        if not isinstance(raw, dict):
+            error_flags[i] = ERR_PAYLOAD
+            continue
+
+        flags = ERR_NONE
+        row = matrix[i]
+
+        try:
+            row[0] = _number(raw["bh1750"]["lux_avg"])
+        except (KeyError, TypeError, ValueError):
+            flags |= ERR_BH1750
+
+        try:
+            dht = raw["dht_avg"]
+            row[1] = _number(dht["temp_c"])
+            row[2] = _number(dht["hum_%"])
+        except (KeyError, TypeError, ValueError):
+            row[1] = row[2] = np.nan
+            flags |= ERR_DHT
+
+        try:
+            rain = raw["rain"]
+            row[3] = (_number(rain["pct1"]) + _number(rain["pct2"])) / 2
+        except (KeyError, TypeError, ValueError):
+            flags |= ERR_RAIN
+
+        try:
+            row[4] = _number(raw["dust"]["mg_m3"])
+        except (KeyError, TypeError, ValueError):
+            flags |= ERR_DUST
+
+        error_flags[i] = flags
+
+    return matrix, error_flags
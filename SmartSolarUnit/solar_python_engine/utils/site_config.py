@@ -0,0 +1,57 @@
+import json
+import os
+from pathlib import Path
+
+DEFAULT_SITES_FILE = Path(__file__).resolve().parent.parent / "config" / "sites.json"
+
+REQUIRED_SITE_FIELDS = ("device_id", "site_id", "customer", "panel_area_m2")
+
+
+def _validate_sites(sites) -> list:
+    """
+    Accepts a list of site dicts or a {key: site} mapping (Firebase node)
+    and returns only complete site entries
+    """
+    if isinstance(sites, dict):
+        sites = list(sites.values())
+
+    valid = []
+    for site in sites or []:
+        if not isinstance(site, dict):
+            continue
+        missing = [f for f in REQUIRED_SITE_FIELDS if site.get(f) is None]
+        if missing:
+            print(f"[SKIP] Site config missing fields {missing}: {site}")
+            continue
+        valid.append(site)
+    return valid
+
+
+def load_sites_from_file(path=None) -> list:
+    path = Path(path or os.getenv("SITES_CONFIG_FILE", DEFAULT_SITES_FILE))
+    with open(path, "r", encoding="utf-8") as f:
+        return _validate_sites(json.load(f))
+
+
+def load_sites_from_firebase(node: str) -> list:
+    """
+    Reads site configuration from a Firebase node, e.g. site_config/
+    """
+    from firebase.firebase_client import get_reference
+    return _validate_sites(get_reference(node).get())
+
+
+def load_sites() -> list:
+    """
+    Returns the configured sites.
+    SITES_FIREBASE_NODE (if set) takes precedence over the JSON file
+    at SITES_CONFIG_FILE (default: config/sites.json).
+    """
+    node = os.getenv("SITES_FIREBASE_NODE")
+    if node:
+        sites = load_sites_from_firebase(node)
+        if sites:
+            return sites
+        print(f"[WARN] No sites found at Firebase node '{node}', using config file")
+
+    return load_sites_from_file()
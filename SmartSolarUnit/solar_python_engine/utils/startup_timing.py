@@ -0,0 +1,37 @@
+"""
+Startup timing report.
+
+    with startup_timer.stage("load model"):
+        ...
+    startup_timer.report()
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stages.append((name, time.perf_counter() - start))
+
+    def stages(self) -> dict:
+        return {name: round(seconds, 4) for name, seconds in self._stages}
+
+    def report(self):
+        total = time.perf_counter() - self._started
+        print("[STARTUP] timing:")
+        for name, seconds in self._stages:
+            print(f"  {name:<24} {seconds * 1000:8.1f} ms")
+        print(f"  {'total':<24} {total * 1000:8.1f} ms")
+
+
+startup_timer = StartupTimer()
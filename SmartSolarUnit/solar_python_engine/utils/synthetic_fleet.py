@@ -0,0 +1,185 @@
+"""
+Synthetic fleet generator for offline load tests.
+
+Produces ESP32 records for many devices with the same daily shapes and
+ranges as AddSampleData.py (sine-shaped lux and temperature between 6 AM
+and 6 PM, humidity falling as temperature rises, slowly drifting dust,
+step-limited changes between readings), generated for the whole fleet at
+once with NumPy:
+
+    sites = fleet_sites(10000)
+    for record_key, records in generate_fleet(sites, datetime(2026, 1, 1, 6), hours=12):
+        for device_id, record in records:
+            ...
+
+Seeded, so two runs produce the same records.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# Same ranges as AddSampleData.py
+TEMP_MIN, TEMP_MAX = 28, 33
+HUMIDITY_MIN, HUMIDITY_MAX = 60, 95
+LUX_MIN, LUX_MAX = 80, 300
+DUST_MIN, DUST_MAX = 0, 0.1
+
+DEVICE_TZ = timezone(timedelta(hours=5))
+
+
+def fleet_sites(n_devices: int, devices_per_customer: int = 100, panel_area_m2: float = 25) -> list:
+    """
+    Site configs in the config/sites.json shape for n synthetic devices
+    """
+    return [
+        {
+            "device_id": f"SSA_SIM_{i:05d}",
+            "site_id": f"site_{i:05d}",
+            "customer": f"sim_customer_{i // devices_per_customer:03d}",
+            "panel_area_m2": panel_area_m2,
+        }
+        for i in range(n_devices)
+    ]
+
+
+def calculate_time_factor(hour: int, minute: int) -> float:
+    """
+    0..1 daylight factor peaking at noon, as in AddSampleData.py
+    """
+    minutes_since_start = (hour - 6) * 60 + minute
+    if minutes_since_start < 0 or minutes_since_start > 12 * 60:
+        return 0.0
+    time_factor = math.sin(minutes_since_start / (12 * 60) * math.pi)
+    if time_factor < 0.1:
+        time_factor *= 0.5
+    return max(0.0, min(1.0, time_factor))
+
+
+def _step_toward(previous: np.ndarray, target: np.ndarray, max_change) -> np.ndarray:
+    """
+    Moves each value toward its target by at most max_change
+    """
+    return previous + np.clip(target - previous, -max_change, max_change)
+
+
+class FleetState:
+    """
+    Current sensor values of every device, advanced one reading at a time
+    """
+
+    def __init__(self, n_devices: int, rng: np.random.Generator):
+        self.rng = rng
+        self.n = n_devices
+        self.lux = None
+        self.temp = None
+        self.humidity = None
+        self.dust = None
+
+    def _noise(self, scale: float) -> np.ndarray:
+        return self.rng.uniform(-scale, scale, self.n)
+
+    def advance(self, dt: datetime) -> dict:
+        tf = calculate_time_factor(dt.hour, dt.minute)
+
+        base_lux = LUX_MIN + (LUX_MAX - LUX_MIN) * tf
+        lux_noise = self._noise((LUX_MAX - LUX_MIN) * 0.03)
+        if self.lux is None:
+            lux = base_lux + lux_noise
+        else:
+            lux = _step_toward(self.lux, base_lux, self.lux * 0.08) + lux_noise
+        self.lux = np.clip(lux, LUX_MIN, LUX_MAX).round(2)
+
+        base_temp = TEMP_MIN + (TEMP_MAX - TEMP_MIN) * tf * 0.85
+        temp_noise = self._noise(0.4)
+        if self.temp is None:
+            temp = base_temp + temp_noise
+        else:
+            temp = _step_toward(self.temp, base_temp, 0.25) + temp_noise
+        self.temp = np.clip(temp, TEMP_MIN, TEMP_MAX).round(1)
+
+        temp_factor = (self.temp - TEMP_MIN) / (TEMP_MAX - TEMP_MIN)
+        base_humidity = HUMIDITY_MAX - (HUMIDITY_MAX - HUMIDITY_MIN) * temp_factor * 0.6
+        humidity_noise = self._noise(2)
+        if self.humidity is None:
+            humidity = base_humidity + humidity_noise
+        else:
+            humidity = _step_toward(self.humidity, base_humidity, 1.0) + humidity_noise
+        self.humidity = np.clip(humidity, HUMIDITY_MIN, HUMIDITY_MAX).round(1)
+
+        base_dust = (DUST_MIN + DUST_MAX) / 2
+        dust_noise = self._noise((DUST_MAX - DUST_MIN) * 0.2)
+        if self.dust is None:
+            dust = base_dust + dust_noise
+        else:
+            dust = _step_toward(self.dust, base_dust, (DUST_MAX - DUST_MIN) * 0.1) + dust_noise
+        self.dust = np.clip(dust, DUST_MIN, DUST_MAX).round(2)
+
+        return {
+            "lux": self.lux,
+            "temp": self.temp,
+            "humidity": self.humidity,
+            "dust": self.dust,
+        }
+
+
+def build_device_record(device_id: str, dt: datetime, lux: float, temp: float,
+                        humidity: float, dust: float, rain_pct: int, rssi: int) -> dict:
+    """
+    One record in the shape the ESP32 firmware / AddSampleData.py uploads
+    """
+    rain_raw = int(3500 - rain_pct * 35)
+    dust_raw = int(500 + dust * 100)
+    return {
+        "device_id": device_id,
+        "timestamp": dt.replace(tzinfo=DEVICE_TZ).strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "dht_avg": {"temp_c": temp, "hum_%": humidity},
+        "bh1750": {"lux1": lux, "lux2": lux, "lux_avg": lux},
+        "rain": {"pct1": rain_pct, "pct2": rain_pct, "raw1": rain_raw, "raw2": rain_raw},
+        "dust": {"mg_m3": dust, "raw": dust_raw, "voltage": round(dust_raw / 4095 * 5, 3)},
+        "rssi": rssi,
+    }
+
+
+def generate_fleet(sites: list, start: datetime, hours: float = 12,
+                   interval_minutes: int = 5, seed: int = 42, rain_pct: int = None):
+    """
+    Yields (record_key, [(device_id, record), ...]) for every reading
+    time, all devices at once, oldest first.
+
+    rain_pct: fixed rain percentage for every record (AddSampleData.py
+    uses 100); None draws one value per device
+    """
+    rng = np.random.default_rng(seed)
+    device_ids = [site["device_id"] for site in sites]
+    state = FleetState(len(device_ids), rng)
+
+    if rain_pct is None:
+        rain = rng.integers(0, 101, len(device_ids)).tolist()
+    else:
+        rain = [int(rain_pct)] * len(device_ids)
+
+    steps = int(hours * 60 // interval_minutes) + 1
+    for step in range(steps):
+        dt = start + timedelta(minutes=step * interval_minutes)
+        values = state.advance(dt)
+        rssi = rng.integers(-50, -19, len(device_ids)).tolist()
+
+        columns = zip(
+            device_ids,
+            values["lux"].tolist(),
+            values["temp"].tolist(),
+            values["humidity"].tolist(),
+            values["dust"].tolist(),
+            rain,
+            rssi,
+        )
+        yield dt.strftime("%Y%m%d_%H%M%S"), [
+            (device_id, build_device_record(device_id, dt, lux, temp, hum, dust, rain_p, rssi_v))
+            for device_id, lux, temp, hum, dust, rain_p, rssi_v in columns
+        ]
+
+
+def fleet_record_count(n_devices: int, hours: float = 12, interval_minutes: int = 5) -> int:
+    return n_devices * (int(hours * 60 // interval_minutes) + 1)
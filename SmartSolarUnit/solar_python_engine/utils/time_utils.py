@@ -1,3 +1,4 @@
+import calendar
 from datetime import datetime, timezone
 
 def firebase_safe_timestamp() -> str:
@@ -6,3 +7,40 @@ def firebase_safe_timestamp() -> str:
     Example: 20251221_193958
     """
     return datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+
+
+def record_key_from_event_path(path: str):
+    """
+    Extracts the sensor record key from a per-device listener event path
+    Example: "/20251221_193958" → "20251221_193958"
+    Returns None for the root snapshot and for field-level paths
+    ("/20251221_193958/bh1750"), which are not new records
+    """
+    parts = [p for p in (path or "").split("/") if p]
+    if len(parts) != 1:
+        return None
+    return parts[0]
+
+
+def parse_record_key(key: str):
+    """
+    Parses a sensor / prediction record key back into a naive datetime
+    in the device's wall-clock time (ESP32 keys are local time, +05:00)
+    Example: "20251221_193958" → datetime(2025, 12, 21, 19, 39, 58)
+    Returns None if the key is not in that format
+    """
+    try:
+        return datetime.strptime(key, "%Y%m%d_%H%M%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def record_key_to_seconds(key: str):
+    """
+    Record key → wall-clock seconds since 1970-01-01 (no timezone shift),
+    so day boundaries of the result are the device's local days
+    """
+    dt = parse_record_key(key)
+    if dt is None:
+        return None
+    return float(calendar.timegm(dt.timetuple()))
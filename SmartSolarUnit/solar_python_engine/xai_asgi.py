@@ -0,0 +1,489 @@
+"""
+XAI + Time-Series ASGI server for Smart Solar Advisor.
+Same routes and responses as xai_server.py, served by Starlette.
+
+- Cheap requests (cached SHAP, TreeExplainer SHAP, LIME, precomputed
+  importance, cached and intraday forecasts) run on the event loop's thread pool and
+  return at once.
+- CPU-heavy work (Prophet / SARIMA fits, KernelExplainer) runs in a
+  bounded process pool, so a slow fit never holds up a SHAP request.
+- Every route has its own concurrency limit. A request that cannot get a
+  slot within ASGI_QUEUE_TIMEOUT_S is answered with 503.
+
+Run: python xai_asgi.py
+  or uvicorn xai_asgi:app --host 0.0.0.0 --port 8085
+Default port: 8085 (or PORT env)
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from services.xai_service import (
+    ResultCache,
+    explainer_kind,
+    get_shap_explanation,
+    get_shap_explanation_batch,
+    get_lime_explanation,
+    get_feature_importance_global,
+    get_cache_stats,
+    parse_lime_params,
+)
+from services.time_series_service import FORECAST_MODELS, OUTPUT_FORMATS, encode_result, forecast_model
+from services.forecast_backtest import resolve_model
+from services.bulk_forecast import forecast_job, job_series_id, ndjson_line, parse_bulk_workers
+from services.intraday_forecast import INTRADAY_HORIZON, forecast_intraday, intraday
+from utils.metrics import LatencyHistogram
+
+# Worker processes for fits and KernelExplainer
+ASGI_PROCESS_WORKERS = int(os.getenv("ASGI_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+# Seconds a request may wait for a route slot before a 503
+ASGI_QUEUE_TIMEOUT_S = float(os.getenv("ASGI_QUEUE_TIMEOUT_S", "30"))
+# Forecast responses kept in the server process
+ASGI_FORECAST_CACHE_SIZE = int(os.getenv("ASGI_FORECAST_CACHE_SIZE", "1024"))
+
+# Concurrent requests per route; override with e.g. ASGI_ROUTE_LIMITS="forecast=4,lime=8"
+ROUTE_LIMITS = {
+    "shap": 64,
+    "shap_batch": 4,
+    "lime": 16,
+    "feature_importance": 64,
+    "forecast": 2 * ASGI_PROCESS_WORKERS,
+    "forecast_bulk": 1,
+    "intraday": 32,
+}
+for _item in filter(None, os.getenv("ASGI_ROUTE_LIMITS", "").split(",")):
+    _name, _, _limit = _item.partition("=")
+    if _name.strip() in ROUTE_LIMITS and _limit.strip().isdigit():
+        ROUTE_LIMITS[_name.strip()] = max(1, int(_limit))
+
+
+# --------------------------------------------------
+# CONCURRENCY
+# --------------------------------------------------
+
+class RouteLimiter:
+    """
+    Semaphore with a bounded wait, plus in-flight / rejected counters and
+    a latency histogram for /health. A streaming response keeps its slot,
+    and is timed, until the last chunk is sent.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.latency = LatencyHistogram(max_s=600.0)
+
+    async def run(self, handler, request):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), ASGI_QUEUE_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return JSONResponse({"error": True, "message": "Server busy, try again later"}, status_code=503)
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            response = await handler(request)
+        except BaseException:
+            self._release(started)
+            raise
+
+        if isinstance(response, StreamingResponse):
+            # The body runs after the handler returns: hold the slot until
+            # the stream ends or the client goes away
+            response.body_iterator = self._hold_until_done(response.body_iterator, started)
+        else:
+            self._release(started)
+        return response
+
+    async def _hold_until_done(self, body, started: float):
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            try:
+                if hasattr(body, "aclose"):
+                    await body.aclose()
+            finally:
+                self._release(started)
+
+    def _release(self, started: float):
+        self.in_flight -= 1
+        self._semaphore.release()
+        self.latency.record(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "latency": self.latency.summary(),
+        }
+
+
+_limiters = {}
+
+
+def limited(name: str):
+    """
+    Wraps a handler in the limiter of route `name`
+    """
+    def wrap(handler):
+        async def endpoint(request):
+            limiter = _limiters.get(name)
+            if limiter is None:
+                # Created lazily so the semaphore binds to the running loop
+                limiter = _limiters[name] = RouteLimiter(ROUTE_LIMITS[name])
+            return await limiter.run(handler, request)
+        endpoint.__name__ = handler.__name__
+        return endpoint
+    return wrap
+
+
+_pool_state = {"pool": None, "tasks": 0, "broken": 0}
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    if _pool_state["pool"] is None:
+        # spawn: workers do not inherit the server's threads or Stan state
+        ctx = multiprocessing.get_context("spawn")
+        _pool_state["pool"] = ProcessPoolExecutor(max_workers=max(1, ASGI_PROCESS_WORKERS), mp_context=ctx)
+    return _pool_state["pool"]
+
+
+async def run_cpu(func, *args):
+    """
+    Runs func(*args) in the process pool; a crashed pool is replaced
+    """
+    loop = asyncio.get_running_loop()
+    _pool_state["tasks"] += 1
+    try:
+        return await loop.run_in_executor(_process_pool(), func, *args)
+    except BrokenProcessPool as e:
+        _pool_state["broken"] += 1
+        _pool_state["pool"] = None
+        return {"error": True, "message": f"Worker process failed: {e}"}
+
+
+async def _json_body(request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+# --------------------------------------------------
+# XAI
+# --------------------------------------------------
+
+async def health(request):
+    pool = _pool_state["pool"]
+    return JSONResponse({
+        "status": "ok",
+        "service": "xai",
+        "server": "asgi",
+        "cache": await run_in_threadpool(get_cache_stats),
+        "forecast_cache": _forecast_results.stats(),
+        "intraday": intraday.stats(),
+        "process_pool": {
+            "workers": ASGI_PROCESS_WORKERS,
+            "started": pool is not None,
+            "tasks": _pool_state["tasks"],
+            "broken": _pool_state["broken"],
+        },
+        "routes": {name: limiter.stats() for name, limiter in _limiters.items()},
+    })
+
+
+@limited("shap")
+async def shap(request):
+    data = await _json_body(request)
+    features = data.get("features") or data.get("feature_used") or {}
+    if not features:
+        return JSONResponse({"error": True, "message": "Missing 'features' in body"}, status_code=400)
+    if await run_in_threadpool(explainer_kind) == "kernel":
+        result = await run_cpu(get_shap_explanation, features)
+    else:
+        result = await run_in_threadpool(get_shap_explanation, features)
+    return JSONResponse(result)
+
+
+@limited("shap_batch")
+async def shap_batch(request):
+    data = await _json_body(request)
+    rows = data.get("rows") or data.get("records") or []
+    if isinstance(rows, dict):
+        # {record_key: record} as read from predicted_units
+        rows = list(rows.values())
+    if not isinstance(rows, list) or not rows:
+        return JSONResponse({"error": True, "message": "Missing 'rows' in body"}, status_code=400)
+    if await run_in_threadpool(explainer_kind) == "kernel":
+        result = await run_cpu(get_shap_explanation_batch, rows)
+    else:
+        result = await run_in_threadpool(get_shap_explanation_batch, rows)
+    return JSONResponse(result)
+
+
+@limited("lime")
+async def lime(request):
+    data = await _json_body(request)
+    features = data.get("features") or data.get("feature_used") or {}
+    if not features:
+        return JSONResponse({"error": True, "message": "Missing 'features' in body"}, status_code=400)
+    try:
+        num_samples, kernel_width = parse_lime_params(data.get("num_samples"), data.get("kernel_width"))
+    except ValueError as e:
+        return JSONResponse({"error": True, "message": str(e)}, status_code=400)
+    result = await run_in_threadpool(
+        get_lime_explanation,
+        features,
+        num_samples=num_samples,
+        kernel_width=kernel_width,
+    )
+    return JSONResponse(result)
+
+
+@limited("feature_importance")
+async def feature_importance(request):
+    result = await run_in_threadpool(get_feature_importance_global)
+    return JSONResponse(result)
+
+
+# --------------------------------------------------
+# TIME-SERIES
+# --------------------------------------------------
+
+# Worker processes keep no Prophet cache between requests, so finished
+# forecasts are kept here, keyed on the model and the exact input series
+_forecast_results = ResultCache(ASGI_FORECAST_CACHE_SIZE)
+_forecasts_in_flight = {}
+
+
+def _series_id(data: dict):
+    """
+    Model selection key: explicit series_id, else customer/site_id
+    """
+    if data.get("series_id"):
+        return str(data["series_id"])
+    if data.get("customer") and data.get("site_id"):
+        return f"{data['customer']}/{data['site_id']}"
+    return None
+
+
+def _forecast_key(model: str, params, periods: int, output: str, daily_data) -> str:
+    payload = json.dumps([model, params or {}, periods, output, daily_data], separators=(",", ":"), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _forecast_job(model: str, daily_data: list, periods: int, output: str, params) -> dict:
+    """
+    One forecast in a worker process
+    """
+    return forecast_model(model, daily_data, periods=periods, output=output, params=params, use_cache=False)
+
+
+async def _cached_forecast(key: str, model: str, daily_data: list, periods: int, output: str, params) -> dict:
+    """
+    Cached result, else one pool run shared by all identical requests in flight
+    """
+    cached = _forecast_results.get(key)
+    if cached is not None:
+        cached["cache"] = "hit"
+        return cached
+
+    future = _forecasts_in_flight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(run_cpu(_forecast_job, model, daily_data, periods, output, params))
+        _forecasts_in_flight[key] = future
+        future.add_done_callback(lambda _: _forecasts_in_flight.pop(key, None))
+
+    result = dict(await asyncio.shield(future))
+    if not result.get("error"):
+        _forecast_results.put(key, result)
+    result["cache"] = "miss"
+    return result
+
+
+@limited("forecast")
+async def timeseries_forecast(request):
+    """
+    "model": "prophet" | "sarima" | "seasonal_naive", or omitted / "auto"
+    for the model the backtest selected for this series (else Prophet)
+    """
+    data = await _json_body(request)
+    daily_data = data.get("daily_data") or data.get("history") or []
+    periods = int(data.get("periods", 30))
+    model = data.get("model") or "auto"
+    output = data.get("output") or "rows"
+    if not daily_data:
+        return JSONResponse({"error": True, "message": "Missing 'daily_data' in body"}, status_code=400)
+    if output not in OUTPUT_FORMATS:
+        return JSONResponse({"error": True, "message": f"'output' must be one of {list(OUTPUT_FORMATS)}"}, status_code=400)
+    if model != "auto" and model not in FORECAST_MODELS:
+        return JSONResponse({"error": True, "message": f"'model' must be 'auto' or one of {list(FORECAST_MODELS)}"}, status_code=400)
+
+    model, params, selection = resolve_model(model, _series_id(data))
+    key = _forecast_key(model, params, periods, output, daily_data)
+    result = await _cached_forecast(key, model, daily_data, periods, output, params)
+    if selection:
+        result["selected_by"] = "backtest"
+        result["selection"] = selection["name"]
+
+    # Optional faster encodings: "orjson", or "arrow" with output=columns
+    encoded = encode_result(result, data.get("encoding"))
+    if encoded is not None:
+        body, media_type = encoded
+        return Response(body, media_type=media_type)
+    return JSONResponse(result)
+
+
+@limited("forecast_bulk")
+async def timeseries_forecast_bulk(request):
+    """
+    Body: {"series": [{"series_id", "daily_data"} | {"customer", "site_id"}, ...],
+           "periods": 30, "model": "auto" | "prophet" | "sarima" | "seasonal_naive",
+           "output": "rows" | "columns", "workers": N}
+    Streams one JSON result per line as each series finishes. The fits share
+    the server's process pool; "workers" caps how many run at once.
+    """
+    data = await _json_body(request)
+    series = data.get("series") or []
+    if not isinstance(series, list) or not series:
+        return JSONResponse({"error": True, "message": "Missing 'series' in body"}, status_code=400)
+
+    try:
+        # "workers": series in flight at once, out of the shared process pool
+        workers = parse_bulk_workers(data.get("workers"), limit=ASGI_PROCESS_WORKERS)
+    except ValueError as e:
+        return JSONResponse({"error": True, "message": str(e)}, status_code=400)
+    periods = int(data.get("periods", 30))
+    model = data.get("model")
+    output = data.get("output") or "rows"
+    jobs = (
+        {"periods": periods, "model": model, "output": output, **job}
+        for job in series if isinstance(job, dict)
+    )
+    return StreamingResponse(_bulk_ndjson(jobs, window=workers), media_type="application/x-ndjson")
+
+
+async def _bulk_ndjson(jobs, window: int):
+    """
+    Runs bulk jobs in the shared process pool, at most `window` at a time,
+    yielding one JSON line per series as it finishes. Jobs not yet started
+    are cancelled when the client goes away.
+    """
+    loop = asyncio.get_running_loop()
+    jobs = iter(jobs)
+    pending = {}
+
+    def submit_next() -> bool:
+        job = next(jobs, None)
+        if job is None:
+            return False
+        _pool_state["tasks"] += 1
+        pending[loop.run_in_executor(_process_pool(), forecast_job, job)] = job
+        return True
+
+    try:
+        while len(pending) < window and submit_next():
+            pass
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    _pool_state["broken"] += 1
+                    _pool_state["pool"] = None
+                    result = {"error": True, "message": f"Worker process failed: {e}",
+                              "forecast": [], "series_id": job_series_id(job)}
+                except Exception as e:
+                    result = {"error": True, "message": str(e), "forecast": [], "series_id": job_series_id(job)}
+                yield ndjson_line(result)
+                submit_next()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+@limited("intraday")
+async def timeseries_intraday(request):
+    """
+    Body: {"customer", "site_id"} (reads predicted_units, updated
+    incrementally) or {"points": [{"key": "YYYYMMDD_HHMMSS", "kwh"}, ...]},
+    "horizon": 5-minute steps (default 36 = 3 h), "output": "rows" | "columns"
+    """
+    data = await _json_body(request)
+    output = data.get("output") or "rows"
+    if output not in OUTPUT_FORMATS:
+        return JSONResponse({"error": True, "message": f"'output' must be one of {list(OUTPUT_FORMATS)}"}, status_code=400)
+    if not data.get("points") and not (data.get("customer") and data.get("site_id")):
+        return JSONResponse({"error": True, "message": "Missing 'customer' / 'site_id' or 'points' in body"}, status_code=400)
+    try:
+        horizon = int(data.get("horizon", INTRADAY_HORIZON))
+        panel_area_m2 = float(data["panel_area_m2"]) if data.get("panel_area_m2") is not None else None
+    except (TypeError, ValueError):
+        return JSONResponse({"error": True, "message": "'horizon' must be an integer and 'panel_area_m2' a number"}, status_code=400)
+    # Vectorized and incremental: cheap enough for the thread pool
+    result = await run_in_threadpool(
+        forecast_intraday,
+        customer=data.get("customer"),
+        site_id=data.get("site_id"),
+        points=data.get("points"),
+        horizon=horizon,
+        output=output,
+        panel_area_m2=panel_area_m2,
+    )
+    return JSONResponse(result)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    pool = _pool_state["pool"]
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        _pool_state["pool"] = None
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/api/xai/shap", shap, methods=["POST"]),
+        Route("/api/xai/shap/batch", shap_batch, methods=["POST"]),
+        Route("/api/xai/lime", lime, methods=["POST"]),
+        Route("/api/xai/feature-importance", feature_importance, methods=["GET"]),
+        Route("/api/timeseries/forecast", timeseries_forecast, methods=["POST"]),
+        Route("/api/timeseries/forecast/bulk", timeseries_forecast_bulk, methods=["POST"]),
+        Route("/api/timeseries/intraday", timeseries_intraday, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("PORT", 8085))
+    uvicorn.run(app, host="0.0.0.0", port=port)
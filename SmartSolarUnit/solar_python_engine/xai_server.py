@@ -1,20 +1,37 @@
 """
 XAI + Time-Series Flask server for Smart Solar Advisor.
-Exposes SHAP, LIME, and Prophet/SARIMA time-series forecast.
+Exposes SHAP, LIME, Prophet/SARIMA daily and 5-minute intraday forecasts.
 Run: python xai_server.py
 Default port: 8085 (or PORT env)
 """
 
-from flask import Flask, request, jsonify
-from services.xai_service import get_shap_explanation, get_lime_explanation, get_feature_importance_global
-from services.time_series_service import forecast_prophet, forecast_sarima
+from flask import Flask, Response, request, jsonify
+from services.xai_service import (
+    get_shap_explanation,
+    get_shap_explanation_batch,
+    get_lime_explanation,
+    get_feature_importance_global,
+    get_cache_stats,
+    parse_lime_params,
+)
+from services.time_series_service import FORECAST_MODELS, OUTPUT_FORMATS, encode_result, forecast_model
+from services.forecast_backtest import resolve_model
+from services.prophet_cache import prophet_cache
+from services.bulk_forecast import iter_bulk_forecasts, iter_ndjson, parse_bulk_workers
+from services.intraday_forecast import INTRADAY_HORIZON, forecast_intraday, intraday
 
 app = Flask(__name__)
 
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok", "service": "xai"})
+    return jsonify({
+        "status": "ok",
+        "service": "xai",
+        "cache": get_cache_stats(),
+        "forecast_cache": prophet_cache.stats(),
+        "intraday": intraday.stats(),
+    })
 
 
 @app.route("/api/xai/shap", methods=["POST"])
@@ -27,13 +44,34 @@ def shap():
     return jsonify(result)
 
 
+@app.route("/api/xai/shap/batch", methods=["POST"])
+def shap_batch():
+    data = request.get_json() or {}
+    rows = data.get("rows") or data.get("records") or []
+    if isinstance(rows, dict):
+        # {record_key: record} as read from predicted_units
+        rows = list(rows.values())
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"error": True, "message": "Missing 'rows' in body"}), 400
+    result = get_shap_explanation_batch(rows)
+    return jsonify(result)
+
+
 @app.route("/api/xai/lime", methods=["POST"])
 def lime():
     data = request.get_json() or {}
     features = data.get("features") or data.get("feature_used") or {}
     if not features:
         return jsonify({"error": True, "message": "Missing 'features' in body"}), 400
-    result = get_lime_explanation(features)
+    try:
+        num_samples, kernel_width = parse_lime_params(data.get("num_samples"), data.get("kernel_width"))
+    except ValueError as e:
+        return jsonify({"error": True, "message": str(e)}), 400
+    result = get_lime_explanation(
+        features,
+        num_samples=num_samples,
+        kernel_width=kernel_width,
+    )
     return jsonify(result)
 
 
@@ -45,18 +83,107 @@ def feature_importance():
 
 # ---------- Time-Series (Prophet / SARIMA) ----------
 
+def _series_id(data: dict):
+    """
+    Fitted-model cache key: explicit series_id, else customer/site_id
+    """
+    if data.get("series_id"):
+        return str(data["series_id"])
+    if data.get("customer") and data.get("site_id"):
+        return f"{data['customer']}/{data['site_id']}"
+    return None
+
+
 @app.route("/api/timeseries/forecast", methods=["POST"])
 def timeseries_forecast():
+    """
+    "model": "prophet" | "sarima" | "seasonal_naive", or omitted / "auto"
+    for the model the backtest selected for this series (else Prophet)
+    """
     data = request.get_json() or {}
     daily_data = data.get("daily_data") or data.get("history") or []
     periods = int(data.get("periods", 30))
-    use_sarima = data.get("model") == "sarima"
+    model = data.get("model") or "auto"
+    output = data.get("output") or "rows"
     if not daily_data:
         return jsonify({"error": True, "message": "Missing 'daily_data' in body"}), 400
-    if use_sarima:
-        result = forecast_sarima(daily_data, periods=periods)
-    else:
-        result = forecast_prophet(daily_data, periods=periods)
+    if output not in OUTPUT_FORMATS:
+        return jsonify({"error": True, "message": f"'output' must be one of {list(OUTPUT_FORMATS)}"}), 400
+    if model != "auto" and model not in FORECAST_MODELS:
+        return jsonify({"error": True, "message": f"'model' must be 'auto' or one of {list(FORECAST_MODELS)}"}), 400
+
+    series_id = _series_id(data)
+    model, params, selection = resolve_model(model, series_id)
+    result = forecast_model(model, daily_data, periods=periods, output=output, params=params, series_id=series_id)
+    if selection:
+        result["selected_by"] = "backtest"
+        result["selection"] = selection["name"]
+
+    # Optional faster encodings: "orjson", or "arrow" with output=columns
+    encoded = encode_result(result, data.get("encoding"))
+    if encoded is not None:
+        body, mimetype = encoded
+        return Response(body, mimetype=mimetype)
+    return jsonify(result)
+
+
+@app.route("/api/timeseries/forecast/bulk", methods=["POST"])
+def timeseries_forecast_bulk():
+    """
+    Body: {"series": [{"series_id", "daily_data"} | {"customer", "site_id"}, ...],
+           "periods": 30, "model": "auto" | "prophet" | "sarima" | "seasonal_naive",
+           "output": "rows" | "columns",
+           "workers": N}
+    Streams one JSON result per line as each series finishes.
+    """
+    data = request.get_json() or {}
+    series = data.get("series") or []
+    if not isinstance(series, list) or not series:
+        return jsonify({"error": True, "message": "Missing 'series' in body"}), 400
+
+    try:
+        workers = parse_bulk_workers(data.get("workers"))
+    except ValueError as e:
+        return jsonify({"error": True, "message": str(e)}), 400
+    periods = int(data.get("periods", 30))
+    model = data.get("model")
+    output = data.get("output") or "rows"
+    jobs = (
+        {"periods": periods, "model": model, "output": output, **job}
+        for job in series if isinstance(job, dict)
+    )
+    return Response(
+        iter_ndjson(iter_bulk_forecasts(jobs, max_workers=workers)),
+        mimetype="application/x-ndjson",
+    )
+
+
+@app.route("/api/timeseries/intraday", methods=["POST"])
+def timeseries_intraday():
+    """
+    Body: {"customer", "site_id"} (reads predicted_units, updated
+    incrementally) or {"points": [{"key": "YYYYMMDD_HHMMSS", "kwh"}, ...]},
+    "horizon": 5-minute steps (default 36 = 3 h), "output": "rows" | "columns"
+    """
+    data = request.get_json() or {}
+    output = data.get("output") or "rows"
+    if output not in OUTPUT_FORMATS:
+        return jsonify({"error": True, "message": f"'output' must be one of {list(OUTPUT_FORMATS)}"}), 400
+    if not data.get("points") and not (data.get("customer") and data.get("site_id")):
+        return jsonify({"error": True, "message": "Missing 'customer' / 'site_id' or 'points' in body"}), 400
+    try:
+        horizon = int(data.get("horizon", INTRADAY_HORIZON))
+        panel_area_m2 = float(data["panel_area_m2"]) if data.get("panel_area_m2") is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": True, "message": "'horizon' must be an integer and 'panel_area_m2' a number"}), 400
+    result = forecast_intraday(
+        customer=data.get("customer"),
+        site_id=data.get("site_id"),
+        points=data.get("points"),
+        horizon=horizon,
+        output=output,
+        panel_area_m2=panel_area_m2,
+    )
     return jsonify(result)
 
 